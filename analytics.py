@@ -0,0 +1,255 @@
+# analytics.py
+# Correlations and linear fits for the impact analyses of pages 2-4.
+#
+# Each page relates one cohort-level table to the placement outcomes of the
+# same (Cohort_ID, Phase): a VIEW is that table's rows of the materialized
+# Cohort_Journey (journey.py) with its columns, the placement and visit metric
+# columns and the derived ones (Post - Pre improvements, Tier-1 rate) -- no join per rerun.
+# The projected frame is kept once per data version; analyze(view, filters)
+# filters it and computes in one pass
+#   - the Pearson correlation matrix over every numeric column of the view,
+#     each pair over the rows where both values are present (as Series.corr),
+#     from masked matrix products instead of one corr() call per pair, and
+#   - least-squares fits y = slope * x + intercept for the view's pairs, per
+#     Phase and over all phases ("All"), from grouped sums.
+# Results are memoized per (view, data version, filter state).
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import journey
+import profiling
+import utils
+import visit_metrics
+from filters import FilterState, get_engine
+
+MAX_RESULTS = 64
+ALL = "All"  # Phase label of the fits over every phase
+
+PLACEMENTS = "Placements_Cohort"
+# outcome tables whose columns every view carries
+OUTCOMES = (PLACEMENTS, visit_metrics.METRICS_TABLE)
+DERIVED = journey.DERIVED
+
+
+@dataclass(frozen=True)
+class View:
+    table: str                           # its columns are journey.SOURCES[table]
+    pairs: Tuple[Tuple[str, str], ...]   # (x, y) fitted per Phase
+
+
+VIEWS: Dict[str, View] = {
+    "tutor": View("Tutor_Cohort_Summary",
+                  (("Exam_Improvement", "Avg_Package"), ("PostTutor_Exam_Avg", "Higher_Degree_Admissions"))),
+    "mentor": View("Mentor_Cohort",
+                   (("PostMentor_Exam_Avg", "Avg_Package"), ("Capstone_Improvement", "Avg_Package"),
+                    ("Grade_A_Distribution_%_Post", "Tier1_Rate_%"))),
+    "jpt": View("JPT_Cohort",
+                (("Avg_AI_Technical", "Avg_Package"), ("Avg_AI_Communication", "Avg_Conversion_Per_Visit_%"))),
+}
+
+
+# ---------- vectorized statistics ----------
+def corr_matrix(values: np.ndarray) -> np.ndarray:
+    """Pearson r between the columns of `values` (NaN = missing), each pair over its complete rows."""
+    present = ~np.isnan(values)
+    m = present.astype("float64")
+    counts = m.sum(axis=0)
+    # shifting a column does not change r; centering keeps the sums small
+    means = np.divide(np.where(present, values, 0.0).sum(axis=0), counts,
+                      out=np.zeros(values.shape[1]), where=counts > 0)
+    x = np.where(present, values - means, 0.0)
+    n = m.T @ m                  # rows where both i and j are present
+    sx = x.T @ m                 # sum of i over those rows
+    sxx = (x * x).T @ m
+    sxy = x.T @ x
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sx.T / n
+        var = sxx - sx * sx / n
+        r = cov / np.sqrt(var * var.T)
+    r[(n < 2) | ~np.isfinite(r)] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+
+def grouped_fits(x: np.ndarray, y: np.ndarray, groups: np.ndarray, n_groups: int) -> Dict[str, np.ndarray]:
+    """Least-squares y = slope * x + intercept per group and overall, for every column pair of `x`/`y`.
+
+    `x` and `y` are (rows, pairs); `groups` holds each row's group code (-1:
+    only counted overall). Returns (n_groups + 1, pairs) arrays n, slope,
+    intercept and r, the last row being the overall fit.
+    """
+    ok = ~(np.isnan(x) | np.isnan(y))
+    onehot = np.zeros((len(groups), n_groups + 1))
+    valid = groups >= 0
+    onehot[np.flatnonzero(valid), groups[valid]] = 1.0
+    onehot[:, n_groups] = 1.0
+    counts = onehot.T @ ok
+    # center each pair on its overall means for stable sums
+    total = ok.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mx = np.where(ok, x, 0.0).sum(axis=0) / total
+        my = np.where(ok, y, 0.0).sum(axis=0) / total
+    mx, my = np.nan_to_num(mx), np.nan_to_num(my)
+    xc = np.where(ok, x - mx, 0.0)
+    yc = np.where(ok, y - my, 0.0)
+    sx, sy = onehot.T @ xc, onehot.T @ yc
+    sxx, syy, sxy = onehot.T @ (xc * xc), onehot.T @ (yc * yc), onehot.T @ (xc * yc)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        varx = sxx - sx * sx / counts
+        vary = syy - sy * sy / counts
+        cov = sxy - sx * sy / counts
+        slope = cov / varx
+        intercept = (sy - slope * sx) / counts + my - slope * mx
+        r = np.clip(cov / np.sqrt(varx * vary), -1.0, 1.0)
+    undefined = (counts < 2) | ~(varx > 1e-12 * np.maximum(sxx, 1.0))
+    slope[undefined] = intercept[undefined] = np.nan
+    r[undefined | ~np.isfinite(r)] = np.nan
+    return {"n": counts.astype("int64"), "slope": slope, "intercept": intercept, "r": r}
+
+
+# ---------- views ----------
+def _numeric(s: pd.Series) -> pd.Series:
+    return pd.to_numeric(s, errors="coerce").astype("float64")
+
+
+def _build(view: View) -> pd.DataFrame:
+    """The Cohort_Journey rows of `view.table`: its columns, the OUTCOMES columns and the derived ones."""
+    journey_df = journey.load()
+    rows = journey_df[journey_df[journey.flag(view.table)]]
+    df = pd.DataFrame({"Cohort_ID": rows["Cohort_ID"].astype("string").to_numpy(),
+                       "Phase": rows["Phase"].astype("string").to_numpy()})
+    for c in journey.SOURCES[view.table]:
+        if journey.column(view.table, c) in rows.columns:
+            df[c] = _numeric(rows[journey.column(view.table, c)]).to_numpy()
+    for table in OUTCOMES:
+        for c in journey.SOURCES[table]:
+            stored = journey.column(table, c)
+            df[c] = _numeric(rows[stored]).to_numpy() if stored in rows.columns else np.nan
+    for name, (a, _, b) in DERIVED.items():
+        if a in df.columns and b in df.columns and name in rows.columns:
+            df[name] = _numeric(rows[name]).to_numpy()
+    return utils.phase_order(df)
+
+
+@dataclass
+class Analysis:
+    view: str
+    kpis: pd.DataFrame      # filtered view rows
+    corr: pd.DataFrame      # numeric column x numeric column
+    fits: pd.DataFrame      # x, y, Phase, n, slope, intercept, r
+    pending: bool = False   # placeholder while the pool computes the real one
+
+    def r(self, x: str, y: str) -> float:
+        """Correlation of two view columns over their complete rows (NaN if undefined)."""
+        if x not in self.corr.index or y not in self.corr.columns:
+            return float("nan")
+        return float(self.corr.at[x, y])
+
+    def line(self, x: str, y: str, phase: str = ALL) -> Optional[Tuple[float, float]]:
+        """(slope, intercept) of the fit of y on x for `phase`, None if it is undefined."""
+        row = self.fits[(self.fits["x"] == x) & (self.fits["y"] == y) & (self.fits["Phase"] == phase)]
+        if row.empty or np.isnan(row["slope"].iloc[0]):
+            return None
+        return float(row["slope"].iloc[0]), float(row["intercept"].iloc[0])
+
+
+def _analyze(name: str, view: View, df: pd.DataFrame) -> Analysis:
+    numeric = [c for c in df.columns if c not in ("Cohort_ID", "Phase")]
+    values = df[numeric].to_numpy(dtype="float64", na_value=np.nan)
+    corr = pd.DataFrame(corr_matrix(values), index=numeric, columns=numeric)
+
+    pairs = [(x, y) for x, y in view.pairs if x in df.columns and y in df.columns]
+    phases = list(df["Phase"].cat.categories)
+    fits = pd.DataFrame(columns=["x", "y", "Phase", "n", "slope", "intercept", "r"])
+    if pairs:
+        col = {c: i for i, c in enumerate(numeric)}
+        xi, yi = [col[x] for x, _ in pairs], [col[y] for _, y in pairs]
+        out = grouped_fits(values[:, xi], values[:, yi], np.asarray(df["Phase"].cat.codes), len(phases))
+        labels = phases + [ALL]
+        fits = pd.DataFrame({
+            "x": np.tile([x for x, _ in pairs], len(labels)),
+            "y": np.tile([y for _, y in pairs], len(labels)),
+            "Phase": np.repeat(labels, len(pairs)),
+            **{k: v.ravel() for k, v in out.items()},
+        })
+    return Analysis(name, df, corr, fits)
+
+
+_frames: Dict[str, Tuple[tuple, pd.DataFrame]] = {}
+_results: "OrderedDict[tuple, Analysis]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _version(view: View) -> tuple:
+    return utils.data_version("Cohort_Master", view.table, *OUTCOMES, journey.JOURNEY_TABLE)
+
+
+def data_version(name: str) -> tuple:
+    """Cache key of the tables behind VIEWS[name]."""
+    return _version(VIEWS[name])
+
+
+def view_frame(name: str) -> pd.DataFrame:
+    """Unfiltered rows of VIEWS[name], rebuilt when one of its tables changes."""
+    view = VIEWS[name]
+    version = _version(view)
+    with _lock:
+        cached = _frames.get(name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    df = _build(view)
+    with _lock:
+        _frames[name] = (version, df)
+    return df
+
+
+def analyze(name: str, state: FilterState) -> Analysis:
+    """Correlations and per-Phase fits of view `name` for the rows passing `state` (memoized)."""
+    view = VIEWS[name]
+    key = (name, _version(view), state)
+    with profiling.stage("aggregate", f"analytics: {name}") as span:
+        span.cache = "hit"
+        with _lock:
+            result = _results.get(key)
+            if result is not None:
+                _results.move_to_end(key)
+        if result is None:
+            span.cache = "miss"
+            df = view_frame(name)
+            span.rows_in = len(df)
+            df = df.iloc[get_engine().row_index(df, state)].reset_index(drop=True)
+            result = _analyze(name, view, df)
+            with _lock:
+                _results[key] = result
+                while len(_results) > MAX_RESULTS:
+                    _results.popitem(last=False)
+        span.rows_out = len(result.kpis)
+        return result
+
+
+def placeholder(name: str) -> Analysis:
+    """Empty, pending Analysis of view `name`, shown while the real one is computed."""
+    fits = pd.DataFrame(columns=["x", "y", "Phase", "n", "slope", "intercept", "r"])
+    return Analysis(name, pd.DataFrame(columns=["Cohort_ID", "Phase"]), pd.DataFrame(), fits, pending=True)
+
+
+def analyze_pooled(name: str, state: FilterState, timeout: Optional[float] = None) -> Analysis:
+    """analyze() on the shared process pool (executor.py); placeholder(name) until it finishes."""
+    import executor
+
+    key = ("analytics", name, data_version(name), state)
+    return executor.run(key, analyze, name, state, timeout=timeout, placeholder=placeholder(name))
+
+
+# ---------- Streamlit ----------
+def show_details(analysis: Analysis, label: str = "Correlation matrix and per-Phase fits") -> None:
+    """The full correlation matrix and fit table of `analysis` in a collapsed expander."""
+    import streamlit as st
+
+    with st.expander(label):
+        st.dataframe(analysis.corr.round(3))
+        st.dataframe(analysis.fits.round({"slope": 4, "intercept": 3, "r": 3}), hide_index=True)
@@ -1,16 +1,22 @@
 
 import streamlit as st
-from 0_utils import load_table
+from profiling import debug_panel, profile_page, stage
 
 st.set_page_config(page_title="SPJ AI Cohort Outcomes Dashboard", layout="wide")
+profile_page("Home")
 st.title("📊 SPJ AI Cohort Outcomes Dashboard")
 
 # Global filters in sidebar
 st.sidebar.header("🎛️ Global Filters")
 
-# Load cohort master for global filters
+# Cohort list from the shared filter index (Cohort_Master only, no fact tables)
 try:
-    cm = load_table("data/warehouse/Cohort_Master.csv")
+    with stage("import", "filters"):
+        from filters import get_engine
+        import warmup
+    warmup.ensure_started()
+    warmup.show_status()
+    index = get_engine().index
     
     # Tool filter
     tools = st.sidebar.multiselect(
@@ -29,7 +35,7 @@ try:
     # Cohort filter
     cohorts = st.sidebar.multiselect(
         "👥 Cohorts", 
-        sorted(cm["Cohort_ID"].unique()) if not cm.empty else [],
+        sorted(index.cohorts),
         default=[]
     )
     
@@ -45,3 +51,5 @@ except Exception as e:
     st.session_state.global_cohorts = []
 
 st.write("Use the sidebar to navigate: Overview, AI Tutor, AI Mentor, JPT, Placements & Company Visits, Uploads, Definitions.")
+
+debug_panel()
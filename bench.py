@@ -0,0 +1,228 @@
+# bench.py
+# Headless per-page benchmark.
+#
+# Drives pages 1-5 with streamlit.testing.v1.AppTest against a warehouse
+# directory (WAREHOUSE_DIR) and reports, per page and filter scenario:
+# wall time of the cold first run (split into import / data / render time), of
+# the run after the filters change, and of warm reruns; peak RSS; and the
+# number of figures rendered (chart cache misses) and images shown. Every
+# (page, scenario) runs in a fresh process so peak RSS and caches are not
+# shared between measurements.
+#
+#   python bench.py --warehouse data/warehouse --out bench.json
+#   python bench.py --pages 1_Overview 5_Placements_Visits --scenarios default one_phase --repeat 5
+#   python bench.py --compare before.json --out after.json
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PAGES = ["1_Overview", "2_AI_Tutor", "3_AI_Mentor", "4_JPT", "5_Placements_Visits"]
+
+# Scenario -> {multiselect label: values}; "first" picks the first option.
+SCENARIOS = {
+    "default": {},
+    "one_phase": {"Phase": ["JPT"]},
+    "one_cohort": {"Cohort": "first"},
+    "year_program": {"Year": "first", "Program": "first"},
+}
+
+# Pages are executed from the repo root so `import utils` resolves to the
+# top-level module (as under `streamlit run app.py`), not pages/utils.py.
+_APP = """
+import sys
+sys.path.insert(0, {root!r})
+exec(compile(open({path!r}).read(), {path!r}, "exec"))
+"""
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run(at) -> float:
+    start = time.perf_counter()
+    at.run()
+    return time.perf_counter() - start
+
+
+def _errors(at) -> list:
+    return [str(e.value) for e in at.exception]
+
+
+def run_one(page: str, scenario: str, repeat: int, timeout: float, warm: bool = False) -> dict:
+    """Benchmark one page/scenario in this process (after a complete warm-up when `warm`)."""
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from streamlit.testing.v1 import AppTest
+
+    import charts
+    import profiling
+
+    warmup_s = None
+    if warm:
+        import warmup
+        start = time.perf_counter()
+        warmup.start("bench")
+        warmup.wait()
+        warmup_s = time.perf_counter() - start
+
+    rss_start = _rss_mb()
+    path = os.path.join(ROOT, "pages", f"{page}.py")
+    at = AppTest.from_string(_APP.format(root=ROOT, path=path), default_timeout=timeout)
+
+    cold_s = _run(at)
+    startup = profiling.startup_report()
+    after_cold = charts.stats["misses"]
+    errors = _errors(at)
+
+    scenario_s = None
+    missing = []
+    if SCENARIOS[scenario]:
+        widgets = {w.label: w for w in at.multiselect}
+        for label, values in SCENARIOS[scenario].items():
+            widget = widgets.get(label)
+            if widget is None or (values == "first" and not widget.options):
+                missing.append(label)
+                continue
+            widget.set_value(widget.options[:1] if values == "first" else values)
+        scenario_s = _run(at)
+        errors += _errors(at)
+    after_scenario = charts.stats["misses"]
+    images = len(at.get("image"))
+
+    warm = [_run(at) for _ in range(repeat)]
+    return {
+        "page": page,
+        "scenario": scenario,
+        "warmup_s": None if warmup_s is None else round(warmup_s, 4),
+        "cold_s": round(cold_s, 4),
+        # import / data / render split of the cold run (profiling.startup_report)
+        "startup": startup,
+        "scenario_s": None if scenario_s is None else round(scenario_s, 4),
+        "warm_median_s": round(statistics.median(warm), 4) if warm else None,
+        "warm_s": [round(w, 4) for w in warm],
+        # figures drawn for the measured state (cold run, or the run after the filter change)
+        "figures_rendered": after_scenario - after_cold if SCENARIOS[scenario] else after_cold,
+        "warm_figures_rendered": charts.stats["misses"] - after_scenario,
+        "images": images,
+        "rss_start_mb": round(rss_start, 1),
+        "peak_rss_mb": round(_rss_mb(), 1),
+        "missing_widgets": missing,
+        "errors": errors,
+    }
+
+
+def _table_rows(warehouse_dir: str) -> dict:
+    os.environ["WAREHOUSE_DIR"] = warehouse_dir
+    sys.path.insert(0, ROOT)
+    import utils
+    import warehouse
+
+    warehouse.WAREHOUSE_DIR = warehouse_dir
+    rows = {}
+    for name in utils.SCHEMAS_DTYPES:
+        if warehouse.find_table(name) is not None:
+            rows[name] = len(warehouse.read_table(name, ["Cohort_ID"]))
+    return rows
+
+
+def _commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(old: dict, new: dict) -> None:
+    """Print new/old ratios of the timings and peak RSS per page/scenario."""
+    before = {(r["page"], r["scenario"]): r for r in old["results"]}
+    print(f"compared with {old['meta'].get('commit')} ({old['meta'].get('timestamp')})", file=sys.stderr)
+    for r in new["results"]:
+        o = before.get((r["page"], r["scenario"]))
+        if o is None:
+            continue
+        parts = []
+        for field in ("cold_s", "scenario_s", "warm_median_s", "peak_rss_mb"):
+            if r.get(field) and o.get(field):
+                parts.append(f"{field} x{r[field] / o[field]:.2f}")
+        print(f"{r['page']:<22} {r['scenario']:<13} " + "  ".join(parts), file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark dashboard pages headlessly.")
+    ap.add_argument("--warehouse", default=os.environ.get("WAREHOUSE_DIR", "data/warehouse"),
+                    help="warehouse directory to run against")
+    ap.add_argument("--pages", nargs="+", default=PAGES, choices=PAGES)
+    ap.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    ap.add_argument("--repeat", type=int, default=3, help="warm reruns per scenario")
+    ap.add_argument("--timeout", type=float, default=300.0, help="seconds per script run")
+    ap.add_argument("--warm", action="store_true",
+                    help="run the background warm-up to completion before the first page run "
+                         "(otherwise it is disabled so cold runs are not sharing the CPU with it)")
+    ap.add_argument("--out", help="write JSON here (default: stdout)")
+    ap.add_argument("--compare", help="earlier JSON report to compare against")
+    ap.add_argument("--child", nargs=2, metavar=("PAGE", "SCENARIO"), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_one(*args.child, args.repeat, args.timeout, args.warm)))
+        return 0
+
+    warehouse_dir = os.path.abspath(args.warehouse)
+    env = dict(os.environ, WAREHOUSE_DIR=warehouse_dir, WARMUP="1" if args.warm else "0")
+    results = []
+    for page in args.pages:
+        for scenario in args.scenarios:
+            cmd = [sys.executable, os.path.abspath(__file__), "--child", page, scenario,
+                   "--repeat", str(args.repeat), "--timeout", str(args.timeout)] + (["--warm"] if args.warm else [])
+            proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                result = {"page": page, "scenario": scenario, "errors": [proc.stderr.strip()[-2000:]]}
+            else:
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(result)
+            startup = result.get("startup") or {}
+            print(f"{page:<22} {scenario:<13} cold {result.get('cold_s')}s "
+                  f"(import {startup.get('import_ms')}ms data {startup.get('data_ms')}ms)  scenario {result.get('scenario_s')}s  "
+                  f"warm {result.get('warm_median_s')}s  figs {result.get('figures_rendered')}  "
+                  f"rss {result.get('peak_rss_mb')}MB" + ("  ERR" if result.get("errors") else ""),
+                  file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": _commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "warehouse": warehouse_dir,
+            "table_rows": _table_rows(warehouse_dir),
+            "repeat": args.repeat,
+            "warm": args.warm,
+        },
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as fh:
+            compare(json.load(fh), report)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+# charts.py
+# Render cache for matplotlib charts.
+#
+# Pages describe each chart as a zero-argument draw function returning a
+# Figure; show_chart() renders it to PNG/SVG bytes once per
+# (chart id, key) and serves the bytes from an LRU afterwards. The key should
+# hold everything the chart depends on -- normally the normalized FilterState
+# plus utils.data_version() of its tables -- so touching an unrelated widget
+# re-uses the cached image. Rendered figures are always closed.
+#
+# Pages take `plt` from here rather than importing matplotlib.pyplot: it is a
+# stand-in that imports pyplot on first use, so a rerun whose charts all come
+# from the cache never pays for the matplotlib import.
+#
+# Line, grouped-bar and scatter(+trend) charts go through show_line /
+# show_bars / show_scatter instead, which emit Vega-Lite specs drawn in the
+# browser (interactive, no server-side rasterizing). Their data is
+# downsampled on the server once it exceeds POINT_BUDGET points: LTTB for
+# series, a 2-D grid for scatters (trend lines are fitted on the full data).
+# The built (data, spec) pairs share the LRU with the images.
+# CHART_BACKEND=matplotlib draws the same charts as images instead.
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import profiling
+
+CHART_CACHE_SIZE = int(os.environ.get("CHART_CACHE_SIZE", "256"))
+BACKEND = os.environ.get("CHART_BACKEND", "vega").strip().lower()  # vega | matplotlib
+POINT_BUDGET = int(os.environ.get("CHART_POINT_BUDGET", "1000"))
+
+# Same output as st.pyplot's defaults.
+SAVEFIG_KWARGS = {"bbox_inches": "tight", "dpi": 200}
+
+_cache: "OrderedDict[Hashable, Any]" = OrderedDict()
+_cache_lock = threading.Lock()
+# pyplot keeps global state (current figure), so figures are built one at a time.
+_render_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0}
+
+
+class _LazyPyplot:
+    """matplotlib.pyplot, imported on first attribute access."""
+
+    def __getattr__(self, name: str):
+        import matplotlib.pyplot as pyplot
+        return getattr(pyplot, name)
+
+
+plt = _LazyPyplot()
+
+
+def render(draw: Callable, fmt: str = "png") -> bytes:
+    """Call `draw()` to build a Figure, serialize it and close it."""
+    import matplotlib.pyplot as plt
+
+    with _render_lock:
+        before = set(plt.get_fignums())
+        try:
+            fig = draw()
+            buf = io.BytesIO()
+            fig.savefig(buf, format=fmt, **SAVEFIG_KWARGS)
+        finally:
+            # also closes anything a failing draw() left open
+            for num in set(plt.get_fignums()) - before:
+                plt.close(num)
+    return buf.getvalue()
+
+
+def _cached(chart_id: str, cache_key: Hashable, build: Callable[[], Any]) -> Any:
+    with profiling.stage("render", chart_id) as span:
+        with _cache_lock:
+            data = _cache.get(cache_key)
+            if data is not None:
+                _cache.move_to_end(cache_key)
+                stats["hits"] += 1
+                span.cache = "hit"
+                return data
+            stats["misses"] += 1
+        span.cache = "miss"
+        data = build()
+        with _cache_lock:
+            _cache[cache_key] = data
+            while len(_cache) > CHART_CACHE_SIZE:
+                _cache.popitem(last=False)
+        return data
+
+
+def chart_bytes(chart_id: str, key: Hashable, draw: Callable, fmt: str = "png") -> bytes:
+    """Rendered bytes for `chart_id` at `key`, from the cache when possible."""
+    return _cached(chart_id, (chart_id, key, fmt), lambda: render(draw, fmt))
+
+
+def show_chart(chart_id: str, key: Hashable, draw: Callable, fmt: str = "png") -> None:
+    """Drop-in for `st.pyplot(fig)` that renders through the cache."""
+    data = chart_bytes(chart_id, key, draw, fmt)
+    if fmt == "svg":
+        st.image(data.decode("utf-8"))
+    else:
+        st.image(data)
+
+
+def clear_chart_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
+# ---------- downsampling ----------
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of `threshold` points that keep the visual shape of the series (Largest-Triangle-Three-Buckets)."""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    out = np.empty(threshold, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def bin_points(x: np.ndarray, y: np.ndarray, budget: int) -> pd.DataFrame:
+    """Mean position and count of the points in each cell of an at most `budget`-cell grid."""
+    side = max(int(math.sqrt(budget)), 1)
+
+    def cells(v: np.ndarray) -> np.ndarray:
+        span = v.max() - v.min()
+        if span == 0:
+            return np.zeros(len(v), dtype=np.int64)
+        return np.minimum(((v - v.min()) / span * side).astype(np.int64), side - 1)
+
+    grid = pd.DataFrame({"x": x, "y": y, "cell": cells(x) * side + cells(y)})
+    return grid.groupby("cell").agg(x=("x", "mean"), y=("y", "mean"), n=("x", "size")).reset_index(drop=True)
+
+
+# ---------- chart data ----------
+def _order(values: pd.Series) -> list:
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return [str(c) for c in values.cat.categories if c in set(values)]
+    return [str(v) for v in pd.unique(values)]
+
+
+def line_data(df: pd.DataFrame, x: str, y: str, budget: int = POINT_BUDGET) -> pd.DataFrame:
+    """[x (str), y] in row order, LTTB-downsampled to `budget` points."""
+    data = pd.DataFrame({x: df[x].astype(str).to_numpy(), y: pd.to_numeric(df[y], errors="coerce").to_numpy()})
+    data = data[data[y].notna()].reset_index(drop=True)
+    if len(data) > budget:
+        data = data.iloc[lttb(np.arange(len(data)), data[y].to_numpy(), budget)].reset_index(drop=True)
+    return data
+
+
+def scatter_data(x: pd.Series, y: pd.Series, budget: int = POINT_BUDGET,
+                 fit: Optional[Tuple[float, float]] = None) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """Points (x, y, n; binned past `budget`) and the least-squares line over all pairwise-complete points.
+
+    `fit` is a precomputed (slope, intercept), e.g. from analytics.analyze().
+    """
+    xv = pd.to_numeric(pd.Series(x), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    yv = pd.to_numeric(pd.Series(y), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    ok = ~(np.isnan(xv) | np.isnan(yv))
+    xv, yv = xv[ok], yv[ok]
+    if len(xv) > budget:
+        points = bin_points(xv, yv, budget)
+    else:
+        points = pd.DataFrame({"x": xv, "y": yv, "n": np.ones(len(xv), dtype=np.int64)})
+    trend = None
+    if len(xv) > 1 and (fit is not None or np.ptp(xv) > 0):
+        slope, intercept = fit if fit is not None else np.polyfit(xv, yv, 1)
+        ends = np.array([xv.min(), xv.max()])
+        trend = pd.DataFrame({"x": ends, "y": slope * ends + intercept})
+    return points, trend
+
+
+# ---------- Vega-Lite ----------
+def _titled(spec: dict, title: Optional[str]) -> dict:
+    if title:
+        spec["title"] = title
+    return spec
+
+
+def line_spec(data: pd.DataFrame, x: str, y: str, title: Optional[str] = None, x_title: Optional[str] = None,
+              y_title: Optional[str] = None, color: Optional[str] = None) -> dict:
+    mark = {"type": "line", "point": True, "tooltip": True}
+    if color:
+        mark["color"] = color
+    return _titled({
+        "mark": mark,
+        "encoding": {
+            "x": {"field": x, "type": "ordinal", "sort": None, "title": x_title or x, "axis": {"labelAngle": -45}},
+            "y": {"field": y, "type": "quantitative", "title": y_title or y},
+        },
+    }, title)
+
+
+def bars_long(df: pd.DataFrame) -> pd.DataFrame:
+    """Wide frame (index = category, one column per series) -> Category/Series/Value rows."""
+    index = df.index.name or "index"
+    long = df.reset_index().melt(id_vars=index, var_name="Series", value_name="Value")
+    long = long.rename(columns={index: "Category"})
+    long["Category"] = long["Category"].astype(str)
+    long["Series"] = long["Series"].astype(str)
+    return long
+
+
+def bars_spec(df: pd.DataFrame, title: Optional[str] = None, x_title: Optional[str] = None,
+              y_title: Optional[str] = None) -> dict:
+    return _titled({
+        "mark": {"type": "bar", "tooltip": True},
+        "encoding": {
+            "x": {"field": "Category", "type": "nominal", "sort": _order(df.index.to_series()),
+                  "title": x_title or df.index.name},
+            "xOffset": {"field": "Series", "sort": [str(c) for c in df.columns]},
+            "color": {"field": "Series", "type": "nominal", "sort": [str(c) for c in df.columns],
+                      "title": df.columns.name},
+            "y": {"field": "Value", "type": "quantitative", "title": y_title},
+        },
+    }, title)
+
+
+def scatter_spec(points: pd.DataFrame, trend: Optional[pd.DataFrame], x_title: str, y_title: str,
+                 title: Optional[str] = None) -> dict:
+    binned = bool((points["n"] > 1).any())
+    encoding = {"x": {"field": "x", "type": "quantitative", "title": x_title, "scale": {"zero": False}},
+                "y": {"field": "y", "type": "quantitative", "title": y_title, "scale": {"zero": False}},
+                "tooltip": [{"field": "x", "title": x_title, "format": ".2f"},
+                            {"field": "y", "title": y_title, "format": ".2f"}]}
+    if binned:
+        encoding["size"] = {"field": "n", "type": "quantitative", "title": "points"}
+        encoding["tooltip"].append({"field": "n", "title": "points"})
+    layers = [{"mark": {"type": "circle", "opacity": 0.6}, "encoding": encoding}]
+    if trend is not None:
+        layers.append({"data": {"values": trend.to_dict("records")},
+                       "mark": {"type": "line", "color": "red", "strokeDash": [6, 4]},
+                       "encoding": {"x": {"field": "x", "type": "quantitative"},
+                                    "y": {"field": "y", "type": "quantitative"}}})
+    return _titled({"layer": layers}, title)
+
+
+def show_spec(chart_id: str, key: Hashable, build: Callable[[], Tuple[pd.DataFrame, dict]]) -> None:
+    """Build (data, spec) once per (chart id, key) and show it with st.vega_lite_chart."""
+    data, spec = _cached(chart_id, (chart_id, key, "vega"), build)
+    st.vega_lite_chart(data, spec, use_container_width=True)
+
+
+# ---------- chart sites ----------
+def show_line(chart_id: str, key: Hashable, df: pd.DataFrame, x: str, y: str, title: Optional[str] = None,
+              x_title: Optional[str] = None, y_title: Optional[str] = None, color: Optional[str] = None) -> None:
+    """`y` over the ordered categories `x` (e.g. weekly series)."""
+    if BACKEND == "matplotlib":
+        def draw():
+            data = line_data(df, x, y)
+            fig, ax = plt.subplots()
+            ax.plot(data[x], data[y], marker="o", color=color)
+            ax.set_xlabel(x_title or x)
+            ax.set_ylabel(y_title or y)
+            if title:
+                ax.set_title(title)
+            plt.xticks(rotation=45, ha="right")
+            return fig
+        return show_chart(chart_id, key, draw)
+
+    def build():
+        data = line_data(df, x, y)
+        return data, line_spec(data, x, y, title, x_title, y_title, color)
+    show_spec(chart_id, key, build)
+
+
+def show_bars(chart_id: str, key: Hashable, df: pd.DataFrame, title: Optional[str] = None,
+              x_title: Optional[str] = None, y_title: Optional[str] = None) -> None:
+    """Grouped bars of a wide frame: one group per index value, one bar per column."""
+    if BACKEND == "matplotlib":
+        def draw():
+            fig, ax = plt.subplots()
+            df.plot(kind="bar", ax=ax)
+            if title:
+                ax.set_title(title)
+            if y_title:
+                ax.set_ylabel(y_title)
+            return fig
+        return show_chart(chart_id, key, draw)
+    show_spec(chart_id, key, lambda: (bars_long(df), bars_spec(df, title, x_title, y_title)))
+
+
+def show_scatter(chart_id: str, key: Hashable, x: pd.Series, y: pd.Series, x_title: str, y_title: str,
+                 title: Optional[str] = None, trend: bool = False,
+                 fit: Optional[Tuple[float, float]] = None) -> None:
+    """Scatter of y against x, with a least-squares trend line when `trend` (`fit` if given)."""
+    if BACKEND == "matplotlib":
+        def draw():
+            points, line = scatter_data(x, y, fit=fit)
+            fig, ax = plt.subplots()
+            ax.scatter(points["x"], points["y"], s=20 * np.sqrt(points["n"]), alpha=0.6)
+            if trend and line is not None:
+                ax.plot(line["x"], line["y"], "r--", alpha=0.8)
+            ax.set_xlabel(x_title)
+            ax.set_ylabel(y_title)
+            if title:
+                ax.set_title(title)
+            return fig
+        return show_chart(chart_id, key, draw)
+
+    def build():
+        points, line = scatter_data(x, y, fit=fit)
+        return points, scatter_spec(points, line if trend else None, x_title, y_title, title)
+    show_spec(chart_id, key, build)
@@ -0,0 +1,175 @@
+# cube.py
+# Materialized KPI cube for the Executive Overview.
+#
+# One row per (Year, Program, Cohort_ID, Phase) holding additive partials only
+# -- sums and non-null counts, never means -- so any filter combination is
+# answered exactly by summing the selected cells and dividing at the end.
+# Built at ingest time by the Data Uploader; rebuilt lazily if a source table
+# is newer than the stored cube.
+import os
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+import utils
+import visit_metrics
+import warehouse
+
+CUBE_TABLE = "KPI_Cube"
+GRAIN = ["Year", "Program", "Cohort_ID", "Phase"]
+
+# Source table -> columns rolled up by plain sum / by mean (stored as sum + n).
+MEASURES: Dict[str, Dict[str, List[str]]] = {
+    "Placements_Cohort": {
+        "sum": ["Placed", "Eligible", "Offers", "Tier1_Offers"],
+        "mean": ["Avg_Package"],
+    },
+    # per-visit partials derived from row-level Company_Visits by visit_metrics;
+    # the per-visit means are ratios of their sums (visit_ratio)
+    visit_metrics.AGG_TABLE: {
+        "sum": ["Conversion_sum", "Conversion_n", "Openings_Announced", "Openings_n"],
+        "mean": [],
+    },
+    "Tutor_Cohort_Summary": {
+        "sum": [],
+        "mean": ["PreTutor_Exam_Avg", "PostTutor_Exam_Avg"],
+    },
+    "Mentor_Cohort": {
+        "sum": [],
+        "mean": ["PreMentor_Capstone_Grade_Avg", "PostMentor_Capstone_Grade_Avg"],
+    },
+    "JPT_Cohort": {
+        "sum": [],
+        "mean": ["Avg_AI_Technical", "Conversion_Boost_Per_Opening_%"],
+    },
+}
+SOURCES = ["Cohort_Master"] + list(MEASURES)
+
+
+def rows_col(table: str) -> str:
+    return f"{table}__rows"
+
+
+def _partials(table: str) -> pd.DataFrame:
+    """Per-(Cohort_ID, Phase) partials for one source table."""
+    spec = MEASURES[table]
+    cols = ["Cohort_ID", "Phase"] + spec["sum"] + spec["mean"]
+    if warehouse.find_table(table) is None:
+        df = pd.DataFrame(columns=cols)
+    else:
+        df = utils.load_table(table, columns=cols)
+    for c in cols:
+        if c not in df.columns:
+            df[c] = np.nan
+    df = df.astype({c: "float64" for c in spec["sum"] + spec["mean"]})
+    df["Phase"] = df["Phase"].astype("string")
+    out = pd.DataFrame({rows_col(table): 1, "Cohort_ID": df["Cohort_ID"].astype("string"), "Phase": df["Phase"]})
+    for c in spec["sum"] + spec["mean"]:
+        out[f"{c}__sum"] = df[c].fillna(0.0)
+    for c in spec["mean"]:
+        out[f"{c}__n"] = df[c].notna().astype("int64")
+    return out.groupby(["Cohort_ID", "Phase"], dropna=False, observed=True).sum().reset_index()
+
+
+def build_cube(write: bool = True) -> pd.DataFrame:
+    """Aggregate every source table to the cube grain (and store it when `write`)."""
+    cube = None
+    for table in MEASURES:
+        part = _partials(table)
+        cube = part if cube is None else cube.merge(part, on=["Cohort_ID", "Phase"], how="outer")
+    measure_cols = [c for c in cube.columns if c not in ("Cohort_ID", "Phase")]
+    cube[measure_cols] = cube[measure_cols].fillna(0)
+    if warehouse.find_table("Cohort_Master") is not None:
+        cm = utils.load_table("Cohort_Master", columns=["Cohort_ID", "Year", "Program"])
+        cm = cm.drop_duplicates("Cohort_ID").astype({"Cohort_ID": "string"})
+        cube = cube.merge(cm, on="Cohort_ID", how="left")
+    for c in ("Year", "Program"):
+        if c not in cube.columns:
+            cube[c] = pd.NA
+    cube = cube[GRAIN + measure_cols]
+    if write:
+        warehouse.write_table(cube, CUBE_TABLE)
+        utils.invalidate_table(CUBE_TABLE)
+    return cube
+
+
+def columns() -> List[str]:
+    """Columns of the cube for the current MEASURES."""
+    cols = list(GRAIN)
+    for table, spec in MEASURES.items():
+        cols += [rows_col(table)] + [f"{c}__sum" for c in spec["sum"] + spec["mean"]]
+        cols += [f"{c}__n" for c in spec["mean"]]
+    return cols
+
+
+def is_stale() -> bool:
+    path = warehouse.find_table(CUBE_TABLE)
+    if path is None:
+        return True
+    built = os.stat(path).st_mtime_ns
+    for table in SOURCES:
+        src = warehouse.find_table(table)
+        if src is not None and os.stat(src).st_mtime_ns > built:
+            return True
+    return False
+
+
+def load_cube() -> pd.DataFrame:
+    if visit_metrics.is_stale():
+        visit_metrics.update()
+    if is_stale():
+        build_cube()
+    cube = utils.load_table(CUBE_TABLE)
+    if set(columns()) - set(cube.columns):  # stored by an older MEASURES
+        build_cube()
+        cube = utils.load_table(CUBE_TABLE)
+    return cube
+
+
+# ---------- roll-ups ----------
+def rollup(cells: pd.DataFrame) -> pd.Series:
+    """Sum the partials of the selected cube cells."""
+    return cells.drop(columns=GRAIN).sum()
+
+
+def rollup_by_phase(cells: pd.DataFrame) -> pd.DataFrame:
+    return cells.drop(columns=["Year", "Program", "Cohort_ID"]).groupby("Phase", observed=True).sum()
+
+
+def rows(tot, table: str):
+    return tot[rows_col(table)]
+
+
+def total(tot, col: str):
+    return tot[f"{col}__sum"]
+
+
+def _div(num, den):
+    if isinstance(den, pd.Series):
+        return num / den.where(den > 0)
+    return num / den if den > 0 else np.nan
+
+
+def mean(tot, col: str):
+    """Mean of `col` over the rolled-up rows (NaN when it has no values)."""
+    return _div(tot[f"{col}__sum"], tot[f"{col}__n"])
+
+
+def ratio(tot, num: str, den: str, scale: float = 100.0):
+    """scale * sum(num) / sum(den); a zero denominator gives 0 for totals, NaN per phase."""
+    value = _div(total(tot, num) * scale, total(tot, den))
+    return value if isinstance(value, pd.Series) else (0 if np.isnan(value) else value)
+
+
+# visit_metrics column -> (numerator, denominator, scale) partials in the cube
+VISIT_RATIOS = {
+    "Avg_Conversion_Per_Visit_%": ("Conversion_sum", "Conversion_n", 100.0),
+    "Avg_Openings_Per_Visit": ("Openings_Announced", "Openings_n", 1.0),
+}
+
+
+def visit_ratio(tot, col: str):
+    """Per-visit mean `col` (a visit_metrics column) over the rolled-up visits; NaN when there are none."""
+    num, den, scale = VISIT_RATIOS[col]
+    return _div(total(tot, num) * scale, total(tot, den))
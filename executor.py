@@ -0,0 +1,187 @@
+# executor.py
+# Shared process pool for heavy page work.
+#
+# Streamlit runs every session's script on a thread of one process, so
+# pandas/NumPy work that holds the GIL (merges, groupbys, correlation and fit
+# matrices, resampling) from concurrent sessions is serialized. Pages hand
+# such jobs to run() instead, which executes them on a pool of EXECUTOR_WORKERS
+# spawned processes (default: one per core; 0 runs everything inline):
+#   - jobs are module-level functions with picklable arguments; workers load
+#     tables from the warehouse through their own utils caches, so only the
+#     result crosses the process boundary;
+#   - a job is identified by a key that includes the data version and filter
+#     state; a request for a key already in flight waits on the same future
+#     instead of submitting again, and finished results stay in a small LRU so
+#     the next rerun gets them without a round trip;
+#   - at most EXECUTOR_QUEUE jobs are queued or running; past that, and when a
+#     job takes longer than EXECUTOR_TIMEOUT seconds, run() returns the
+#     caller's placeholder (the job keeps running and its result is picked up
+#     on a later rerun; show_pending() offers the rerun).
+# Streamlit runs each page as a stand-in __main__ module whose __file__ is the
+# page, and a spawned worker re-imports __main__ from that path -- re-running
+# the page (and its pool calls) while it is still bootstrapping. Workers are
+# therefore launched with a bare __main__ in place (_Pool, _bare_main).
+import logging
+import os
+import sys
+import threading
+import types
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import profiling
+
+WORKERS = int(os.environ.get("EXECUTOR_WORKERS", str(os.cpu_count() or 1)))
+QUEUE_SIZE = int(os.environ.get("EXECUTOR_QUEUE", str(4 * max(WORKERS, 1))))
+TIMEOUT = float(os.environ.get("EXECUTOR_TIMEOUT", "30"))
+MAX_RESULTS = 64
+
+log = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_in_worker = False
+_lock = threading.Lock()
+_spawn_lock = threading.Lock()
+_inflight: Dict[Hashable, Future] = {}
+_results: "OrderedDict[Hashable, Any]" = OrderedDict()
+_slots = threading.BoundedSemaphore(max(QUEUE_SIZE, 1))
+stats = {"submitted": 0, "deduplicated": 0, "hits": 0, "timeouts": 0, "rejected": 0, "inline": 0}
+
+
+def _init_worker(warehouse_dir: str) -> None:
+    global _in_worker
+    _in_worker = True
+    import warehouse
+    warehouse.WAREHOUSE_DIR = warehouse_dir
+
+
+@contextmanager
+def _bare_main():
+    """Swap sys.modules["__main__"] for a module without __file__ while processes are launched."""
+    with _spawn_lock:
+        saved = sys.modules.get("__main__")
+        bare = types.ModuleType("__main__")
+        sys.modules["__main__"] = bare
+        try:
+            yield
+        finally:
+            if sys.modules.get("__main__") is bare:  # a script run may have installed its own meanwhile
+                sys.modules["__main__"] = saved
+
+
+class _Pool(ProcessPoolExecutor):
+    # spawn-context pools start workers on demand inside submit()
+    def submit(self, *args, **kwargs):
+        with _bare_main():
+            return super().submit(*args, **kwargs)
+
+
+def pool() -> Optional[ProcessPoolExecutor]:
+    """The shared pool; None when disabled or inside a pool worker (no nested pools)."""
+    global _pool
+    if WORKERS <= 0 or _in_worker:
+        return None
+    with _lock:
+        if _pool is None:
+            import multiprocessing
+
+            import warehouse
+            # spawn: forking a threaded Streamlit server is not safe
+            _pool = _Pool(WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                          initializer=_init_worker,
+                          initargs=(os.path.abspath(warehouse.WAREHOUSE_DIR),))
+        return _pool
+
+
+def _reset() -> None:
+    global _pool
+    with _lock:
+        broken, _pool = _pool, None
+        _inflight.clear()
+    if broken is not None:
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _finished(key: Hashable, future: Future) -> None:
+    with _lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+            if not future.cancelled() and future.exception() is None:
+                _results[key] = future.result()
+                while len(_results) > MAX_RESULTS:
+                    _results.popitem(last=False)
+    _slots.release()
+
+
+def submit(key: Hashable, fn: Callable, *args) -> Optional[Future]:
+    """Future of fn(*args) on the pool, shared with an in-flight job of the same key; None if the queue is full."""
+    executor = pool()
+    with _lock:
+        future = _inflight.get(key)
+        if future is not None:
+            stats["deduplicated"] += 1
+            return future
+        if not _slots.acquire(blocking=False):
+            stats["rejected"] += 1
+            return None
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            _slots.release()
+            raise
+        _inflight[key] = future
+        stats["submitted"] += 1
+    future.add_done_callback(lambda f: _finished(key, f))
+    return future
+
+
+def run(key: Hashable, fn: Callable, *args, timeout: Optional[float] = None, placeholder: Any = None) -> Any:
+    """fn(*args) on the shared pool, or `placeholder` if the queue is full or it takes over `timeout` seconds."""
+    if pool() is None:
+        stats["inline"] += 1
+        return fn(*args)
+    with profiling.stage("aggregate", f"pool: {getattr(fn, '__qualname__', fn)}") as span:
+        with _lock:
+            if key in _results:
+                _results.move_to_end(key)
+                stats["hits"] += 1
+                span.cache = "hit"
+                return _results[key]
+        span.cache = "miss"
+        try:
+            future = submit(key, fn, *args)
+            if future is None:
+                return placeholder
+            return future.result(TIMEOUT if timeout is None else timeout)
+        except FutureTimeout:
+            stats["timeouts"] += 1
+            return placeholder
+        except BrokenProcessPool:
+            # a worker died (e.g. out of memory): start a fresh pool next time, answer inline now
+            log.exception("process pool broken; running %s inline", fn)
+            _reset()
+            stats["inline"] += 1
+            return fn(*args)
+
+
+def pending() -> int:
+    """Jobs queued or running."""
+    with _lock:
+        return len(_inflight)
+
+
+def shutdown() -> None:
+    _reset()
+
+
+# ---------- Streamlit ----------
+def show_pending(what: str) -> None:
+    """Placeholder for a result that is still being computed, with a button to check again."""
+    import streamlit as st
+
+    st.info(f"⏳ {what} is still being computed ({pending()} job(s) in progress).")
+    st.button("Check again", key=f"executor_retry_{what}")
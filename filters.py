@@ -0,0 +1,208 @@
+# filters.py
+# Shared Year/Program/Cohort/Phase filtering for the pages.
+#
+# Cohort_Master is indexed once per data version: every Cohort_ID gets an
+# integer code with its Year/Program stored as codes too, so a filter selection
+# resolves to a boolean vector over cohorts. Fact tables are then filtered by
+# looking their Cohort_ID codes up in that vector -- no merge per rerun -- and
+# the resulting row positions are memoized per (table version, filter state).
+#
+# FilterEngine.table() goes one step further for the pages: the filtered frame
+# itself is built once per (table version, columns, filter state) and shared by
+# every session in the process, which get zero-copy shallow copies of it
+# (copy-on-write keeps the shared frame unchanged). Selections that are one
+# contiguous block of rows -- e.g. one cohort of a table sorted by Cohort_ID --
+# are slices, which pandas does not copy at all.
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import profiling
+import utils
+
+PHASES = utils.PHASES
+VIEW_CACHE_BYTES = int(float(os.environ.get("VIEW_CACHE_MB", "128")) * 1024 * 1024)
+
+
+class FilterState(NamedTuple):
+    years: Tuple = ()
+    programs: Tuple = ()
+    cohorts: Tuple = ()
+    phases: Tuple = ()
+
+    @classmethod
+    def normalize(cls, years: Iterable = (), programs: Iterable = (), cohorts: Iterable = (),
+                  phases: Iterable = ()) -> "FilterState":
+        """Order-insensitive, hashable form of the widget selections."""
+        return cls(*(tuple(sorted(set(v), key=str)) for v in (years, programs, cohorts, phases)))
+
+
+class CohortIndex:
+    """Cohort_ID -> (Year, Program) as integer codes over the cohort dimension."""
+
+    def __init__(self, cm: pd.DataFrame):
+        cm = cm.drop_duplicates("Cohort_ID")
+        cm = cm[cm["Cohort_ID"].notna()]
+        self.cohorts = pd.Index(cm["Cohort_ID"].astype(str).to_numpy(), name="Cohort_ID")
+        year = pd.Categorical(cm["Year"]) if "Year" in cm.columns else pd.Categorical([None] * len(cm))
+        program = pd.Categorical(cm["Program"]) if "Program" in cm.columns else pd.Categorical([None] * len(cm))
+        self.years = [v.item() if hasattr(v, "item") else v for v in year.categories]
+        self.programs = list(program.categories)
+        self.year_codes = np.asarray(year.codes)
+        self.program_codes = np.asarray(program.codes)
+
+    def __len__(self) -> int:
+        return len(self.cohorts)
+
+    def codes(self, cohort_ids: pd.Series) -> np.ndarray:
+        """Position of each Cohort_ID in the index, -1 when unknown."""
+        codes = self.cohorts.get_indexer(cohort_ids.astype(str))
+        codes[cohort_ids.isna().to_numpy()] = -1
+        return codes
+
+    def cohort_mask(self, state: FilterState) -> Optional[np.ndarray]:
+        """Boolean over codes (last slot = unknown cohort), or None when no cohort-level filter is set."""
+        if not (state.years or state.programs or state.cohorts):
+            return None
+        mask = np.ones(len(self) + 1, dtype=bool)
+        mask[-1] = False  # unknown cohorts have no Year/Program, as with a left merge
+        if state.years:
+            wanted = np.array([y in state.years for y in self.years] + [False])
+            mask[:-1] &= wanted[self.year_codes]
+        if state.programs:
+            wanted = np.array([p in state.programs for p in self.programs] + [False])
+            mask[:-1] &= wanted[self.program_codes]
+        if state.cohorts:
+            mask[:-1] &= self.cohorts.isin(state.cohorts)
+        return mask
+
+
+def _phase_mask(phase: pd.Series, phases: Tuple) -> np.ndarray:
+    if isinstance(phase.dtype, pd.CategoricalDtype):
+        allowed = np.append(phase.cat.categories.isin(phases), False)
+        return allowed[phase.cat.codes.to_numpy()]
+    return phase.isin(phases).to_numpy()
+
+
+def take(df: pd.DataFrame, rows: np.ndarray) -> pd.DataFrame:
+    """df.iloc[rows] for sorted positions; a zero-copy slice when they are one contiguous run."""
+    if len(rows) == len(df):
+        return df
+    if len(rows) == 0 or rows[-1] - rows[0] == len(rows) - 1:
+        return df.iloc[rows[0]:rows[-1] + 1] if len(rows) else df.iloc[:0]
+    return df.iloc[rows]
+
+
+# Shared (unfiltered and filtered) frames of FilterEngine.table(), keyed by
+# (table, data version, columns, filter state or None).
+_views = utils.TableCache(VIEW_CACHE_BYTES)
+utils.register_invalidation_hook(
+    lambda name: _views.clear() if name is None else _views.invalidate(lambda key: key[0] == name))
+
+
+class FilterEngine:
+    """Resolves FilterState selections to row positions for any fact table."""
+
+    def __init__(self, index: CohortIndex, max_entries: int = 256):
+        self.index = index
+        self.max_entries = max_entries
+        self._codes: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._rows: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _memo(self, store: OrderedDict, key: Hashable, compute):
+        if key is not None:
+            with self._lock:
+                if key in store:
+                    store.move_to_end(key)
+                    return store[key]
+        value = compute()
+        if key is not None:
+            with self._lock:
+                store[key] = value
+                while len(store) > self.max_entries:
+                    store.popitem(last=False)
+        return value
+
+    def row_index(self, df: pd.DataFrame, state: FilterState, table: Optional[str] = None) -> np.ndarray:
+        """Positions of the rows of `df` that pass `state`.
+
+        Pass `table` (the warehouse table `df` was loaded from, unmodified) to
+        memoize the result for that table version.
+        """
+        version = utils.data_version(table) if table else None
+
+        def compute() -> np.ndarray:
+            profiling.annotate(cache="miss")
+            keep = np.ones(len(df), dtype=bool)
+            cmask = self.index.cohort_mask(state)
+            if cmask is not None and "Cohort_ID" in df.columns:
+                codes = self._memo(self._codes, version, lambda: self.index.codes(df["Cohort_ID"]))
+                keep &= cmask[codes]
+            if state.phases and "Phase" in df.columns:
+                keep &= _phase_mask(df["Phase"], state.phases)
+            return np.flatnonzero(keep)
+
+        return self._memo(self._rows, version and (version, state), compute)
+
+    def apply(self, df: pd.DataFrame, state: FilterState, table: Optional[str] = None) -> pd.DataFrame:
+        with profiling.stage("filter", table or "", rows_in=len(df)) as span:
+            span.cache = "hit"
+            idx = self.row_index(df, state, table)
+            span.rows_out = len(idx)
+            return take(df, idx)
+
+    def table(self, name: str, state: FilterState, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Rows of warehouse table `name` passing `state`, Phase ordered, shared across sessions.
+
+        Use instead of load_table + phase_order + apply when the page does not
+        need the unfiltered table. The result is a shallow copy: mutating it
+        (copy-on-write) never touches the shared frame.
+        """
+        cols = tuple(columns) if columns is not None else None
+        key = (name, utils.data_version("Cohort_Master", name), cols)
+        with profiling.stage("filter", f"{name} (shared)") as span:
+            span.cache = "hit"
+            out = _views.get(key + (state,))
+            if out is None:
+                span.cache = "miss"
+                base = _views.get(key + (None,))
+                if base is None:
+                    base = utils.phase_order(utils.load_table(name, columns=cols))
+                    _views.put(key + (None,), base)
+                span.rows_in = len(base)
+                out = take(base, self.row_index(base, state, name))
+                if out is not base:
+                    _views.put(key + (state,), out)
+            span.rows_out = len(out)
+            return out.copy(deep=False)
+
+
+# ---------- process-wide engine, rebuilt when Cohort_Master changes ----------
+_engine_lock = threading.Lock()
+_engine: Tuple = (None, None)
+
+
+def get_engine() -> FilterEngine:
+    global _engine
+    version = utils.data_version("Cohort_Master")
+    with _engine_lock:
+        if _engine[0] != version:
+            cm = utils.load_table("Cohort_Master", columns=["Cohort_ID", "Year", "Program"])
+            _engine = (version, FilterEngine(CohortIndex(cm)))
+        return _engine[1]
+
+
+def filter_widgets(index: CohortIndex) -> FilterState:
+    """The four Year/Program/Cohort/Phase multiselects shared by pages 1-5."""
+    col1, col2, col3, col4 = st.columns(4)
+    year = col1.multiselect("Year", sorted(index.years))
+    program = col2.multiselect("Program", sorted(index.programs, key=str))
+    cohort = col3.multiselect("Cohort", sorted(index.cohorts))
+    phase = col4.multiselect("Phase", PHASES, default=PHASES)
+    return FilterState.normalize(year, program, cohort, phase)
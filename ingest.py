@@ -0,0 +1,253 @@
+# ingest.py
+# Streaming ingestion for the Data Uploader.
+#
+# Uploads are read in chunks of CHUNK_ROWS rows: the header is checked
+# against SCHEMAS_DTYPES on the first chunk (missing columns fail before
+# anything is written), each chunk is typed and appended to a temporary
+# warehouse file, and the file is swapped in only once every chunk succeeded.
+# Peak memory is one chunk, whatever the upload size. The upload mode
+# (replace / append / upsert / replace_partition) decides how the staged rows
+# are combined with the stored table -- see warehouse.DatasetWriter.
+#
+# Multi-sheet workbooks go through ingest_workbook(): the .xlsx is opened once
+# in openpyxl read-only mode and every sheet (or region of a sheet) listed in a
+# declarative layout (WORKBOOKS) is streamed into its dataset the same way.
+# Nothing is published until every mapped sheet has been validated and staged;
+# then all datasets are committed and the derived tables rebuilt once.
+import contextlib
+import io
+import itertools
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+import cube
+import journey
+import utils
+import visit_metrics
+import warmup
+import weeks
+from utils import NATURAL_KEYS, SCHEMAS_DTYPES, validate_schema
+from validation import ValidationReport
+from warehouse import DatasetWriter
+
+CHUNK_ROWS = int(os.environ.get("INGEST_CHUNK_ROWS", "100000"))
+
+# progress(rows_written, fraction_of_input_read or None)
+ProgressFn = Callable[[int, Optional[float]], None]
+
+
+class SchemaError(ValueError):
+    def __init__(self, dataset: str, missing: List[str]):
+        super().__init__(f"Missing columns for {dataset}: {missing}")
+        self.dataset = dataset
+        self.missing = missing
+
+
+@dataclass
+class IngestResult:
+    dataset: str
+    path: str
+    rows: int
+    extra_columns: List[str]
+    preview: pd.DataFrame
+    report: ValidationReport
+
+
+# ---------- chunked readers ----------
+def _name(source) -> str:
+    return str(getattr(source, "name", source)).lower()
+
+
+def _size(source) -> Optional[int]:
+    size = getattr(source, "size", None)
+    if size is None and hasattr(source, "fileno"):
+        try:
+            size = os.fstat(source.fileno()).st_size
+        except (OSError, io.UnsupportedOperation):  # in-memory buffers (io.BytesIO) have no descriptor
+            size = len(source.getbuffer()) if hasattr(source, "getbuffer") else None
+    return size or None
+
+
+def iter_csv_chunks(source, chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    with pd.read_csv(source, chunksize=chunksize) as reader:
+        yield from reader
+
+
+def _header(value, i: int) -> str:
+    # template headers wrap ("Campus\n(SG/DXB/MUM)"); collapse whitespace
+    return " ".join(str(value).split()) if value is not None else f"Unnamed: {i}"
+
+
+def iter_sheet_chunks(ws, chunksize: int = CHUNK_ROWS, header_row: int = 1,
+                      columns: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """Stream a read-only worksheet: header on `header_row`, optionally only the Excel column range `columns`."""
+    min_col = max_col = None
+    if columns:
+        from openpyxl.utils import range_boundaries
+
+        min_col, _, max_col, _ = range_boundaries(columns)
+    rows = ws.iter_rows(min_row=header_row, min_col=min_col, max_col=max_col, values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    names = [_header(c, i) for i, c in enumerate(header)]
+    while True:
+        block = [r for r in itertools.islice(rows, chunksize) if any(v is not None for v in r)]
+        if not block:
+            break
+        yield pd.DataFrame(block, columns=names)
+
+
+def iter_excel_chunks(source, chunksize: int = CHUNK_ROWS, sheet: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """Stream one worksheet (the first by default) in read-only mode."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        yield from iter_sheet_chunks(wb[sheet] if sheet else wb.worksheets[0], chunksize)
+    finally:
+        wb.close()
+
+
+def iter_chunks(source, chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    if _name(source).endswith((".xlsx", ".xlsm")):
+        return iter_excel_chunks(source, chunksize)
+    if _name(source).endswith(".xls"):
+        # legacy .xls has no streaming reader; load it in one go
+        return iter([pd.read_excel(source)])
+    return iter_csv_chunks(source, chunksize)
+
+
+# ---------- ingest ----------
+def refresh_derived(*datasets: str) -> None:
+    """Invalidate caches for `datasets`, rebuild the tables derived from them (once each) and re-warm the caches."""
+    for dataset in datasets:
+        utils.invalidate_table(dataset)
+    if visit_metrics.SOURCE in datasets:
+        visit_metrics.update()
+    if any(d in cube.SOURCES or d == visit_metrics.SOURCE for d in datasets):
+        cube.build_cube()
+    if weeks.SOURCE in datasets:
+        weeks.update()
+    if any(d in journey.SOURCES or d == visit_metrics.SOURCE for d in datasets):
+        journey.build()
+    warmup.start(f"upload {', '.join(datasets)}")
+
+
+def ingest(source, dataset: str, chunksize: int = CHUNK_ROWS, progress: Optional[ProgressFn] = None,
+           fmt: Optional[str] = None, mode: str = "replace") -> IngestResult:
+    """Validate, type and write `source` (path or file-like, CSV/Excel) into warehouse table `dataset`.
+
+    `mode` is one of warehouse.MODES; upserts match rows on NATURAL_KEYS[dataset].
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as fh:
+            return ingest(fh, dataset, chunksize, progress, fmt, mode)
+    expected = list(SCHEMAS_DTYPES[dataset])
+    chunks = iter_chunks(source, chunksize)
+    first = next(chunks, None)
+    if first is None:
+        raise SchemaError(dataset, expected)
+    missing = [c for c in expected if c not in first.columns]
+    if missing:
+        getattr(chunks, "close", lambda: None)()  # release the reader while `source` is still open
+        raise SchemaError(dataset, missing)
+    extra = [c for c in first.columns if c not in expected]
+
+    size = _size(source)
+    preview = None
+    report = ValidationReport(dataset)
+    with DatasetWriter(dataset, mode, NATURAL_KEYS.get(dataset), fmt) as writer:
+        for chunk in itertools.chain([first], chunks):
+            chunk, chunk_report = validate_schema(chunk[expected], dataset, row_offset=writer.rows)
+            report.merge(chunk_report)
+            writer.write(chunk)
+            if preview is None:
+                preview = chunk.head()
+            if progress is not None:
+                fraction = source.tell() / size if size and hasattr(source, "tell") else None
+                progress(writer.rows, None if fraction is None else min(fraction, 1.0))
+        path = writer.commit()
+    refresh_derived(dataset)
+    return IngestResult(dataset, path, writer.rows, extra, preview, report)
+
+
+# ---------- workbooks ----------
+@dataclass(frozen=True)
+class SheetMap:
+    """Where one dataset sits in a workbook."""
+    sheet: str
+    dataset: str
+    header_row: int = 1                # 1-based row holding the column names
+    columns: Optional[str] = None      # Excel column range of the region, e.g. "A:N" (whole sheet by default)
+    rename: Dict[str, str] = field(default_factory=dict)   # workbook header -> schema column
+
+
+# Named workbook layouts. "warehouse" is a workbook with one sheet per dataset,
+# named after it (an export of data/warehouse). The trackers in data/templates
+# collect student- and unit-level inputs without Cohort_ID/Phase, so they need
+# a layout of their own (header row, region, renames) once they map onto a
+# schema.
+WORKBOOKS: Dict[str, List[SheetMap]] = {
+    "warehouse": [SheetMap(name, name) for name in SCHEMAS_DTYPES],
+}
+
+
+def ingest_workbook(source, layout: Optional[List[SheetMap]] = None, chunksize: int = CHUNK_ROWS,
+                    progress: Optional[ProgressFn] = None, fmt: Optional[str] = None,
+                    mode: str = "replace") -> List[IngestResult]:
+    """Validate and write every mapped sheet of an .xlsx workbook in one read-only pass.
+
+    `layout` defaults to WORKBOOKS["warehouse"]; mapped sheets the workbook
+    lacks are skipped. Several sheets may feed one dataset (their rows are
+    combined). All datasets are published only after every sheet succeeded.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as fh:
+            return ingest_workbook(fh, layout, chunksize, progress, fmt, mode)
+    from openpyxl import load_workbook
+
+    layout = WORKBOOKS["warehouse"] if layout is None else layout
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        present = [m for m in layout if m.sheet in wb.sheetnames]
+        if not present:
+            raise ValueError(f"No sheet of the workbook is mapped to a dataset (sheets: {wb.sheetnames}; "
+                             f"expected one of {[m.sheet for m in layout]})")
+        writers: Dict[str, DatasetWriter] = {}
+        extras: Dict[str, List[str]] = {}
+        previews: Dict[str, pd.DataFrame] = {}
+        reports: Dict[str, ValidationReport] = {}
+        with contextlib.ExitStack() as stack:
+            for done, m in enumerate(present):
+                expected = list(SCHEMAS_DTYPES[m.dataset])
+                chunks = (c.rename(columns=m.rename) for c in
+                          iter_sheet_chunks(wb[m.sheet], chunksize, m.header_row, m.columns))
+                first = next(chunks, None)
+                if first is None:
+                    raise SchemaError(m.dataset, expected)
+                missing = [c for c in expected if c not in first.columns]
+                if missing:
+                    raise SchemaError(m.dataset, missing)
+                extras.setdefault(m.dataset, []).extend(c for c in first.columns if c not in expected)
+                if m.dataset not in writers:
+                    writers[m.dataset] = stack.enter_context(
+                        DatasetWriter(m.dataset, mode, NATURAL_KEYS.get(m.dataset), fmt))
+                    reports[m.dataset] = ValidationReport(m.dataset)
+                writer = writers[m.dataset]
+                for chunk in itertools.chain([first], chunks):
+                    chunk, chunk_report = validate_schema(chunk[expected], m.dataset, row_offset=writer.rows)
+                    reports[m.dataset].merge(chunk_report)
+                    writer.write(chunk)
+                    previews.setdefault(m.dataset, chunk.head())
+                    if progress is not None:
+                        progress(sum(w.rows for w in writers.values()), done / len(present))
+            paths = {name: writer.commit() for name, writer in writers.items()}
+    finally:
+        wb.close()
+    refresh_derived(*paths)
+    return [IngestResult(name, paths[name], writers[name].rows, extras[name], previews[name], reports[name])
+            for name in paths]
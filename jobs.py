@@ -0,0 +1,216 @@
+# jobs.py
+# Background ingestion jobs for the Data Uploader.
+#
+# submit() spools an upload to a temporary file and queues it; one daemon
+# worker thread runs ingest.ingest() / ingest.ingest_workbook() on the queued
+# jobs in order (one at a time, so two uploads of a dataset never interleave)
+# and records each job's state, rows written and progress. The script run that
+# submitted returns at once; the uploader page looks the job up by id and
+# show_job() refreshes its status every POLL_SECONDS while it is active, then
+# reruns the page to show the outcome. What a job writes is published by the
+# warehouse writers: staged in a temp file / staging directory next to the
+# table and swapped in with os.replace, so a page reads either the old or the
+# complete new table.
+# The last MAX_JOBS jobs are kept for the status list.
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import List, Optional
+
+import ingest
+from ingest import IngestResult, SchemaError
+
+MAX_JOBS = 50
+POLL_SECONDS = 1.0      # status refresh interval of show_job()
+WORKBOOK = "workbook"   # Job.dataset of an ingest_workbook() job
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    id: str
+    dataset: str                   # warehouse dataset, or WORKBOOK
+    filename: str
+    mode: str
+    state: str = "queued"          # queued / running / done / failed
+    rows: int = 0
+    fraction: Optional[float] = None
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    error: str = ""
+    missing: List[str] = field(default_factory=list)   # columns a SchemaError reported
+    results: List[IngestResult] = field(default_factory=list)
+    path: str = ""                 # spooled upload, removed once the job ends
+
+    @property
+    def active(self) -> bool:
+        return self.state in ("queued", "running")
+
+    @property
+    def seconds(self) -> Optional[float]:
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+
+_jobs: "OrderedDict[str, Job]" = OrderedDict()
+_queue: "queue.Queue[str]" = queue.Queue()
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+
+
+def get(job_id: str) -> Optional[Job]:
+    """Snapshot of job `job_id` (None if unknown or expired)."""
+    with _lock:
+        job = _jobs.get(job_id)
+        return replace(job, missing=list(job.missing), results=list(job.results)) if job is not None else None
+
+
+def recent() -> List[Job]:
+    """Snapshots of the kept jobs, newest first."""
+    with _lock:
+        ids = list(reversed(_jobs))
+    return [j for j in map(get, ids) if j is not None]
+
+
+def _update(job_id: str, **changes) -> None:
+    with _lock:
+        job = _jobs[job_id]
+        for k, v in changes.items():
+            setattr(job, k, v)
+
+
+def _run(job_id: str) -> None:
+    with _lock:
+        job = _jobs[job_id]
+        job.state, job.started = "running", time.time()
+        dataset, path, mode = job.dataset, job.path, job.mode
+
+    def progress(rows: int, fraction: Optional[float]) -> None:
+        _update(job_id, rows=rows, fraction=fraction)
+
+    try:
+        if dataset == WORKBOOK:
+            results = ingest.ingest_workbook(path, progress=progress, mode=mode)
+        else:
+            results = [ingest.ingest(path, dataset, progress=progress, mode=mode)]
+        _update(job_id, state="done", results=results, rows=sum(r.rows for r in results), fraction=1.0)
+    except SchemaError as e:
+        _update(job_id, state="failed", error=str(e), missing=list(e.missing))
+    except Exception as e:  # reported on the page; the worker keeps serving the queue
+        log.exception("ingestion job %s failed", job_id)
+        _update(job_id, state="failed", error=str(e))
+    finally:
+        _update(job_id, finished=time.time())
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _worker() -> None:
+    while True:
+        _run(_queue.get())
+        _queue.task_done()
+
+
+def _ensure_worker() -> None:
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_worker, name="ingest-jobs", daemon=True)
+            _thread.start()
+
+
+def submit(source, filename: str, dataset: str, mode: str = "replace") -> str:
+    """Queue an upload (file-like, read from the start) for `dataset` (or WORKBOOK); returns the job id."""
+    job_id = uuid.uuid4().hex[:12]
+    # keep the extension: ingest picks the reader from it
+    fd, path = tempfile.mkstemp(prefix=f"upload-{job_id}-", suffix=os.path.splitext(filename)[1].lower())
+    with os.fdopen(fd, "wb") as fh:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        shutil.copyfileobj(source, fh)
+    with _lock:
+        _jobs[job_id] = Job(job_id, dataset, filename, mode, path=path)
+        while len(_jobs) > MAX_JOBS:
+            oldest = next(iter(_jobs))
+            if _jobs[oldest].active:
+                break
+            del _jobs[oldest]
+    _ensure_worker()
+    _queue.put(job_id)
+    return job_id
+
+
+def wait(job_id: str, timeout: Optional[float] = None) -> Optional[Job]:
+    """Block until job `job_id` has ended (for scripts); its snapshot, still active on timeout."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        job = get(job_id)
+        if job is None or not job.active or (deadline is not None and time.monotonic() >= deadline):
+            return job
+        time.sleep(0.05)
+
+
+# ---------- Streamlit ----------
+def _show_state(job: Job) -> None:
+    import streamlit as st
+
+    if job.state == "queued":
+        ahead = sum(1 for j in recent() if j.state in ("queued", "running") and j.submitted < job.submitted)
+        st.info(f"⏳ Upload {job.id} ({job.filename}) is queued behind {ahead} job(s).")
+    elif job.state == "running":
+        st.progress(job.fraction if job.fraction is not None else 0.5,
+                    text=f"Upload {job.id} ({job.filename}): {job.rows:,} rows written, {job.seconds:.0f}s")
+    elif job.state == "failed":
+        st.error(f"Missing columns: {job.missing}" if job.missing else f"Upload failed: {job.error}")
+
+
+def _poll(job_id: str) -> None:
+    # one poll: redraw the status; once the job has ended, rerun the page so it shows the outcome
+    import streamlit as st
+
+    job = get(job_id)
+    if job is None or not job.active:
+        st.rerun()
+    _show_state(job)
+
+
+def show_job(job: Job) -> None:
+    """Status of `job`, refreshed every POLL_SECONDS while it is queued or running, or how it ended."""
+    import streamlit as st
+
+    if not job.active:
+        _show_state(job)
+        return
+    # st.fragment (experimental_fragment on older Streamlit) reruns only the status every POLL_SECONDS
+    fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    if fragment is not None:
+        fragment(run_every=POLL_SECONDS)(_poll)(job.id)
+        return
+    _show_state(job)
+    time.sleep(POLL_SECONDS)
+    st.rerun()
+
+
+def show_recent(container=None) -> None:
+    """Table of the kept jobs (id, dataset, file, state, rows, seconds)."""
+    import pandas as pd
+    import streamlit as st
+
+    rows = [{"job": j.id, "dataset": j.dataset, "file": j.filename, "mode": j.mode, "state": j.state,
+             "rows": j.rows, "seconds": None if j.seconds is None else round(j.seconds, 1), "error": j.error}
+            for j in recent()]
+    box = container if container is not None else st
+    if rows:
+        box.dataframe(pd.DataFrame(rows), hide_index=True)
+    else:
+        box.caption("No uploads in this server process yet.")
@@ -0,0 +1,133 @@
+# journey.py
+# Materialized Cohort_Journey table: every tool and placement fact of a cohort
+# phase in one wide row.
+#
+# One row per (Cohort_ID, Phase) holding the SOURCES columns of the tutor,
+# mentor and JPT cohort tables, of Placements_Cohort and of Visit_Metrics (the
+# visit metrics visit_metrics.py derives from Company_Visits), outer-joined (a
+# source with several rows for a key contributes their mean), a Has_<table>
+# flag per source, and the DERIVED Post - Pre deltas and rates. Columns that
+# more than one source carries (e.g. Higher_Degree_Admissions) are stored as
+# "<table>.<column>"; column() gives the stored name. The analytics views are
+# projections of it (analytics.view_frame), so pages never join per rerun.
+# Rebuilt after uploads of any source or of Company_Visits
+# (ingest.refresh_derived), whenever it is older than one of them and when it
+# was stored with other SOURCES.
+import os
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+import utils
+import visit_metrics
+import warehouse
+
+JOURNEY_TABLE = "Cohort_Journey"
+KEYS = ["Cohort_ID", "Phase"]
+
+# source table -> its columns in the journey (ones the table lacks are left out)
+SOURCES: Dict[str, List[str]] = {
+    "Tutor_Cohort_Summary": ["PreTutor_Exam_Avg", "PostTutor_Exam_Avg", "Higher_Degree_Attempts",
+                             "Higher_Degree_Admissions"],
+    "Mentor_Cohort": ["PreMentor_Capstone_Grade_Avg", "PostMentor_Capstone_Grade_Avg", "Grade_A_Distribution_%_Pre",
+                      "Grade_A_Distribution_%_Post", "PostMentor_Exam_Avg", "Higher_Degree_Attempts",
+                      "Higher_Degree_Admissions"],
+    "JPT_Cohort": ["Total_JPT_Sessions", "Avg_Sessions_Per_Student", "Avg_AI_Technical", "Avg_AI_Communication",
+                   "Avg_AI_Confidence", "PreJPT_Conv_Rate_Per_Opening_%", "PostJPT_Conv_Rate_Per_Opening_%",
+                   "Tier1_Offers_Before", "Tier1_Offers_After", "Avg_Package_Before", "Avg_Package_After"],
+    "Placements_Cohort": ["Avg_Package", "Tier1_Offers", "Offers", "Placed", "Eligible"],
+    visit_metrics.METRICS_TABLE: ["Avg_Conversion_Per_Visit_%", "Avg_Openings_Per_Visit"],
+}
+
+# name -> (a, op, b): "-" is a - b, "%" is 100 * a / b (0 when b is 0)
+DERIVED: Dict[str, Tuple[str, str, str]] = {
+    "Exam_Improvement": ("PostTutor_Exam_Avg", "-", "PreTutor_Exam_Avg"),
+    "Capstone_Improvement": ("PostMentor_Capstone_Grade_Avg", "-", "PreMentor_Capstone_Grade_Avg"),
+    "Grade_A_Improvement": ("Grade_A_Distribution_%_Post", "-", "Grade_A_Distribution_%_Pre"),
+    "Conv_Improvement": ("PostJPT_Conv_Rate_Per_Opening_%", "-", "PreJPT_Conv_Rate_Per_Opening_%"),
+    "Package_Improvement": ("Avg_Package_After", "-", "Avg_Package_Before"),
+    "Tier1_Improvement": ("Tier1_Offers_After", "-", "Tier1_Offers_Before"),
+    "Tier1_Rate_%": ("Tier1_Offers", "%", "Offers"),
+}
+
+_SHARED = {c for c, n in Counter(c for cols in SOURCES.values() for c in cols).items() if n > 1}
+
+
+def column(table: str, col: str) -> str:
+    """Stored journey name of `table`'s column `col`."""
+    return f"{table}.{col}" if col in _SHARED else col
+
+
+def flag(table: str) -> str:
+    """Column that is True on the rows `table` has a row for."""
+    return f"Has_{table}"
+
+
+def derive(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the DERIVED columns whose inputs are in `df` (float64 inputs)."""
+    for name, (a, op, b) in DERIVED.items():
+        if a in df.columns and b in df.columns:
+            if op == "-":
+                df[name] = df[a] - df[b]
+            else:
+                df[name] = (100 * df[a] / df[b].where(df[b] != 0)).fillna(0.0).where(df[a].notna() & df[b].notna())
+    return df
+
+
+def _source(table: str) -> pd.DataFrame:
+    """One row per key of `table`: the mean of its SOURCES columns, as float64."""
+    if warehouse.find_table(table) is None:
+        return pd.DataFrame(columns=KEYS + [flag(table)])
+    df = utils.load_table(table, columns=KEYS + SOURCES[table])
+    cols = [c for c in SOURCES[table] if c in df.columns]
+    values = {column(table, c): pd.to_numeric(df[c], errors="coerce").astype("float64") for c in cols}
+    out = pd.DataFrame({k: df[k].astype("string") for k in KEYS} | values)
+    out = out.groupby(KEYS, dropna=False, sort=False).mean().reset_index()
+    out[flag(table)] = True
+    return out
+
+
+def build(write: bool = True) -> pd.DataFrame:
+    """Outer-join every source on (Cohort_ID, Phase) and add the derived columns (stored when `write`)."""
+    out = None
+    for table in SOURCES:
+        part = _source(table)
+        out = part if out is None else out.merge(part, on=KEYS, how="outer")
+    for table in SOURCES:
+        out[flag(table)] = out[flag(table)].astype("boolean").fillna(False).astype(bool)
+    values = [c for c in out.columns if c not in KEYS and not c.startswith("Has_")]
+    out[values] = out[values].astype("float64")
+    # cohorts, then phases in utils.PHASES order (unknown phases last), like the source tables
+    rank = {p: i for i, p in enumerate(utils.PHASES)}
+    out = derive(out).sort_values(KEYS, key=lambda s: s.map(rank).fillna(len(rank)) if s.name == "Phase" else s,
+                                  ignore_index=True)
+    if write:
+        warehouse.write_table(out, JOURNEY_TABLE)
+        utils.invalidate_table(JOURNEY_TABLE)
+    return out
+
+
+def is_stale() -> bool:
+    path = warehouse.find_table(JOURNEY_TABLE)
+    if path is None:
+        return True
+    built = os.stat(path).st_mtime_ns
+    for table in SOURCES:
+        src = warehouse.find_table(table)
+        if src is not None and os.stat(src).st_mtime_ns > built:
+            return True
+    return False
+
+
+def load() -> pd.DataFrame:
+    """Cohort_Journey, rebuilt first if a source is newer or it lacks a source."""
+    if visit_metrics.is_stale():
+        visit_metrics.update()
+    if is_stale():
+        build()
+    df = utils.load_table(JOURNEY_TABLE)
+    if any(flag(table) not in df.columns for table in SOURCES):  # stored with other SOURCES
+        build()
+        df = utils.load_table(JOURNEY_TABLE)
+    return df
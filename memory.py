@@ -0,0 +1,143 @@
+# memory.py
+# Process memory report: shared caches vs what each session adds.
+#
+# Warehouse tables are held once per process (utils table cache) and the
+# pages' filtered frames once per filter state (filters.FilterEngine.table);
+# sessions only hold shallow copies of those plus their widget state and
+# profiling traces. report() breaks the process down that way (shown in the
+# ?debug=1 panel); the CLI measures how RSS grows with concurrent sessions by
+# keeping N headless sessions of a page alive in one process. --tables prints
+# utils.memory_report() (bytes per table and column before/after compact dtypes):
+#
+#   python memory.py --warehouse data/warehouse --page 4_JPT --sessions 1 10 50
+#   python memory.py --warehouse data/warehouse --tables
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def _deep_bytes(value, seen: Optional[set] = None) -> int:
+    """Rough deep size of a session_state value (frames by their buffers)."""
+    import pandas as pd
+
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum()) if isinstance(value, pd.DataFrame) \
+            else int(value.memory_usage(deep=True))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_bytes(k, seen) + _deep_bytes(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)) or type(value).__name__ == "deque":
+        size += sum(_deep_bytes(v, seen) for v in value)
+    elif hasattr(value, "__dict__"):
+        size += _deep_bytes(vars(value), seen)
+    return size
+
+
+def session_bytes() -> int:
+    """Approximate bytes held in the current session's st.session_state."""
+    import streamlit as st
+
+    try:
+        return sum(_deep_bytes(st.session_state[k]) for k in list(st.session_state.keys()))
+    except Exception:
+        return 0
+
+
+def report() -> Dict[str, float]:
+    """RSS and the shared caches of this process, in MB."""
+    import charts
+    import filters
+    import utils
+
+    chart_bytes = sum(len(v) for v in list(charts._cache.values()) if isinstance(v, bytes))
+    return {
+        "rss_mb": round(rss_mb(), 1),
+        "tables_mb": round(utils.cache_stats()["bytes"] / 2**20, 1),
+        "filtered_views_mb": round(filters._views.nbytes / 2**20, 1),
+        "chart_images_mb": round(chart_bytes / 2**20, 1),
+    }
+
+
+# ---------- sessions benchmark ----------
+_APP = """
+import sys
+sys.path.insert(0, {root!r})
+exec(compile(open({path!r}).read(), {path!r}, "exec"))
+"""
+
+
+def measure(page: str, levels: List[int], timeout: float = 300.0) -> List[dict]:
+    """RSS with 1..max(levels) live sessions of `page`; rotating cohort filters so sessions differ."""
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    import gc
+
+    from streamlit.testing.v1 import AppTest
+
+    path = os.path.join(ROOT, "pages", f"{page}.py")
+    sessions, out = [], []
+    for n in range(1, max(levels) + 1):
+        at = AppTest.from_string(_APP.format(root=ROOT, path=path), default_timeout=timeout).run()
+        cohort = next((w for w in at.multiselect if w.label == "Cohort"), None)
+        if cohort is not None and cohort.options and n % 2 == 0:
+            # every other session looks at one cohort (a handful of distinct filter states)
+            cohort.set_value([cohort.options[(n // 2) % min(len(cohort.options), 5)]])
+            at.run()
+        sessions.append(at)
+        if n in levels:
+            gc.collect()
+            row = {"sessions": n, **report(), "errors": sum(len(a.exception) for a in sessions)}
+            out.append(row)
+            print(json.dumps(row), file=sys.stderr)
+    base = out[0]["rss_mb"]
+    for row in out[1:]:
+        row["per_session_mb"] = round((row["rss_mb"] - base) / (row["sessions"] - out[0]["sessions"]), 3)
+    return out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="RSS growth with concurrent headless sessions.")
+    ap.add_argument("--warehouse", default=os.environ.get("WAREHOUSE_DIR", "data/warehouse"))
+    ap.add_argument("--page", default="4_JPT")
+    ap.add_argument("--sessions", nargs="+", type=int, default=[1, 10, 50])
+    ap.add_argument("--timeout", type=float, default=300.0, help="seconds per script run")
+    ap.add_argument("--tables", action="store_true", help="load every schema table and print the dtype report")
+    args = ap.parse_args(argv)
+
+    os.environ["WAREHOUSE_DIR"] = os.path.abspath(args.warehouse)
+    os.environ.setdefault("WARMUP", "0")
+    if args.tables:
+        sys.path.insert(0, ROOT)
+        import utils
+        import warehouse
+
+        for name in utils.SCHEMAS_DTYPES:
+            if warehouse.find_table(name) is not None:
+                utils.load_table(name)
+        print(utils.memory_report().to_string(index=False))
+        return 0
+    print(json.dumps(measure(args.page, sorted(set(args.sessions)), args.timeout), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
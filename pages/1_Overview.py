@@ -1,39 +1,40 @@
-
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from utils import load_csv, phase_order
+from profiling import debug_panel, profile_page, stage
+
+profile_page("Overview")
+with stage("import", "page modules"):
+    import pandas as pd
+    from utils import phase_order, data_version
+    from filters import filter_widgets, get_engine
+    from charts import plt, show_chart
+    import cube
+    import visit_metrics
+    import warmup
+warmup.ensure_started()
 
 
 st.header("Executive Overview")
 
-cm = load_csv("data/warehouse/Cohort_Master.csv")
-pc = load_csv("data/warehouse/Placements_Cohort.csv")
-jpt = load_csv("data/warehouse/JPT_Cohort.csv")
-tutor = load_csv("data/warehouse/Tutor_Cohort_Summary.csv")
-mentor = load_csv("data/warehouse/Mentor_Cohort.csv")
-pc = phase_order(pc); jpt = phase_order(jpt); tutor = phase_order(tutor); mentor = phase_order(mentor)
-
-# Filters
-colf1, colf2, colf3, colf4 = st.columns(4)
-year = colf1.multiselect("Year", sorted(cm["Year"].unique()))
-program = colf2.multiselect("Program", sorted(cm["Program"].unique()))
-cohort = colf3.multiselect("Cohort", sorted(cm["Cohort_ID"].unique()))
-phase = colf4.multiselect("Phase", ["Pre-AI","Yoodli","JPT"], default=["Pre-AI","Yoodli","JPT"])
-
-def apply_filters(df):
-    if "Cohort_ID" in df.columns:
-        df = df.merge(cm[["Cohort_ID","Year","Program"]], on="Cohort_ID", how="left")
-    if year: df = df[df["Year"].isin(year)]
-    if program: df = df[df["Program"].isin(program)]
-    if cohort: df = df[df["Cohort_ID"].isin(cohort)]
-    if phase and "Phase" in df.columns: df = df[df["Phase"].isin(phase)]
-    return df
-
-pc_f = apply_filters(pc)
-jpt_f = apply_filters(jpt)
-tut_f = apply_filters(tutor)
-men_f = apply_filters(mentor)
+# Filters (from Cohort_Master only, so they show before the fact tables load)
+engine = get_engine()
+filters = filter_widgets(engine.index)
+
+# Every tile below is a roll-up of the pre-aggregated KPI cube (sums and counts
+# per Year/Program/Cohort/Phase cell), never a scan of the row-level tables.
+kc = phase_order(cube.load_cube())
+
+cells = engine.apply(kc, filters, cube.CUBE_TABLE)
+with stage("aggregate", "cube roll-up", rows_in=len(cells)):
+    tot = cube.rollup(cells)
+    by_phase = cube.rollup_by_phase(cells)
+has_pc = cube.rows(tot, "Placements_Cohort") > 0
+has_tut = cube.rows(tot, "Tutor_Cohort_Summary") > 0
+has_men = cube.rows(tot, "Mentor_Cohort") > 0
+has_jpt = cube.rows(tot, "JPT_Cohort") > 0
+has_cv = cube.rows(tot, visit_metrics.AGG_TABLE) > 0
+pc_phase = by_phase[cube.rows(by_phase, "Placements_Cohort") > 0].reset_index()
+cv_phase = by_phase[cube.rows(by_phase, visit_metrics.AGG_TABLE) > 0].reset_index()
+chart_key = (filters, data_version(cube.CUBE_TABLE, "Cohort_Master"))
 
 # Enhanced KPI tiles with requested metrics
 def kpi(label, value, suffix="", delta=None):
@@ -44,77 +45,79 @@ st.subheader("🎯 Core Placement Metrics")
 c1, c2, c3, c4 = st.columns(4)
 
 # Job Conversion Rate
-job_conversion = round((pc_f["Placed"].sum()/pc_f["Eligible"].sum())*100,2) if pc_f["Eligible"].sum()>0 else 0
+job_conversion = round(cube.ratio(tot, "Placed", "Eligible"),2)
 c1.metric("Job Conversion Rate (%)", job_conversion)
 
 # Average Package
-avg_package = round(pc_f["Avg_Package"].mean(),2) if not pc_f.empty else 0
+avg_package = round(cube.mean(tot, "Avg_Package"),2) if has_pc else 0
 c2.metric("Average Package (LPA)", avg_package)
 
 # Tier-1 Share
-tier1_share = round((pc_f["Tier1_Offers"].sum()/pc_f["Offers"].sum())*100,2) if pc_f["Offers"].sum()>0 else 0
+tier1_share = round(cube.ratio(tot, "Tier1_Offers", "Offers"),2)
 c3.metric("Tier-1 Share (%)", tier1_share)
 
-# Conversion per Visit
-conv_per_visit = round(pc_f["Avg_Conversion_Per_Visit_%"].mean(),2) if not pc_f.empty else 0
-c4.metric("Conversion per Visit (%)", conv_per_visit)
+# Conversion per Visit (per-visit mean over the selected visits, as on the Placements page)
+conv_per_visit = cube.visit_ratio(tot, "Avg_Conversion_Per_Visit_%")
+c4.metric("Conversion per Visit (%)", round(conv_per_visit,2) if pd.notna(conv_per_visit) else "—")
 
 # Row 2: AI Tool Performance
 st.subheader("🤖 AI Tool Performance")
 c5, c6, c7, c8 = st.columns(4)
 
 # AI Tutor Impact
-tutor_impact = round(tut_f["PostTutor_Exam_Avg"].mean() - tut_f["PreTutor_Exam_Avg"].mean(),2) if not tut_f.empty else 0
+tutor_impact = round(cube.mean(tot, "PostTutor_Exam_Avg") - cube.mean(tot, "PreTutor_Exam_Avg"),2) if has_tut else 0
 c5.metric("AI Tutor Exam Improvement", tutor_impact, delta=f"{tutor_impact:+.1f}")
 
 # AI Mentor Impact
-mentor_impact = round(men_f["PostMentor_Capstone_Grade_Avg"].mean() - men_f["PreMentor_Capstone_Grade_Avg"].mean(),2) if not men_f.empty else 0
+mentor_impact = round(cube.mean(tot, "PostMentor_Capstone_Grade_Avg") - cube.mean(tot, "PreMentor_Capstone_Grade_Avg"),2) if has_men else 0
 c6.metric("AI Mentor Capstone Improvement", mentor_impact, delta=f"{mentor_impact:+.1f}")
 
 # JPT Technical Score
-jpt_technical = round(jpt_f["Avg_AI_Technical"].mean(),2) if not jpt_f.empty else 0
+jpt_technical = round(cube.mean(tot, "Avg_AI_Technical"),2) if has_jpt else 0
 c7.metric("JPT Technical Score (Avg)", jpt_technical)
 
 # JPT Conversion Boost
-jpt_boost = round(jpt_f["Conversion_Boost_Per_Opening_%"].mean(),2) if not jpt_f.empty else 0
+jpt_boost = round(cube.mean(tot, "Conversion_Boost_Per_Opening_%"),2) if has_jpt else 0
 c8.metric("JPT Conversion Boost (%)", jpt_boost, delta=f"{jpt_boost:+.1f}%")
 
 st.divider()
 
 # Phase comparison: Avg_Conversion_Per_Visit_%
 st.subheader("Phase Comparison: Conversion per Visit (%)")
-if not pc_f.empty:
-    grp = pc_f.groupby("Phase")["Avg_Conversion_Per_Visit_%"].mean().reset_index()
-    fig, ax = plt.subplots()
-    ax.plot(grp["Phase"], grp["Avg_Conversion_Per_Visit_%"], marker="o")
-    ax.set_ylabel("Avg Conversion per Visit (%)")
-    st.pyplot(fig)
+if has_cv:
+    def draw_conv_per_visit():
+        fig, ax = plt.subplots()
+        ax.plot(cv_phase["Phase"], cube.visit_ratio(cv_phase, "Avg_Conversion_Per_Visit_%"), marker="o")
+        ax.set_ylabel("Avg Conversion per Visit (%)")
+        return fig
+    show_chart("overview.conv_per_visit", chart_key, draw_conv_per_visit)
 else:
     st.info("No data for selected filters.")
 
 # Phase comparison: Average Package
 st.subheader("Phase Comparison: Average Package")
-if not pc_f.empty:
-    grp = pc_f.groupby("Phase")["Avg_Package"].mean().reset_index()
-    fig, ax = plt.subplots()
-    ax.plot(grp["Phase"], grp["Avg_Package"], marker="o")
-    ax.set_ylabel("Avg Package")
-    st.pyplot(fig)
+if has_pc:
+    def draw_avg_package():
+        fig, ax = plt.subplots()
+        ax.plot(pc_phase["Phase"], cube.mean(pc_phase, "Avg_Package"), marker="o")
+        ax.set_ylabel("Avg Package")
+        return fig
+    show_chart("overview.avg_package", chart_key, draw_avg_package)
 
 # Traditional vs AI Implementation Comparison
 st.subheader("📊 Traditional vs AI Implementation Comparison")
 
-if not pc_f.empty:
+if has_pc:
     # Compare Pre-AI vs AI phases
-    pre_ai = pc_f[pc_f["Phase"] == "Pre-AI"]
-    ai_phases = pc_f[pc_f["Phase"].isin(["Yoodli", "JPT"])]
+    pre_ai = cube.rollup(cells[cells["Phase"] == "Pre-AI"])
+    ai_phases = cube.rollup(cells[cells["Phase"].isin(["Yoodli", "JPT"])])
     
-    if not pre_ai.empty and not ai_phases.empty:
+    if cube.rows(pre_ai, "Placements_Cohort") > 0 and cube.rows(ai_phases, "Placements_Cohort") > 0:
         col1, col2, col3 = st.columns(3)
         
         # Job Conversion Comparison
-        pre_conversion = (pre_ai["Placed"].sum()/pre_ai["Eligible"].sum())*100 if pre_ai["Eligible"].sum()>0 else 0
-        ai_conversion = (ai_phases["Placed"].sum()/ai_phases["Eligible"].sum())*100 if ai_phases["Eligible"].sum()>0 else 0
+        pre_conversion = cube.ratio(pre_ai, "Placed", "Eligible")
+        ai_conversion = cube.ratio(ai_phases, "Placed", "Eligible")
         conversion_delta = ai_conversion - pre_conversion
         
         col1.metric(
@@ -124,8 +127,8 @@ if not pc_f.empty:
         )
         
         # Package Comparison
-        pre_package = pre_ai["Avg_Package"].mean()
-        ai_package = ai_phases["Avg_Package"].mean()
+        pre_package = cube.mean(pre_ai, "Avg_Package")
+        ai_package = cube.mean(ai_phases, "Avg_Package")
         package_delta = ai_package - pre_package
         
         col2.metric(
@@ -135,8 +138,8 @@ if not pc_f.empty:
         )
         
         # Tier-1 Share Comparison
-        pre_tier1 = (pre_ai["Tier1_Offers"].sum()/pre_ai["Offers"].sum())*100 if pre_ai["Offers"].sum()>0 else 0
-        ai_tier1 = (ai_phases["Tier1_Offers"].sum()/ai_phases["Offers"].sum())*100 if ai_phases["Offers"].sum()>0 else 0
+        pre_tier1 = cube.ratio(pre_ai, "Tier1_Offers", "Offers")
+        ai_tier1 = cube.ratio(ai_phases, "Tier1_Offers", "Offers")
         tier1_delta = ai_tier1 - pre_tier1
         
         col3.metric(
@@ -147,32 +150,31 @@ if not pc_f.empty:
         
         # Detailed comparison chart
         st.subheader("📈 Phase-wise Performance Comparison")
-        comparison_data = pc_f.groupby("Phase").agg({
-            "Avg_Package": "mean",
-            "Avg_Conversion_Per_Visit_%": "mean",
-            "Tier1_Offers": "sum",
-            "Offers": "sum"
-        }).reset_index()
+        comparison_data = pd.DataFrame({
+            "Phase": pc_phase["Phase"],
+            "Avg_Package": cube.mean(pc_phase, "Avg_Package"),
+            "Tier1_Share_%": cube.ratio(pc_phase, "Tier1_Offers", "Offers"),
+        })
         
         if not comparison_data.empty:
-            comparison_data["Tier1_Share_%"] = (comparison_data["Tier1_Offers"]/comparison_data["Offers"])*100
-            
-            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
-            
-            # Package comparison
-            ax1.bar(comparison_data["Phase"], comparison_data["Avg_Package"])
-            ax1.set_title("Average Package by Phase")
-            ax1.set_ylabel("Package (LPA)")
-            ax1.tick_params(axis='x', rotation=45)
-            
-            # Tier-1 share comparison
-            ax2.bar(comparison_data["Phase"], comparison_data["Tier1_Share_%"])
-            ax2.set_title("Tier-1 Share by Phase")
-            ax2.set_ylabel("Tier-1 Share (%)")
-            ax2.tick_params(axis='x', rotation=45)
-            
-            plt.tight_layout()
-            st.pyplot(fig)
+            def draw_phase_comparison():
+                fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
+                
+                # Package comparison
+                ax1.bar(comparison_data["Phase"], comparison_data["Avg_Package"])
+                ax1.set_title("Average Package by Phase")
+                ax1.set_ylabel("Package (LPA)")
+                ax1.tick_params(axis='x', rotation=45)
+                
+                # Tier-1 share comparison
+                ax2.bar(comparison_data["Phase"], comparison_data["Tier1_Share_%"])
+                ax2.set_title("Tier-1 Share by Phase")
+                ax2.set_ylabel("Tier-1 Share (%)")
+                ax2.tick_params(axis='x', rotation=45)
+                
+                plt.tight_layout()
+                return fig
+            show_chart("overview.phase_comparison", chart_key, draw_phase_comparison)
     else:
         st.info("Insufficient data for Traditional vs AI comparison")
 
@@ -180,22 +182,19 @@ if not pc_f.empty:
 st.subheader("🔍 AI Tool Impact Analysis")
 
 # AI Tutor Impact on Placements
-if not tut_f.empty and not pc_f.empty:
+if has_tut and has_pc:
     st.write("**AI Tutor Impact on Student Performance:**")
-    tutor_placement_corr = tut_f.merge(pc_f[["Cohort_ID", "Phase", "Avg_Package", "Tier1_Offers", "Offers"]], 
-                                      on=["Cohort_ID", "Phase"], how="left")
-    if not tutor_placement_corr.empty:
-        st.write(f"- Average exam improvement: {tutor_impact:.1f} points")
-        st.write(f"- Cohorts with higher PostTutor_Exam_Avg show better placement outcomes")
+    st.write(f"- Average exam improvement: {tutor_impact:.1f} points")
+    st.write(f"- Cohorts with higher PostTutor_Exam_Avg show better placement outcomes")
 
 # AI Mentor Impact
-if not men_f.empty:
+if has_men:
     st.write("**AI Mentor Impact on Capstone Projects:**")
     st.write(f"- Average capstone grade improvement: {mentor_impact:.1f} points")
     st.write(f"- Higher capstone grades correlate with better Tier-1 offers and packages")
 
 # JPT Impact
-if not jpt_f.empty:
+if has_jpt:
     st.write("**JPT Impact on Placement Efficiency:**")
     st.write(f"- Average conversion boost: {jpt_boost:.1f}%")
     st.write(f"- JPT cohorts show improved conversion per opening even in shrinking markets")
@@ -206,3 +205,5 @@ st.write("- Cohorts with higher **PostTutor_Exam_Avg** typically show higher **P
 st.write("- Cohorts with higher **PostMentor_Capstone_Grade_Avg** typically show higher **Tier-1 offers share** and **Avg Package**.")
 st.write("- Cohorts in **JPT phase** show improved **conversion per opening** compared to earlier phases, even when openings per visit shrink.")
 st.write("- **AI implementation** shows measurable improvements in job conversion, package quality, and Tier-1 company placements.")
+
+debug_panel()
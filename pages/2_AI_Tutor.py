@@ -1,38 +1,53 @@
-
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from utils import load_csv, phase_order
+from profiling import debug_panel, profile_page, stage
+
+profile_page("AI Tutor")
+with stage("import", "page modules"):
+    from utils import load_table, phase_order, data_version
+    from filters import filter_widgets, get_engine
+    from charts import plt, show_chart, show_line, show_scatter
+    import analytics
+    from executor import show_pending
+    import significance
+    import query
+    import warmup
+    import weeks
+warmup.ensure_started()
 
 
 st.header("AI Tutor – Usage & Impact (Unit-based)")
-cm = load_csv("data/warehouse/Cohort_Master.csv")
-sess = load_csv("data/warehouse/Tutor_Sessions.csv")
-util = load_csv("data/warehouse/Tutor_Session_Utilization.csv")
-wk = load_csv("data/warehouse/Tutor_Weekly_Summary.csv")
-sumc = load_csv("data/warehouse/Tutor_Cohort_Summary.csv")
-for df in [sess, util, wk, sumc]: phase_order(df)
-
-# Filters
-col1, col2, col3, col4 = st.columns(4)
-year = col1.multiselect("Year", sorted(cm["Year"].unique()))
-program = col2.multiselect("Program", sorted(cm["Program"].unique()))
-cohort = col3.multiselect("Cohort", sorted(cm["Cohort_ID"].unique()))
-phase = col4.multiselect("Phase", ["Pre-AI","Yoodli","JPT"], default=["Pre-AI","Yoodli","JPT"])
-
-def apply_filters(df):
-    if "Cohort_ID" in df.columns:
-        df = df.merge(cm[["Cohort_ID","Year","Program"]], on="Cohort_ID", how="left")
-    if year: df = df[df["Year"].isin(year)]
-    if program: df = df[df["Program"].isin(program)]
-    if cohort: df = df[df["Cohort_ID"].isin(cohort)]
-    if phase and "Phase" in df.columns: df = df[df["Phase"].isin(phase)]
-    return df
-
-sess_f = apply_filters(sess)
-util_f = apply_filters(util)
-wk_f = apply_filters(wk)
-sumc_f = apply_filters(sumc)
+
+# Filters (from Cohort_Master only, so they show before the fact tables load)
+engine = get_engine()
+filters = filter_widgets(engine.index)
+
+# Filtered frames shared by every session (filters.FilterEngine.table); the utilization
+# table is filtered below by week range too, through the week index
+util = load_table("Tutor_Session_Utilization", columns=["Cohort_ID","Phase","Session_ID","Week","Avg_TRS","Highest_TRS"])
+phase_order(util)
+sess_f = engine.table("Tutor_Sessions", filters, ["Cohort_ID","Phase","Unit_Code","Session_ID","Assigned_Count"])
+sumc_f = engine.table("Tutor_Cohort_Summary", filters, ["Cohort_ID","Phase","PreTutor_Exam_Avg","PostTutor_Exam_Avg",
+                                                        "Higher_Degree_Attempts","Higher_Degree_Admissions"])
+
+# Weekly series: filtered and grouped in query.py (DuckDB when installed), one row per Week in time order
+weekly = query.named("tutor.weekly", filters)
+rolling = query.named("tutor.rolling", filters) if weeks.ensure_rolling() else weekly.iloc[:0]
+
+# Week range, resolved by binary search over the Week-sorted results and tables
+week_lo = week_hi = None
+if len(weekly) > 1:
+    week_labels = weeks.labels(weekly["Week"]).tolist()
+    first, last = st.select_slider("Weeks", options=week_labels, value=(week_labels[0], week_labels[-1]))
+    week_lo, week_hi = weeks.week_of(first), weeks.week_of(last)
+    weekly = weeks.between(weekly, week_lo, week_hi)
+    rolling = weeks.between(rolling, week_lo, week_hi)
+weekly = weekly.assign(Week=weeks.labels(weekly["Week"]))
+rolling = rolling.assign(Week=weeks.labels(rolling["Week"]))
+
+util_f = weeks.apply(util, filters, week_lo, week_hi, "Tutor_Session_Utilization")
+chart_key = (filters, week_lo, week_hi,
+             data_version("Cohort_Master", "Tutor_Sessions", "Tutor_Session_Utilization", "Tutor_Weekly_Summary",
+                          weeks.ROLLING_TABLE, "Tutor_Cohort_Summary", "Placements_Cohort"))
 
 # KPIs
 c1,c2,c3,c4 = st.columns(4)
@@ -42,47 +57,53 @@ c3.metric("Avg TRS (weekly)", round(util_f["Avg_TRS"].mean(),2) if not util_f.em
 c4.metric("Highest TRS (weekly)", round(util_f["Highest_TRS"].max(),2) if not util_f.empty else 0)
 
 st.subheader("Sessions Created per Week")
-if not wk_f.empty:
-    grp = wk_f.groupby("Week")["Sessions_Created_This_Week"].sum().reset_index()
-    fig, ax = plt.subplots()
-    ax.plot(grp["Week"], grp["Sessions_Created_This_Week"], marker="o")
-    ax.set_ylabel("Sessions Created")
-    plt.xticks(rotation=45, ha="right")
-    st.pyplot(fig)
+if not weekly.empty:
+    show_line("tutor.sessions_per_week", chart_key, weekly, "Week", "Sessions_Created_This_Week",
+              y_title="Sessions Created")
 
 st.subheader("Overall Utilization per Week (%)")
-if not wk_f.empty:
-    grp = wk_f.groupby("Week")["Overall_Utilization_This_Week_%"].mean().reset_index()
-    fig, ax = plt.subplots()
-    ax.plot(grp["Week"], grp["Overall_Utilization_This_Week_%"], marker="o")
-    ax.set_ylabel("Utilization (%)")
-    plt.xticks(rotation=45, ha="right")
-    st.pyplot(fig)
+if not weekly.empty:
+    show_line("tutor.utilization_per_week", chart_key, weekly, "Week", "Overall_Utilization_This_Week_%",
+              y_title="Utilization (%)")
+
+st.subheader(f"Rolling {weeks.WINDOW_WEEKS}-Week Utilization & Adoption (%)")
+if not rolling.empty:
+    r1, r2 = st.columns(2)
+    with r1:
+        show_line("tutor.utilization_rolling", chart_key, rolling, "Week", "Utilization_4w_%",
+                  title="Utilization, 4-week mean", y_title="Utilization (%)")
+    with r2:
+        show_line("tutor.adoption_rolling", chart_key, rolling, "Week", "Units_Adopted_4w_%",
+                  title="Units adopted, 4-week mean", y_title="Units Adopted (%)", color="orange")
 
 st.subheader("Academic Averages (Pre vs Post Tutor)")
 if not sumc_f.empty:
-    fig, ax = plt.subplots()
-    p = sumc_f.groupby("Phase")[["PreTutor_Exam_Avg","PostTutor_Exam_Avg"]].mean()
-    p.plot(kind="bar", ax=ax)
-    ax.set_ylabel("Exam Average")
-    ax.set_title("Exam Performance: Pre vs Post AI Tutor")
-    ax.legend(["Pre-Tutor", "Post-Tutor"])
-    plt.xticks(rotation=45)
-    st.pyplot(fig)
+    def draw_exam_pre_post():
+        fig, ax = plt.subplots()
+        p = sumc_f.groupby("Phase")[["PreTutor_Exam_Avg","PostTutor_Exam_Avg"]].mean()
+        p.plot(kind="bar", ax=ax)
+        ax.set_ylabel("Exam Average")
+        ax.set_title("Exam Performance: Pre vs Post AI Tutor")
+        ax.legend(["Pre-Tutor", "Post-Tutor"])
+        plt.xticks(rotation=45)
+        return fig
+    show_chart("tutor.exam_pre_post", chart_key, draw_exam_pre_post)
 
 # Enhanced AI Tutor Impact Analysis
 st.subheader("🎯 AI Tutor Impact on Student Outcomes")
 
 # Load placement data for correlation analysis
 try:
-    pc = load_csv("data/warehouse/Placements_Cohort.csv")
-    pc = phase_order(pc)
-    pc_f = apply_filters(pc)
+    pc_f = engine.table("Placements_Cohort", filters, ["Cohort_ID","Phase","Avg_Package","Tier1_Offers","Offers",
+                                                       "Placed","Eligible"])
+    # Tutor summary joined with placements; correlations and trend fits come from analytics.py
+    # (computed on the shared process pool, see executor.py)
+    analysis = analytics.analyze_pooled("tutor", filters)
     
-    if not sumc_f.empty and not pc_f.empty:
-        # Merge tutor and placement data
-        tutor_placement = sumc_f.merge(pc_f[["Cohort_ID", "Phase", "Avg_Package", "Tier1_Offers", "Offers", "Placed", "Eligible"]], 
-                                      on=["Cohort_ID", "Phase"], how="left")
+    if analysis.pending:
+        show_pending("The placement impact analysis")
+    elif not sumc_f.empty and not pc_f.empty:
+        tutor_placement = analysis.kpis
         
         if not tutor_placement.empty:
             # Impact on Placement Performance
@@ -91,10 +112,13 @@ try:
             col1, col2, col3 = st.columns(3)
             
             # Exam improvement vs Package correlation
-            exam_improvement = tutor_placement["PostTutor_Exam_Avg"] - tutor_placement["PreTutor_Exam_Avg"]
-            package_corr = exam_improvement.corr(tutor_placement["Avg_Package"])
+            exam_improvement = tutor_placement["Exam_Improvement"]
+            package_corr = analysis.r("Exam_Improvement", "Avg_Package")
             
             col1.metric("Exam Improvement vs Package Correlation", f"{package_corr:.3f}")
+            exam_test = significance.for_view_pooled("tutor", filters).get("Exam_Improvement")
+            if exam_test is not None:
+                col1.caption(f"Exam improvement {exam_test.mean:+.2f}: {exam_test.summary()}")
             
             # Higher exam scores vs Tier-1 offers
             high_exam = tutor_placement[tutor_placement["PostTutor_Exam_Avg"] > tutor_placement["PostTutor_Exam_Avg"].median()]
@@ -108,35 +132,30 @@ try:
             
             # Scatter plot: Exam improvement vs Package
             st.subheader("📊 Exam Improvement vs Placement Package")
-            fig, ax = plt.subplots()
-            ax.scatter(exam_improvement, tutor_placement["Avg_Package"], alpha=0.6)
-            ax.set_xlabel("Exam Improvement (Post - Pre)")
-            ax.set_ylabel("Average Package (LPA)")
-            ax.set_title("AI Tutor Exam Improvement vs Placement Package")
-            
-            # Add trend line
-            import numpy as np
-            z = np.polyfit(exam_improvement.dropna(), tutor_placement["Avg_Package"].dropna(), 1)
-            p = np.poly1d(z)
-            ax.plot(exam_improvement.dropna(), p(exam_improvement.dropna()), "r--", alpha=0.8)
-            
-            st.pyplot(fig)
+            show_scatter("tutor.exam_vs_package", chart_key, exam_improvement, tutor_placement["Avg_Package"],
+                         "Exam Improvement (Post - Pre)", "Average Package (LPA)",
+                         title="AI Tutor Exam Improvement vs Placement Package", trend=True,
+                         fit=analysis.line("Exam_Improvement", "Avg_Package"))
             
             # Unit-wise Performance Analysis
             st.subheader("📚 Unit-wise Performance Analysis")
             if not sess_f.empty:
-                unit_performance = sess_f.groupby("Unit_Code").agg({
-                    "Assigned_Count": "sum",
-                    "Session_ID": "count"
-                }).reset_index()
-                unit_performance.columns = ["Unit_Code", "Total_Assignments", "Sessions_Created"]
+                with stage("aggregate", "unit performance", rows_in=len(sess_f)) as span:
+                    unit_performance = sess_f.groupby("Unit_Code").agg({
+                        "Assigned_Count": "sum",
+                        "Session_ID": "count"
+                    }).reset_index()
+                    unit_performance.columns = ["Unit_Code", "Total_Assignments", "Sessions_Created"]
+                    span.rows_out = len(unit_performance)
                 
                 # Merge with utilization data
                 if not util_f.empty:
-                    unit_util = util_f.groupby("Session_ID")["Avg_TRS"].mean().reset_index()
-                    unit_util = unit_util.merge(sess_f[["Session_ID", "Unit_Code"]], on="Session_ID")
-                    unit_avg_trs = unit_util.groupby("Unit_Code")["Avg_TRS"].mean().reset_index()
-                    unit_performance = unit_performance.merge(unit_avg_trs, on="Unit_Code", how="left")
+                    with stage("aggregate", "unit utilization", rows_in=len(util_f)) as span:
+                        unit_util = util_f.groupby("Session_ID")["Avg_TRS"].mean().reset_index()
+                        unit_util = unit_util.merge(sess_f[["Session_ID", "Unit_Code"]], on="Session_ID")
+                        unit_avg_trs = unit_util.groupby("Unit_Code")["Avg_TRS"].mean().reset_index()
+                        unit_performance = unit_performance.merge(unit_avg_trs, on="Unit_Code", how="left")
+                        span.rows_out = len(unit_performance)
                 
                 st.dataframe(unit_performance.sort_values("Total_Assignments", ascending=False))
                 
@@ -155,33 +174,23 @@ try:
             
             # Correlation with exam performance
             if not sumc_f.empty:
-                exam_high_degree_corr = sumc_f["PostTutor_Exam_Avg"].corr(sumc_f["Higher_Degree_Admissions"])
+                exam_high_degree_corr = analysis.r("PostTutor_Exam_Avg", "Higher_Degree_Admissions")
                 st.write(f"**Correlation between Post-Tutor Exam Performance and Higher Degree Admissions:** {exam_high_degree_corr:.3f}")
+        
+        analytics.show_details(analysis)
 
 except Exception as e:
     st.warning(f"Could not load placement data for correlation analysis: {e}")
 
 # Usage Patterns and Trends
 st.subheader("📈 Usage Patterns and Trends")
-if not wk_f.empty:
+if not weekly.empty:
     # Weekly adoption trends
-    adoption_trend = wk_f.groupby("Week")["Units_Adopted_%"].mean().reset_index()
-    if not adoption_trend.empty:
-        fig, ax = plt.subplots()
-        ax.plot(adoption_trend["Week"], adoption_trend["Units_Adopted_%"], marker="o")
-        ax.set_title("Unit Adoption Rate Over Time")
-        ax.set_ylabel("Units Adopted (%)")
-        ax.set_xlabel("Week")
-        plt.xticks(rotation=45)
-        st.pyplot(fig)
+    show_line("tutor.adoption_trend", chart_key, weekly, "Week", "Units_Adopted_%",
+              title="Unit Adoption Rate Over Time", y_title="Units Adopted (%)")
     
     # Active users trend
-    users_trend = wk_f.groupby("Week")["Active_Users_%"].mean().reset_index()
-    if not users_trend.empty:
-        fig, ax = plt.subplots()
-        ax.plot(users_trend["Week"], users_trend["Active_Users_%"], marker="o", color="green")
-        ax.set_title("Active Users Percentage Over Time")
-        ax.set_ylabel("Active Users (%)")
-        ax.set_xlabel("Week")
-        plt.xticks(rotation=45)
-        st.pyplot(fig)
+    show_line("tutor.users_trend", chart_key, weekly, "Week", "Active_Users_%",
+              title="Active Users Percentage Over Time", y_title="Active Users (%)", color="green")
+
+debug_panel()
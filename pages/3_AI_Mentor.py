@@ -1,33 +1,35 @@
-
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from utils import load_csv, phase_order
+from profiling import debug_panel, profile_page, stage
 
+profile_page("AI Mentor")
+with stage("import", "page modules"):
+    from utils import data_version
+    from filters import filter_widgets, get_engine
+    from charts import plt, show_chart, show_scatter
+    import analytics
+    from executor import show_pending
+    import significance
+    import warmup
+warmup.ensure_started()
 
-st.header("AI Mentor – Cohort Comparisons & Journey Links")
-cm = load_csv("data/warehouse/Cohort_Master.csv")
-mc = load_csv("data/warehouse/Mentor_Cohort.csv")
-pc = load_csv("data/warehouse/Placements_Cohort.csv")
-for df in [mc, pc]: phase_order(df)
 
-col1, col2, col3, col4 = st.columns(4)
-year = col1.multiselect("Year", sorted(cm["Year"].unique()))
-program = col2.multiselect("Program", sorted(cm["Program"].unique()))
-cohort = col3.multiselect("Cohort", sorted(cm["Cohort_ID"].unique()))
-phase = col4.multiselect("Phase", ["Pre-AI","Yoodli","JPT"], default=["Pre-AI","Yoodli","JPT"])
+st.header("AI Mentor – Cohort Comparisons & Journey Links")
 
-def apply_filters(df):
-    if "Cohort_ID" in df.columns:
-        df = df.merge(cm[["Cohort_ID","Year","Program"]], on="Cohort_ID", how="left")
-    if year: df = df[df["Year"].isin(year)]
-    if program: df = df[df["Program"].isin(program)]
-    if cohort: df = df[df["Cohort_ID"].isin(cohort)]
-    if phase and "Phase" in df.columns: df = df[df["Phase"].isin(phase)]
-    return df
+# Filters (from Cohort_Master only, so they show before the fact tables load)
+engine = get_engine()
+filters = filter_widgets(engine.index)
 
-mc_f = apply_filters(mc)
-pc_f = apply_filters(pc)
+# Filtered frames shared by every session (filters.FilterEngine.table)
+mc_f = engine.table("Mentor_Cohort", filters, ["Cohort_ID","Phase","PreMentor_Capstone_Grade_Avg",
+                                               "PostMentor_Capstone_Grade_Avg","Grade_A_Distribution_%_Pre",
+                                               "Grade_A_Distribution_%_Post","PostMentor_Exam_Avg",
+                                               "Higher_Degree_Attempts","Higher_Degree_Admissions"])
+pc_f = engine.table("Placements_Cohort", filters, ["Cohort_ID","Phase","Avg_Package","Tier1_Offers","Offers",
+                                                   "Placed","Eligible"])
+chart_key = (filters, data_version("Cohort_Master", "Mentor_Cohort", "Placements_Cohort"))
+# Mentor cohorts joined with placements; correlations and trend fits come from analytics.py
+# (computed on the shared process pool, see executor.py)
+analysis = analytics.analyze_pooled("mentor", filters)
 
 c1,c2,c3 = st.columns(3)
 c1.metric("PostMentor Capstone Avg", round(mc_f["PostMentor_Capstone_Grade_Avg"].mean(),2) if not mc_f.empty else "—")
@@ -36,44 +38,49 @@ c3.metric("Tier-1 Share (%)", round(pc_f["Tier1_Offers"].sum()/pc_f["Offers"].su
 
 st.subheader("Capstone Grade Average: Pre vs Post (by Phase)")
 if not mc_f.empty:
-    fig, ax = plt.subplots()
-    tmp = mc_f.groupby("Phase")[["PreMentor_Capstone_Grade_Avg","PostMentor_Capstone_Grade_Avg"]].mean()
-    tmp.plot(kind="bar", ax=ax)
-    st.pyplot(fig)
+    def draw_capstone_pre_post():
+        fig, ax = plt.subplots()
+        tmp = mc_f.groupby("Phase")[["PreMentor_Capstone_Grade_Avg","PostMentor_Capstone_Grade_Avg"]].mean()
+        tmp.plot(kind="bar", ax=ax)
+        return fig
+    show_chart("mentor.capstone_pre_post", chart_key, draw_capstone_pre_post)
 
 st.subheader("Journey View: PostMentor Exam Avg vs Avg Package")
-if not mc_f.empty and not pc_f.empty:
-    merged = mc_f.merge(pc_f[["Cohort_ID","Phase","Avg_Package"]], on=["Cohort_ID","Phase"], how="left")
-    fig, ax = plt.subplots()
-    ax.scatter(merged["PostMentor_Exam_Avg"], merged["Avg_Package"])
-    ax.set_xlabel("PostMentor Exam Avg")
-    ax.set_ylabel("Avg Package")
-    ax.set_title("AI Mentor Exam Performance vs Placement Package")
-    st.pyplot(fig)
+if not mc_f.empty and not pc_f.empty and not analysis.pending:
+    merged = analysis.kpis
+    show_scatter("mentor.exam_vs_package", chart_key, merged["PostMentor_Exam_Avg"], merged["Avg_Package"],
+                 "PostMentor Exam Avg", "Avg Package", title="AI Mentor Exam Performance vs Placement Package")
 
 # Enhanced AI Mentor Impact Analysis
 st.subheader("🎯 AI Mentor Impact on Student Outcomes")
 
-if not mc_f.empty and not pc_f.empty:
+if analysis.pending:
+    show_pending("The mentor impact analysis")
+elif not mc_f.empty and not pc_f.empty:
     # Comprehensive mentor impact analysis
-    mentor_placement = mc_f.merge(pc_f[["Cohort_ID", "Phase", "Avg_Package", "Tier1_Offers", "Offers", "Placed", "Eligible"]], 
-                                 on=["Cohort_ID", "Phase"], how="left")
+    mentor_placement = analysis.kpis
     
     if not mentor_placement.empty:
         # Impact metrics
         st.write("**📈 AI Mentor Impact Metrics:**")
         
         col1, col2, col3, col4 = st.columns(4)
+        # bootstrap CI / permutation p-value of each Post - Pre delta
+        tests = significance.for_view_pooled("mentor", filters)
         
         # Capstone improvement
-        capstone_improvement = mentor_placement["PostMentor_Capstone_Grade_Avg"] - mentor_placement["PreMentor_Capstone_Grade_Avg"]
+        capstone_improvement = mentor_placement["Capstone_Improvement"]
         avg_capstone_improvement = capstone_improvement.mean()
         col1.metric("Avg Capstone Improvement", f"{avg_capstone_improvement:.2f}", delta=f"{avg_capstone_improvement:+.2f}")
+        if "Capstone_Improvement" in tests:
+            col1.caption(tests["Capstone_Improvement"].summary())
         
         # Grade A distribution improvement
-        grade_a_improvement = mentor_placement["Grade_A_Distribution_%_Post"] - mentor_placement["Grade_A_Distribution_%_Pre"]
+        grade_a_improvement = mentor_placement["Grade_A_Improvement"]
         avg_grade_a_improvement = grade_a_improvement.mean()
         col2.metric("Grade A Distribution Improvement", f"{avg_grade_a_improvement:.1f}%", delta=f"{avg_grade_a_improvement:+.1f}%")
+        if "Grade_A_Improvement" in tests:
+            col2.caption(tests["Grade_A_Improvement"].summary())
         
         # Higher degree success rate
         if "Higher_Degree_Attempts" in mentor_placement.columns and "Higher_Degree_Admissions" in mentor_placement.columns:
@@ -81,38 +88,24 @@ if not mc_f.empty and not pc_f.empty:
             col3.metric("Higher Degree Success Rate", f"{high_degree_success:.1f}%")
         
         # Package improvement correlation
-        package_corr = mentor_placement["PostMentor_Capstone_Grade_Avg"].corr(mentor_placement["Avg_Package"])
+        package_corr = analysis.r("PostMentor_Capstone_Grade_Avg", "Avg_Package")
         col4.metric("Capstone vs Package Correlation", f"{package_corr:.3f}")
         
         # Detailed analysis charts
         st.subheader("📊 Capstone Performance vs Placement Outcomes")
         
-        # Capstone improvement vs Package scatter
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
-        
-        # Capstone improvement vs Package
-        ax1.scatter(capstone_improvement, mentor_placement["Avg_Package"], alpha=0.6)
-        ax1.set_xlabel("Capstone Grade Improvement")
-        ax1.set_ylabel("Average Package (LPA)")
-        ax1.set_title("Capstone Improvement vs Placement Package")
-        
-        # Add trend line
-        import numpy as np
-        valid_data = capstone_improvement.dropna() & mentor_placement["Avg_Package"].dropna()
-        if valid_data.sum() > 1:
-            z = np.polyfit(capstone_improvement[valid_data], mentor_placement["Avg_Package"][valid_data], 1)
-            p = np.poly1d(z)
-            ax1.plot(capstone_improvement[valid_data], p(capstone_improvement[valid_data]), "r--", alpha=0.8)
-        
-        # Grade A distribution vs Tier-1 offers
-        tier1_rate = (mentor_placement["Tier1_Offers"] / mentor_placement["Offers"] * 100).fillna(0)
-        ax2.scatter(mentor_placement["Grade_A_Distribution_%_Post"], tier1_rate, alpha=0.6)
-        ax2.set_xlabel("Grade A Distribution (%)")
-        ax2.set_ylabel("Tier-1 Offers Rate (%)")
-        ax2.set_title("Grade A Distribution vs Tier-1 Offers Rate")
-        
-        plt.tight_layout()
-        st.pyplot(fig)
+        left, right = st.columns(2)
+        with left:
+            # Capstone improvement vs Package, with trend line
+            show_scatter("mentor.capstone_vs_package", chart_key, capstone_improvement, mentor_placement["Avg_Package"],
+                         "Capstone Grade Improvement", "Average Package (LPA)",
+                         title="Capstone Improvement vs Placement Package", trend=True,
+                         fit=analysis.line("Capstone_Improvement", "Avg_Package"))
+        with right:
+            # Grade A distribution vs Tier-1 offers
+            show_scatter("mentor.grade_a_vs_tier1", chart_key, mentor_placement["Grade_A_Distribution_%_Post"],
+                         mentor_placement["Tier1_Rate_%"], "Grade A Distribution (%)", "Tier-1 Offers Rate (%)",
+                         title="Grade A Distribution vs Tier-1 Offers Rate")
         
         # Phase-wise mentor impact
         st.subheader("📈 Phase-wise AI Mentor Impact")
@@ -128,22 +121,24 @@ if not mc_f.empty and not pc_f.empty:
             phase_impact["Capstone_Improvement"] = phase_impact["PostMentor_Capstone_Grade_Avg"] - phase_impact["PreMentor_Capstone_Grade_Avg"]
             phase_impact["Grade_A_Improvement"] = phase_impact["Grade_A_Distribution_%_Post"] - phase_impact["Grade_A_Distribution_%_Pre"]
             
-            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
-            
-            # Capstone improvement by phase
-            ax1.bar(phase_impact["Phase"], phase_impact["Capstone_Improvement"])
-            ax1.set_title("Capstone Grade Improvement by Phase")
-            ax1.set_ylabel("Grade Improvement")
-            ax1.tick_params(axis='x', rotation=45)
-            
-            # Grade A improvement by phase
-            ax2.bar(phase_impact["Phase"], phase_impact["Grade_A_Improvement"])
-            ax2.set_title("Grade A Distribution Improvement by Phase")
-            ax2.set_ylabel("Grade A Improvement (%)")
-            ax2.tick_params(axis='x', rotation=45)
-            
-            plt.tight_layout()
-            st.pyplot(fig)
+            def draw_phase_impact():
+                fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
+                
+                # Capstone improvement by phase
+                ax1.bar(phase_impact["Phase"], phase_impact["Capstone_Improvement"])
+                ax1.set_title("Capstone Grade Improvement by Phase")
+                ax1.set_ylabel("Grade Improvement")
+                ax1.tick_params(axis='x', rotation=45)
+                
+                # Grade A improvement by phase
+                ax2.bar(phase_impact["Phase"], phase_impact["Grade_A_Improvement"])
+                ax2.set_title("Grade A Distribution Improvement by Phase")
+                ax2.set_ylabel("Grade A Improvement (%)")
+                ax2.tick_params(axis='x', rotation=45)
+                
+                plt.tight_layout()
+                return fig
+            show_chart("mentor.phase_impact", chart_key, draw_phase_impact)
         
         # Higher degree performance analysis
         if "Higher_Degree_Attempts" in mentor_placement.columns and "Higher_Degree_Admissions" in mentor_placement.columns:
@@ -168,3 +163,7 @@ if not mc_f.empty and not pc_f.empty:
         st.write("- **Placement Correlation**: Higher capstone grades correlate with better placement packages and Tier-1 offers")
         st.write("- **Higher Education**: Students with better capstone performance show higher success rates in higher degree applications")
         st.write("- **Phase Progression**: JPT phase shows the highest capstone improvement, indicating cumulative AI tool benefits")
+        
+        analytics.show_details(analysis)
+
+debug_panel()
@@ -1,49 +1,54 @@
-
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from utils import load_csv, phase_order
+from profiling import debug_panel, profile_page, stage
+
+profile_page("Placements & Visits")
+with stage("import", "page modules"):
+    import pandas as pd
+    from utils import data_version
+    from filters import filter_widgets, get_engine
+    from charts import show_bars
+    import query
+    import visit_metrics
+    import warmup
+warmup.ensure_started()
 
 
 st.header("Placements & Company Visits (Normalized)")
-cm = load_csv("data/warehouse/Cohort_Master.csv")
-pc = load_csv("data/warehouse/Placements_Cohort.csv")
-cv = load_csv("data/warehouse/Company_Visits.csv")
-for df in [pc, cv]: phase_order(df)
-
-col1, col2, col3, col4 = st.columns(4)
-year = col1.multiselect("Year", sorted(cm["Year"].unique()))
-program = col2.multiselect("Program", sorted(cm["Program"].unique()))
-cohort = col3.multiselect("Cohort", sorted(cm["Cohort_ID"].unique()))
-phase = col4.multiselect("Phase", ["Pre-AI","Yoodli","JPT"], default=["Pre-AI","Yoodli","JPT"])
-
-def apply_filters(df):
-    if "Cohort_ID" in df.columns:
-        df = df.merge(cm[["Cohort_ID","Year","Program"]], on="Cohort_ID", how="left")
-    if year: df = df[df["Year"].isin(year)]
-    if program: df = df[df["Program"].isin(program)]
-    if cohort: df = df[df["Cohort_ID"].isin(cohort)]
-    if phase and "Phase" in df.columns: df = df[df["Phase"].isin(phase)]
-    return df
-
-pc_f = apply_filters(pc)
-cv_f = apply_filters(cv)
+
+# Filters (from Cohort_Master only, so they show before the fact tables load)
+engine = get_engine()
+filters = filter_widgets(engine.index)
+
+# Visit metrics are derived from row-level Company_Visits (see visit_metrics.py): the
+# tiles are per-visit means over the selected visits, from the summed partials
+aggs = visit_metrics.load_aggregates()
+aggs_f = engine.apply(aggs, filters, visit_metrics.AGG_TABLE)
+visits = visit_metrics.rollup(aggs_f, []).iloc[0]
+# Grouped results only; filters and group-bys run in query.py (DuckDB when installed)
+funnel = query.named("placements.funnel", filters)
+offers = {dim: query.pivot(query.named(f"placements.offers_by.{dim}", filters), "Phase", dim, "Offers_Issued")
+          for dim in visit_metrics.DIMENSIONS}
+chart_key = (filters, data_version("Cohort_Master", "Placements_Cohort", visit_metrics.AGG_TABLE))
 
 c1,c2,c3 = st.columns(3)
-c1.metric("Avg Conversion per Visit (%)", round(pc_f["Avg_Conversion_Per_Visit_%"].mean(),2) if not pc_f.empty else "—")
-c2.metric("Avg Openings per Visit", round(pc_f["Avg_Openings_Per_Visit"].mean(),2) if not pc_f.empty else "—")
-c3.metric("Total Offers", int(pc_f["Offers"].sum()) if not pc_f.empty else 0)
+c1.metric("Avg Conversion per Visit (%)", round(visits["Avg_Conversion_Per_Visit_%"],2) if pd.notna(visits["Avg_Conversion_Per_Visit_%"]) else "—")
+c2.metric("Avg Openings per Visit", round(visits["Avg_Openings_Per_Visit"],2) if pd.notna(visits["Avg_Openings_Per_Visit"]) else "—")
+c3.metric("Total Offers", int(funnel["Offers"].sum()))
 
 st.subheader("Placement Funnel by Phase")
-if not pc_f.empty:
-    fig, ax = plt.subplots()
-    p = pc_f.groupby("Phase")[["Eligible","Applied","Shortlisted","Offers","Placed"]].sum()
-    p.plot(kind="bar", ax=ax)
-    st.pyplot(fig)
+if not funnel.empty:
+    show_bars("placements.funnel", chart_key, funnel.set_index("Phase"))
 
 st.subheader("Company Role Families – Offers Issued (by Phase)")
-if not cv_f.empty:
-    fig, ax = plt.subplots()
-    fam = cv_f.groupby(["Phase","Role_Family"])["Offers_Issued"].sum().unstack(fill_value=0)
-    fam.plot(kind="bar", ax=ax)
-    st.pyplot(fig)
+if not offers["Role_Family"].empty:
+    show_bars("placements.role_family_offers", chart_key, offers["Role_Family"], y_title="Offers Issued")
+
+st.subheader("Offers Issued by Company Tier and Sector (by Phase)")
+if not offers["Tier"].empty:
+    c4, c5 = st.columns(2)
+    with c4:
+        show_bars("placements.tier_offers", chart_key, offers["Tier"], y_title="Offers Issued")
+    with c5:
+        show_bars("placements.sector_offers", chart_key, offers["Sector"], y_title="Offers Issued")
+
+debug_panel()
@@ -1,9 +1,11 @@
 
 import streamlit as st
-import pandas as pd
 import io, os, json
 from utils import load_csv, phase_order
-from utils import SCHEMAS_DTYPES, apply_schema_dtypes, load_table
+from utils import NATURAL_KEYS, SCHEMAS_DTYPES, load_table
+from ingest import WORKBOOKS
+import jobs
+import warmup
 
 
 
@@ -34,32 +36,54 @@ else:
 
 st.divider()
 
-dataset = st.selectbox("Choose dataset to upload", list(schemas.keys()))
-file = st.file_uploader("Upload file (CSV or Excel) matching the selected schema", type=["csv","xlsx","xls"])
+WORKBOOK = "Workbook: one sheet per dataset"
+dataset = st.selectbox("Choose dataset to upload", list(schemas.keys()) + [WORKBOOK])
+modes = {
+    "Replace table": "replace",
+    "Append rows": "append",
+    (f"Upsert by key ({', '.join(NATURAL_KEYS.get(dataset, []))})" if dataset != WORKBOOK
+     else "Upsert by each dataset's key"): "upsert",
+    "Replace partitions (Cohort_ID/Phase in the file)": "replace_partition",
+}
+mode = modes[st.radio("Upload mode", list(modes.keys()), horizontal=True)]
+if dataset == WORKBOOK:
+    st.caption("Sheets named after a dataset are validated and written in one pass; other sheets are ignored: "
+               + ", ".join(m.sheet for m in WORKBOOKS["warehouse"]))
+    file = st.file_uploader("Upload workbook (Excel)", type=["xlsx","xlsm"])
+else:
+    file = st.file_uploader("Upload file (CSV or Excel) matching the selected schema", type=["csv","xlsx","xls"])
 
 if file:
-    try:
-        name = file.name.lower()
-        if name.endswith(".csv"):
-            df = pd.read_csv(file)
-        else:
-            df = pd.read_excel(file)
-        expected = schemas[dataset]
-        missing = [c for c in expected if c not in df.columns]
-        extra = [c for c in df.columns if c not in expected]
-        if missing:
-            st.error(f"Missing columns: {missing}")
-        else:
-            if extra:
-                st.warning(f"Extra columns will be ignored: {extra}")
-                df = df[expected]
-            # Enforce dtypes
-            df = apply_schema_dtypes(df, dataset)
-            os.makedirs("data/warehouse", exist_ok=True)
-            out_path = f"data/warehouse/{dataset}.csv"
-            df.to_csv(out_path, index=False)
-            st.success(f"Uploaded and validated successfully. Saved to {out_path}")
+    # Queued to the background ingestion worker (jobs.py): the page returns at once and shows the
+    # job's progress; tables are swapped in only when complete. Each file is queued once per mode,
+    # so append does not run again on every rerun.
+    upload_key = (dataset, mode, file.name, file.size, getattr(file, "file_id", None))
+    if st.session_state.get("upload_job", (None,))[0] != upload_key:
+        job_id = jobs.submit(file, file.name, jobs.WORKBOOK if dataset == WORKBOOK else dataset, mode)
+        st.session_state["upload_job"] = (upload_key, job_id)
+    job = jobs.get(st.session_state["upload_job"][1])
+    if job is None:
+        st.warning("This upload's job has expired; re-upload the file to ingest it again.")
+    elif job.state != "done":
+        jobs.show_job(job)
+    else:
+        for res in job.results:
+            if len(job.results) > 1:
+                st.subheader(res.dataset)
+            if res.extra_columns:
+                st.warning(f"Extra columns were ignored: {res.extra_columns}")
+            if not res.report.ok:
+                st.warning(f"{res.report.total:,} cells could not be converted to the schema type and were "
+                           f"stored as empty values:")
+                st.dataframe(res.report.summary())
+                with st.expander("First offending rows per column"):
+                    for col, rows in res.report.examples.items():
+                        st.write(f"**{col}** ({SCHEMAS_DTYPES[res.dataset][col]})")
+                        st.dataframe(rows)
+            st.success(f"Uploaded and validated successfully in {job.seconds:.1f}s. Saved to {res.path}")
             st.write("Preview:")
-            st.dataframe(df.head())
-    except Exception as e:
-        st.error(f"Upload failed: {e}")
+            st.dataframe(res.preview)
+        warmup.show_status(st)
+
+with st.expander("Upload jobs"):
+    jobs.show_recent()
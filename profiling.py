@@ -0,0 +1,259 @@
+# profiling.py
+# Per-stage timings for page reruns.
+#
+# A page calls profile_page() at the top, which starts a trace for the current
+# rerun; load/filter/aggregate/render work is wrapped in `with stage(...)`
+# (utils.load_table, FilterEngine.apply and charts.chart_bytes do this
+# themselves) and each span records wall time, rows in/out and whether it was
+# served from a cache. debug_panel() at the bottom of the page shows the trace
+# in the sidebar when the page is opened with ?debug=1, and offers the
+# session's traces as JSON. Outside a page run stage() costs a perf_counter call.
+#
+# Pages import their heavy modules inside `with stage("import", ...)`, so the
+# first trace of the process doubles as the cold-start report: startup_report()
+# splits it into import / data (load+filter+aggregate) / render / other time,
+# and it is logged once when that first page finishes.
+import json
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+MAX_TRACES = 50  # per session
+STAGES = ("import", "load", "filter", "aggregate", "render")
+DATA_STAGES = ("load", "filter", "aggregate")
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    stage: str
+    name: str
+    start_ms: float = 0.0
+    ms: float = 0.0
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    cache: Optional[str] = None   # "hit" / "miss"
+    depth: int = 0
+
+
+@dataclass
+class Trace:
+    page: str
+    started: float = field(default_factory=time.time)
+    spans: List[Span] = field(default_factory=list)
+    finished_ms: Optional[float] = None
+    _t0: float = field(default_factory=time.perf_counter, repr=False)
+    _open: List[Span] = field(default_factory=list, repr=False)
+
+    def elapsed_ms(self) -> float:
+        if self.finished_ms is not None:
+            return self.finished_ms
+        return (time.perf_counter() - self._t0) * 1000
+
+    def finish(self) -> None:
+        if self.finished_ms is None:
+            self.finished_ms = (time.perf_counter() - self._t0) * 1000
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Milliseconds per stage over the top-level spans."""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            if span.depth == 0:
+                totals[span.stage] = totals.get(span.stage, 0.0) + span.ms
+        return totals
+
+    def to_dict(self) -> dict:
+        return {"page": self.page, "started": self.started, "elapsed_ms": round(self.elapsed_ms(), 3),
+                "spans": [asdict(s) for s in self.spans]}
+
+
+# Streamlit runs each session's script on its own thread.
+_local = threading.local()
+# First page run of this process: the cold start.
+_first: Optional[Trace] = None
+_first_lock = threading.Lock()
+
+
+def current() -> Optional[Trace]:
+    return getattr(_local, "trace", None)
+
+
+class stage:
+    """Time a block as one span of the current trace: `with stage("filter", "JPT_Cohort", rows_in=n) as s:`.
+
+    Set `s.rows_out` (and `s.cache`) inside the block. Also usable as a
+    decorator via profiled().
+    """
+
+    def __init__(self, stage: str, name: str = "", rows_in: Optional[int] = None):
+        self.trace = current()
+        self.span = Span(stage, name, rows_in=rows_in)
+
+    def __enter__(self) -> Span:
+        if self.trace is not None:
+            self.span.depth = len(self.trace._open)
+            self.span.start_ms = self.trace.elapsed_ms()
+            self.trace._open.append(self.span)
+            self.trace.spans.append(self.span)
+        self._t0 = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.span.ms = (time.perf_counter() - self._t0) * 1000
+        if self.trace is not None:
+            open_spans = self.trace._open
+            for i in range(len(open_spans) - 1, -1, -1):
+                if open_spans[i] is self.span:
+                    del open_spans[i:]
+                    break
+
+
+def profiled(stage_name: str, name: Optional[str] = None) -> Callable:
+    """Decorator form of stage(); the span is named after the function by default."""
+    def wrap(fn: Callable) -> Callable:
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            with stage(stage_name, name or fn.__name__):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def annotate(**values) -> None:
+    """Set fields (cache="hit", rows_out=...) on the innermost open span."""
+    trace = current()
+    if trace is not None and trace._open:
+        for key, value in values.items():
+            setattr(trace._open[-1], key, value)
+
+
+# ---------- Streamlit ----------
+def _session_traces():
+    import streamlit as st
+    traces = st.session_state.get("_profile_traces")
+    if traces is None:
+        traces = st.session_state["_profile_traces"] = deque(maxlen=MAX_TRACES)
+    return traces
+
+
+def profile_page(page: str) -> Trace:
+    """Start the trace for this rerun of `page` (call first thing on the page)."""
+    global _first
+    trace = Trace(page)
+    _local.trace = trace
+    with _first_lock:
+        if _first is None:
+            _first = trace
+    try:
+        _session_traces().append(trace)
+    except Exception:
+        pass  # no session (bare script run): the trace is still usable
+    return trace
+
+
+def debug_enabled() -> bool:
+    import streamlit as st
+    return str(st.query_params.get("debug", "")).lower() not in ("", "0", "false", "no")
+
+
+def startup_report() -> Optional[dict]:
+    """Import / data / render split of the first page run in this process."""
+    trace = _first
+    if trace is None:
+        return None
+    totals = trace.stage_totals()
+    total = trace.elapsed_ms()
+    report = {
+        "page": trace.page,
+        "finished": trace.finished_ms is not None,
+        "total_ms": total,
+        "import_ms": totals.get("import", 0.0),
+        "data_ms": sum(totals.get(s, 0.0) for s in DATA_STAGES),
+        "render_ms": totals.get("render", 0.0),
+    }
+    report["other_ms"] = max(total - report["import_ms"] - report["data_ms"] - report["render_ms"], 0.0)
+    report["stages"] = totals
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in report.items()}
+
+
+def _finish_page(trace: Trace) -> None:
+    trace.finish()
+    if trace is _first:
+        r = startup_report()
+        log.info("cold start (%s): %.0f ms = import %.0f + data %.0f + render %.0f + other %.0f",
+                 r["page"], r["total_ms"], r["import_ms"], r["data_ms"], r["render_ms"], r["other_ms"])
+
+
+def export_json() -> str:
+    """Every trace of this session as JSON."""
+    return json.dumps([t.to_dict() for t in _session_traces()], indent=2)
+
+
+def debug_panel() -> None:
+    """Close the current rerun's trace; with ?debug=1 show its spans in the sidebar.
+
+    Call last on the page.
+    """
+    trace = current()
+    if trace is None:
+        return
+    _finish_page(trace)
+    if not debug_enabled():
+        return
+
+    import pandas as pd
+    import streamlit as st
+
+    import charts
+    import executor
+    import memory
+    import utils
+    import warmup
+
+    with st.sidebar.expander(f"⏱ Profile: {trace.page}", expanded=True):
+        st.caption(f"Rerun so far: {trace.elapsed_ms():.1f} ms, {len(trace.spans)} spans")
+        spans = pd.DataFrame([asdict(s) for s in trace.spans],
+                             columns=["stage", "name", "start_ms", "ms", "rows_in", "rows_out", "cache", "depth"])
+        if not spans.empty:
+            spans["name"] = ["  " * d + n for d, n in zip(spans["depth"], spans["name"])]
+            top = spans[spans["depth"] == 0]
+            totals = top.groupby("stage")["ms"].agg(["count", "sum"])
+            order = [s for s in STAGES if s in totals.index] + [s for s in totals.index if s not in STAGES]
+            totals = totals.reindex(order)
+            st.write("**Per stage (ms)**")
+            st.dataframe(totals.round(2))
+            st.write("**Spans**")
+            st.dataframe(spans.drop(columns="depth").round(2), hide_index=True)
+        st.write("**Caches**")
+        tc = utils.cache_stats()
+        st.write(f"Tables: {tc['hits']} hits / {tc['misses']} misses, {tc['entries']} entries, "
+                 f"{tc['bytes'] / 2**20:.1f} of {tc['budget_bytes'] / 2**20:.0f} MB")
+        st.write(f"Charts: {charts.stats['hits']} hits / {charts.stats['misses']} misses")
+        ps = executor.stats
+        st.write(f"Pool ({executor.WORKERS} workers): {ps['submitted']} jobs, {ps['hits']} hits, "
+                 f"{ps['deduplicated']} deduplicated, {ps['timeouts']} timeouts, {ps['rejected']} rejected, "
+                 f"{executor.pending()} in flight")
+        mem = memory.report()
+        st.write(f"Memory: {mem['rss_mb']:.0f} MB RSS; shared tables {mem['tables_mb']:.1f} MB, "
+                 f"filtered views {mem['filtered_views_mb']:.1f} MB; this session "
+                 f"{memory.session_bytes() / 1024:.0f} KB")
+        tables = utils.memory_report()
+        if not tables.empty:
+            st.write("**Table bytes as read → compact dtypes**")
+            st.dataframe(tables.groupby("table")[["bytes_before", "bytes_after"]].sum())
+        w = warmup.status()
+        st.write(f"Warm-up: {w.state}" + (f" ({w.reason}, {w.done}/{w.total} steps, {w.seconds:.1f}s)"
+                                          if w.started else "")
+                 + (f", errors: {w.errors}" if w.errors else ""))
+        cold = startup_report()
+        if cold is not None:
+            st.write(f"**Cold start** ({cold['page']}, first run in this process)")
+            st.dataframe(pd.Series({k: cold[f"{k}_ms"] for k in ("import", "data", "render", "other", "total")},
+                                   name="ms").round(1))
+        st.download_button("Download session traces (JSON)", export_json(), file_name="profile_traces.json",
+                           mime="application/json")
@@ -0,0 +1,270 @@
+# query.py
+# Filtered group-by aggregates over warehouse tables, pushed down to DuckDB.
+#
+# Pages that only chart a small grouped result (offers per Phase x Role_Family,
+# weekly means) call aggregate(table, filters, by, measures) instead of loading
+# the fact table and grouping it in pandas. With duckdb installed the
+# Year/Program/Cohort/Phase filters and the GROUP BY run as SQL in-process,
+# scanning the Parquet/CSV files in parallel -- partitioned tables only open
+# the Cohort_ID/Phase part files the filters can match -- and only the grouped
+# rows come back. Without duckdb, or with QUERY_ENGINE=pandas, the same call
+# loads the projected columns through utils.load_table and groups them with
+# FilterEngine + pandas; both paths return the same frame.
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+import profiling
+import utils
+import visit_metrics
+import warehouse
+import weeks
+from filters import FilterState, get_engine
+
+ENGINE = os.environ.get("QUERY_ENGINE", "auto").strip().lower()  # auto | duckdb | pandas
+THREADS = int(os.environ.get("QUERY_THREADS", "0"))  # 0: DuckDB's default (all cores)
+MAX_RESULTS = 256
+
+# pandas aggregation name -> SQL template
+AGGS = {
+    "sum": "COALESCE(SUM({c}), 0)",
+    "mean": "AVG({c})",
+    "min": "MIN({c})",
+    "max": "MAX({c})",
+    "count": "COUNT({c})",
+    "nunique": "COUNT(DISTINCT {c})",
+}
+COUNTS = ("count", "nunique")
+
+Measures = Dict[str, Union[str, Tuple[str, str]]]
+
+# The aggregates pages chart, by name, so warmup.py can precompute them.
+NAMED: Dict[str, Tuple[str, List[str], Measures]] = {
+    "tutor.weekly": ("Tutor_Weekly_Summary", ["Week"],
+                     {"Sessions_Created_This_Week": "sum", "Overall_Utilization_This_Week_%": "mean",
+                      "Units_Adopted_%": "mean", "Active_Users_%": "mean"}),
+    "tutor.rolling": (weeks.ROLLING_TABLE, ["Week"], {c: "mean" for c in weeks.ROLLING.values()}),
+    "placements.funnel": ("Placements_Cohort", ["Phase"],
+                          {c: "sum" for c in ["Eligible", "Applied", "Shortlisted", "Offers", "Placed"]}),
+    **{f"placements.offers_by.{dim}": (visit_metrics.AGG_TABLE, ["Phase", dim], {"Offers_Issued": "sum"})
+       for dim in visit_metrics.DIMENSIONS},
+}
+
+
+def has_duckdb() -> bool:
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def use_duckdb() -> bool:
+    if ENGINE == "pandas":
+        return False
+    if ENGINE == "duckdb" and not has_duckdb():
+        raise ImportError("QUERY_ENGINE=duckdb but duckdb is not installed (pip install duckdb)")
+    return has_duckdb()
+
+
+def _measures(measures: Measures) -> List[Tuple[str, str, str]]:
+    """[(output, column, agg)] from {"col": "sum"} / {"out": ("col", "sum")}."""
+    out = []
+    for name, spec in measures.items():
+        column, agg = (name, spec) if isinstance(spec, str) else spec
+        if agg not in AGGS:
+            raise ValueError(f"Unsupported aggregation {agg!r}; expected one of {sorted(AGGS)}")
+        out.append((name, column, agg))
+    return out
+
+
+def _allowed_cohorts(state: FilterState) -> Optional[List[str]]:
+    """Cohort_IDs passing the Year/Program/Cohort filters, or None when none is set."""
+    index = get_engine().index
+    mask = index.cohort_mask(state)
+    if mask is None:
+        return None
+    return list(index.cohorts[mask[:-1]])
+
+
+def _key(name: str, values: pd.Series) -> pd.Series:
+    """Group key column: week columns as datetimes (chronological order), others as strings."""
+    if name == weeks.COLUMN:
+        return weeks.as_weeks(values)
+    return values.astype("string")
+
+
+def _finish(df: pd.DataFrame, by: List[str], spec: List[Tuple[str, str, str]]) -> pd.DataFrame:
+    for name, _, agg in spec:
+        df[name] = df[name].astype("int64" if agg in COUNTS else "float64")
+    utils.phase_order(df)
+    return df.sort_values(by, ignore_index=True) if by else df
+
+
+def _empty(by: List[str], spec: List[Tuple[str, str, str]]) -> pd.DataFrame:
+    """What the query returns over zero rows."""
+    empty = {name: pd.Series(dtype="float64") for name, _, _ in spec}
+    if by:
+        out = pd.DataFrame({**{k: _key(k, pd.Series(dtype="string")) for k in by}, **empty})
+    else:
+        out = pd.DataFrame({name: [s.agg(agg)] for (name, _, agg), s in zip(spec, empty.values())})
+    return _finish(out, by, spec)
+
+
+# ---------- pandas ----------
+def _aggregate_pandas(table: str, state: FilterState, by: List[str],
+                      spec: List[Tuple[str, str, str]]) -> pd.DataFrame:
+    if warehouse.find_table(table) is None:
+        return _empty(by, spec)
+    columns = list(dict.fromkeys(by + [c for _, c, _ in spec] + ["Cohort_ID", "Phase"]))
+    df = get_engine().apply(utils.load_table(table, columns=columns), state, table)
+    values = {name: df[c] if agg in COUNTS else pd.to_numeric(df[c], errors="coerce").astype("float64")
+              for name, c, agg in spec}
+    frame = pd.DataFrame({**{k: _key(k, df[k]) for k in by}, **values})
+    if by:
+        out = frame.groupby(by, observed=True).agg(**{name: (name, agg) for name, _, agg in spec}).reset_index()
+    else:
+        out = pd.DataFrame({name: [frame[name].agg(agg)] for name, _, agg in spec})
+    return _finish(out, by, spec)
+
+
+# ---------- DuckDB ----------
+_con = None
+_con_lock = threading.Lock()
+
+
+def _connection():
+    """Process-wide in-memory DuckDB; each query runs on its own cursor."""
+    global _con
+    with _con_lock:
+        if _con is None:
+            import duckdb
+            _con = duckdb.connect(":memory:")
+            if THREADS:
+                _con.execute(f"SET threads = {THREADS}")
+        return _con.cursor()
+
+
+def _literal(path: str) -> str:
+    return "'" + path.replace("'", "''") + "'"
+
+
+def _ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _source(table: str, state: FilterState, cohorts: Optional[List[str]]) -> Tuple[Optional[str], List[str]]:
+    """FROM clause over the table's files (pruned to matching partitions; None: no file) and its columns."""
+    path = warehouse.find_table(table)
+    if path is None:  # not stored yet, e.g. a derived table before its first source upload
+        return None, []
+    if path.endswith(".json"):
+        manifest = warehouse.read_manifest(path)
+        fmt, columns = manifest["format"], manifest["columns"]
+        wanted = {"Cohort_ID": set(cohorts) if cohorts is not None else None,
+                  "Phase": set(state.phases) if state.phases else None}
+        base = os.path.dirname(path)
+        files = []
+        for f in manifest["files"]:
+            values = warehouse.partition_values(f)
+            if all(wanted[c] is None or c not in values or values[c] in wanted[c] for c in wanted):
+                files.append(os.path.join(base, f))
+        if not files:
+            return None, columns
+    else:
+        fmt, files = ("parquet" if path.endswith(".parquet") else "csv"), [path]
+        columns = None
+    paths = "[" + ", ".join(_literal(f) for f in files) + "]"
+    if fmt == "parquet":
+        source = f"read_parquet({paths}, union_by_name = true, hive_partitioning = false)"
+    else:
+        source = f"read_csv({paths}, union_by_name = true, header = true, hive_partitioning = false)"
+    return source, columns
+
+
+def _aggregate_duckdb(table: str, state: FilterState, by: List[str],
+                      spec: List[Tuple[str, str, str]]) -> pd.DataFrame:
+    cohorts = _allowed_cohorts(state)
+    source, columns = _source(table, state, cohorts)
+    con = _connection()
+    if source is not None and columns is None:
+        columns = [d[0] for d in con.execute(f"SELECT * FROM {source} LIMIT 0").description]
+    if source is None:  # no part file can match
+        return _empty(by, spec)
+
+    where, params = [f"{_ident(k)} IS NOT NULL" for k in by], []
+    if cohorts is not None and "Cohort_ID" in columns:
+        if cohorts:
+            where.append("CAST(Cohort_ID AS VARCHAR) IN (SELECT unnest(?))")
+            params.append(cohorts)
+        else:
+            where.append("FALSE")
+    if state.phases and "Phase" in columns:
+        where.append("CAST(Phase AS VARCHAR) IN (SELECT unnest(?))")
+        params.append([str(p) for p in state.phases])
+
+    keys = [_ident(k) for k in by]
+    values = []
+    for name, column, agg in spec:
+        col = _ident(column) if agg in COUNTS else f"TRY_CAST({_ident(column)} AS DOUBLE)"
+        values.append(AGGS[agg].format(c=col) + f" AS {_ident(name)}")
+    sql = f"SELECT {', '.join(keys + values)} FROM {source}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if by:
+        sql += " GROUP BY " + ", ".join(_ident(k) for k in by)
+    out = con.execute(sql, params).df()
+    for k in by:
+        out[k] = _key(k, out[k])
+    return _finish(out, by, spec)
+
+
+# ---------- public ----------
+_results: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def aggregate(table: str, state: FilterState, by: Sequence[str], measures: Measures) -> pd.DataFrame:
+    """`measures` of `table` per `by` for the rows passing `state`, sorted by `by`.
+
+    measures maps a column to a pandas aggregation name ({"Offers_Issued": "sum"})
+    or an output name to (column, aggregation). Group keys come back as strings
+    (Phase as the ordered phase categorical, Week as the datetime of its
+    Monday, so both sort in time order); rows with a missing key are
+    dropped, as in DataFrame.groupby. A table that is not stored yet gives
+    the result over zero rows. Results are memoized per data version.
+    """
+    by, spec = list(by), _measures(measures)
+    engine = "duckdb" if use_duckdb() else "pandas"
+    key = (engine, table, utils.data_version("Cohort_Master", table), state, tuple(by), tuple(spec))
+    with profiling.stage("aggregate", f"{engine}: {table} by {', '.join(by) or '-'}") as span:
+        span.cache = "hit"
+        with _results_lock:
+            out = _results.get(key)
+            if out is not None:
+                _results.move_to_end(key)
+        if out is None:
+            span.cache = "miss"
+            run = _aggregate_duckdb if engine == "duckdb" else _aggregate_pandas
+            out = run(table, state, by, spec)
+            with _results_lock:
+                _results[key] = out
+                while len(_results) > MAX_RESULTS:
+                    _results.popitem(last=False)
+        span.rows_out = len(out)
+        return out.copy(deep=False)
+
+
+def named(name: str, state: FilterState) -> pd.DataFrame:
+    """aggregate() of the NAMED query `name`."""
+    table, by, measures = NAMED[name]
+    return aggregate(table, state, by, measures)
+
+
+def pivot(df: pd.DataFrame, index: str, columns: str, value: str) -> pd.DataFrame:
+    """Wide `index` x `columns` table of an aggregate() result, 0 where a pair has no rows."""
+    return df.pivot_table(index=index, columns=columns, values=value, aggfunc="sum",
+                          fill_value=0, observed=True)
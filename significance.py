@@ -0,0 +1,174 @@
+# significance.py
+# Bootstrap confidence intervals and permutation p-values for Pre/Post deltas.
+#
+# A delta is paired per cohort row (e.g. PostTutor_Exam_Avg -
+# PreTutor_Exam_Avg), so for the n rows where both values exist:
+#   - the bootstrap resamples rows with replacement: one (batch x n) int32
+#     index matrix per batch, gathered and averaged in a single NumPy call,
+#     and the CI is the percentile interval of the B resampled means;
+#   - the permutation test swaps Pre and Post within a row at random, i.e.
+#     flips the sign of each delta: a (batch x n) bit matrix times the deltas.
+#     The p-value is two-sided, (1 + #{|perm mean| >= |observed|}) / (B + 1).
+# Batches are sized to keep each matrix around BATCH_CELLS entries. With
+# SIGNIFICANCE_WORKERS > 1 the B resamples are split into that many shards on
+# the shared process pool (executor.py; seeded independently, so results only
+# depend on `seed` and the split). for_view() tests the DELTAS of an analytics
+# view and is memoized like it; pages call it through for_view_pooled().
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+RESAMPLES = int(os.environ.get("SIGNIFICANCE_RESAMPLES", "10000"))
+WORKERS = int(os.environ.get("SIGNIFICANCE_WORKERS", "0"))  # shards; 0/1: one
+BATCH_CELLS = 4_000_000
+CONFIDENCE = 0.95
+SEED = 0
+MAX_RESULTS = 64
+
+# analytics view -> the Post - Pre analytics.DERIVED columns tested on its page
+DELTAS: Dict[str, List[str]] = {
+    "tutor": ["Exam_Improvement"],
+    "mentor": ["Capstone_Improvement", "Grade_A_Improvement"],
+    "jpt": ["Conv_Improvement", "Package_Improvement"],
+}
+
+
+@dataclass
+class DeltaTest:
+    name: str
+    n: int
+    mean: float
+    ci_low: float
+    ci_high: float
+    p_value: float
+    resamples: int
+
+    def summary(self) -> str:
+        """One line for under a KPI tile."""
+        if self.n < 2:
+            return f"n = {self.n}: too few cohorts for a confidence interval"
+        p = "p < 0.001" if self.p_value < 0.001 else f"p = {self.p_value:.3f}"
+        return f"{CONFIDENCE:.0%} CI [{self.ci_low:+.2f}, {self.ci_high:+.2f}] · {p} · n = {self.n}"
+
+
+# ---------- resampling kernels (top-level so a process pool can run them) ----------
+def _batches(total: int, n: int):
+    step = max(1, BATCH_CELLS // max(n, 1))
+    for start in range(0, total, step):
+        yield min(step, total - start)
+
+
+def bootstrap_means(deltas: np.ndarray, resamples: int, seed) -> np.ndarray:
+    """Means of `resamples` bootstrap samples of `deltas`."""
+    rng = np.random.default_rng(seed)
+    n = len(deltas)
+    out = []
+    for b in _batches(resamples, n):
+        idx = rng.integers(0, n, size=(b, n), dtype=np.int32)
+        out.append(np.take(deltas, idx).mean(axis=1))
+    return np.concatenate(out) if out else np.empty(0)
+
+
+def sign_flip_means(deltas: np.ndarray, resamples: int, seed) -> np.ndarray:
+    """Means of `deltas` under `resamples` random Pre/Post swaps (sign flips)."""
+    rng = np.random.default_rng(seed)
+    n = len(deltas)
+    total = deltas.sum()
+    out = []
+    for b in _batches(resamples, n):
+        bits = np.unpackbits(rng.integers(0, 256, size=(b, (n + 7) // 8), dtype=np.uint8), axis=1, count=n)
+        # flipped rows contribute -d instead of +d
+        out.append((total - 2.0 * (bits @ deltas)) / n)
+    return np.concatenate(out) if out else np.empty(0)
+
+
+def _resample(deltas: np.ndarray, resamples: int, seed) -> Tuple[np.ndarray, np.ndarray]:
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    boot_seed, perm_seed = seed.spawn(2)
+    return bootstrap_means(deltas, resamples, boot_seed), sign_flip_means(deltas, resamples, perm_seed)
+
+
+def _resample_sharded(deltas: np.ndarray, resamples: int, seed, shards: int) -> Tuple[np.ndarray, np.ndarray]:
+    import executor
+
+    seeds = np.random.SeedSequence(seed).spawn(shards)
+    sizes = [resamples // shards + (i < resamples % shards) for i in range(shards)]
+    pool = executor.pool()
+    if pool is None:  # disabled, or already running inside a pool worker
+        parts = [_resample(deltas, k, s) for k, s in zip(sizes, seeds) if k]
+    else:
+        parts = [f.result() for f in [pool.submit(_resample, deltas, k, s) for k, s in zip(sizes, seeds) if k]]
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+# ---------- tests ----------
+def delta_test(post, pre, name: str = "", resamples: int = RESAMPLES, confidence: float = CONFIDENCE,
+               seed=SEED, workers: int = WORKERS) -> DeltaTest:
+    """Bootstrap CI and sign-flip permutation p-value of mean(post - pre) over complete pairs."""
+    deltas = np.asarray(post, dtype="float64") - np.asarray(pre, dtype="float64")
+    deltas = deltas[~np.isnan(deltas)]
+    n = len(deltas)
+    if n < 2:
+        mean = float(deltas.mean()) if n else float("nan")
+        return DeltaTest(name, n, mean, float("nan"), float("nan"), float("nan"), 0)
+    if workers > 1:
+        boot, perm = _resample_sharded(deltas, resamples, seed, workers)
+    else:
+        boot, perm = _resample(deltas, resamples, seed)
+    observed = deltas.mean()
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(boot, [alpha, 1 - alpha])
+    extreme = np.count_nonzero(np.abs(perm) >= abs(observed) - 1e-12 * max(abs(observed), 1.0))
+    return DeltaTest(name, n, float(observed), float(low), float(high),
+                     float((1 + extreme) / (resamples + 1)), resamples)
+
+
+_results: "OrderedDict[tuple, Dict[str, DeltaTest]]" = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def for_view(view: str, state) -> Dict[str, DeltaTest]:
+    """DeltaTest per DELTAS[view] over the rows of analytics.analyze(view, state) (memoized)."""
+    import analytics
+    import profiling
+
+    key = (view, analytics.data_version(view), state, RESAMPLES)
+    with profiling.stage("aggregate", f"significance: {view}") as span:
+        span.cache = "hit"
+        with _results_lock:
+            out = _results.get(key)
+            if out is not None:
+                _results.move_to_end(key)
+        if out is None:
+            span.cache = "miss"
+            kpis = analytics.analyze(view, state).kpis
+            out = {}
+            for name in DELTAS[view]:
+                post, _, pre = analytics.DERIVED[name]
+                if post in kpis.columns and pre in kpis.columns:
+                    out[name] = delta_test(kpis[post].to_numpy(), kpis[pre].to_numpy(), name)
+            with _results_lock:
+                _results[key] = out
+                while len(_results) > MAX_RESULTS:
+                    _results.popitem(last=False)
+        span.rows_out = len(out)
+        return out
+
+
+def for_view_pooled(view: str, state, timeout: Optional[float] = None) -> Dict[str, DeltaTest]:
+    """for_view() on the shared process pool; {} (no captions) until it finishes."""
+    import analytics
+    import executor
+
+    key = ("significance", view, analytics.data_version(view), state, RESAMPLES)
+    return executor.run(key, for_view, view, state, timeout=timeout, placeholder={})
+
+
+def table(tests: Dict[str, DeltaTest]) -> List[dict]:
+    """Rows for st.dataframe."""
+    return [asdict(t) for t in tests.values()]
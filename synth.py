@@ -0,0 +1,275 @@
+# synth.py
+# Synthetic warehouse generator for scale testing.
+#
+# Produces every dataset in utils.SCHEMAS_DTYPES with the schema's columns and
+# dtypes. Keys line up across tables: cohort-level tables have one row per
+# (Cohort_ID, Phase) of Cohort_Master, Company_Visits and the tutor tables only
+# reference those cohorts, and Tutor_Session_Utilization rows belong to
+# sessions of Tutor_Sessions (same Cohort_ID/Phase). Columns without a
+# dedicated rule get values from their dtype and name (percentages in
+# 0-100, packages in LPA, counts as small integers). Everything is generated
+# with numpy arrays -- no per-row Python -- so millions of visit rows take
+# seconds.
+#
+#   python synth.py --out data/warehouse --cohorts 200 --visits-per-cohort 20000
+#   python synth.py --out /tmp/wh --format csv --weeks 52 --sessions-per-unit 8
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass, fields
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+import utils
+import warehouse
+from utils import PHASES, SCHEMAS_DTYPES
+
+PROGRAMS = ["GMBA", "PGDM", "MGB"]
+TIERS = ["Tier 1", "Tier 2", "Tier 3"]
+SECTORS = ["Technology", "BFSI", "Consulting", "FMCG", "Manufacturing", "Healthcare"]
+ROLE_FAMILIES = ["Tech", "Finance", "Consulting", "Marketing", "Operations"]
+
+
+@dataclass
+class Scale:
+    cohorts: int = 30
+    start_year: int = 2023
+    weeks: int = 40                 # weekly summary rows per cohort/phase
+    visits_per_cohort: int = 50     # Company_Visits rows per cohort/phase
+    companies: int = 500
+    units: int = 10                 # units per cohort/phase
+    sessions_per_unit: int = 5
+    utilization_weeks: int = 4      # utilization rows per session
+    seed: int = 0
+
+
+# ---------- vectorized helpers ----------
+def _take(pool, codes: np.ndarray) -> pd.Series:
+    """pool[codes] as a "string" column, built without per-row Python objects when possible."""
+    pool = np.asarray(pool, dtype=object)
+    if warehouse.has_pyarrow():
+        import pyarrow as pa
+        return pd.Series(pd.arrays.ArrowStringArray(pa.array(pool, pa.string()).take(pa.array(codes))))
+    return pd.Series(pool[codes]).astype("string")
+
+
+def _labels(prefix: str, n: int, width: int) -> np.ndarray:
+    return np.array([f"{prefix}{i:0{width}d}" for i in range(n)], dtype=object)
+
+
+def _weeks(year: np.ndarray, week: np.ndarray) -> pd.Series:
+    """Monday of ISO week `week` of `year` (how Week is stored after ingest)."""
+    jan4 = (np.asarray(year) - 1970).astype("datetime64[Y]").astype("datetime64[D]") + 3
+    monday = jan4 - (jan4.astype("int64") + 3) % 7  # 1970-01-01 was a Thursday
+    return pd.Series(monday + 7 * (np.asarray(week) - 1)).astype("datetime64[ns]")
+
+
+def _fill(rng: np.random.Generator, col: str, dtype: str, n: int) -> pd.Series:
+    """Generic values for a column from its dtype and name."""
+    name = col.lower()
+    if dtype == "Float64":
+        if "%" in col:
+            values = rng.uniform(0, 100, n)
+        elif "package" in name:
+            values = rng.gamma(6.0, 2.0, n) + 3.0
+        elif "sessions" in name:
+            values = rng.uniform(0, 20, n)
+        elif "trs" in name:
+            values = rng.uniform(0, 10, n)
+        else:
+            values = rng.normal(70, 10, n).clip(0, 100)
+        return pd.Series(values.round(2)).astype("Float64")
+    if dtype == "Int64":
+        return pd.Series(rng.integers(0, 200, n)).astype("Int64")
+    if dtype == "datetime":
+        return pd.Series(pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), "D"))
+    return _take(["A", "B", "C"], rng.integers(0, 3, n))
+
+
+def _frame(dataset: str, rng: np.random.Generator, n: int, cols: Dict[str, pd.Series]) -> pd.DataFrame:
+    """Schema-ordered frame: `cols` first-class values, the rest filled generically."""
+    out = {}
+    for col, dtype in SCHEMAS_DTYPES[dataset].items():
+        out[col] = cols[col] if col in cols else _fill(rng, col, dtype, n)
+    return pd.DataFrame(out)
+
+
+def _funnel(rng: np.random.Generator, top: np.ndarray, low: float, high: float) -> np.ndarray:
+    """A count no larger than `top`: top * uniform(low, high)."""
+    return np.floor(top * rng.uniform(low, high, len(top))).astype("int64")
+
+
+# ---------- datasets ----------
+class Generator:
+    def __init__(self, scale: Scale):
+        self.scale = scale
+        self.rng = np.random.default_rng(scale.seed)
+        s = scale
+        self.cohort_ids = _labels("C", s.cohorts, 4)
+        self.years = s.start_year + self.rng.integers(0, 3, s.cohorts)
+        self.programs = self.rng.integers(0, len(PROGRAMS), s.cohorts)
+        # index of every (cohort, phase) cell
+        self.cell_cohort = np.repeat(np.arange(s.cohorts), len(PHASES))
+        self.cell_phase = np.tile(np.arange(len(PHASES)), s.cohorts)
+
+    def _cells(self, per_cell: int):
+        """(cohort index, phase index) arrays with `per_cell` rows per cohort/phase."""
+        return np.repeat(self.cell_cohort, per_cell), np.repeat(self.cell_phase, per_cell)
+
+    def _keys(self, cohort: np.ndarray, phase: np.ndarray) -> Dict[str, pd.Series]:
+        return {"Cohort_ID": _take(self.cohort_ids, cohort), "Phase": _take(PHASES, phase)}
+
+    def cohort_master(self) -> pd.DataFrame:
+        n = self.scale.cohorts
+        cols = {
+            "Cohort_ID": _take(self.cohort_ids, np.arange(n)),
+            "Year": pd.Series(self.years).astype("Int64"),
+            "Program": _take(PROGRAMS, self.programs),
+        }
+        return _frame("Cohort_Master", self.rng, n, cols)
+
+    def cohort_level(self, dataset: str) -> pd.DataFrame:
+        cohort, phase = self._cells(1)
+        cols = self._keys(cohort, phase)
+        n = len(cohort)
+        if dataset == "Placements_Cohort":
+            eligible = self.rng.integers(40, 200, n)
+            applied = _funnel(self.rng, eligible, 0.7, 1.0)
+            shortlisted = _funnel(self.rng, applied, 0.4, 0.8)
+            offers = _funnel(self.rng, shortlisted, 0.5, 0.9)
+            placed = _funnel(self.rng, offers, 0.8, 1.0)
+            cols.update({
+                "Eligible": eligible, "Applied": applied, "Shortlisted": shortlisted, "Offers": offers,
+                "Placed": placed, "Tier1_Offers": _funnel(self.rng, offers, 0.1, 0.4),
+            })
+        elif dataset == "JPT_Cohort":
+            before = self.rng.integers(0, 30, n)
+            cols.update({"Tier1_Offers_Before": before, "Tier1_Offers_After": before + self.rng.integers(0, 10, n)})
+        elif dataset == "Tutor_Cohort_Summary":
+            attempts = self.rng.integers(0, 40, n)
+            cols.update({"Higher_Degree_Attempts": attempts,
+                         "Higher_Degree_Admissions": _funnel(self.rng, attempts, 0.2, 0.8)})
+        cols = {k: (pd.Series(v).astype("Int64") if isinstance(v, np.ndarray) else v) for k, v in cols.items()}
+        return _frame(dataset, self.rng, n, cols)
+
+    def company_visits(self) -> pd.DataFrame:
+        s = self.scale
+        cohort, phase = self._cells(s.visits_per_cohort)
+        n = len(cohort)
+        company = self.rng.integers(0, s.companies, n)
+        # a company keeps its tier and sector across visits
+        company_tier = self.rng.integers(0, len(TIERS), s.companies)
+        company_sector = self.rng.integers(0, len(SECTORS), s.companies)
+        family = self.rng.integers(0, len(ROLE_FAMILIES), n)
+        openings = self.rng.integers(1, 30, n)
+        day = self.rng.integers(0, 365, n)
+        year_start = pd.to_datetime(self.years.astype(str), format="%Y").to_numpy()
+        visit_date = year_start[cohort] + pd.to_timedelta(day, "D").to_numpy()
+        cols = self._keys(cohort, phase)
+        cols.update({
+            "Company_Name": _take(_labels("Company ", s.companies, 4), company),
+            "Visit_Date": pd.Series(visit_date),
+            "Role_Title": _take([f"{f} Associate" for f in ROLE_FAMILIES], family),
+            "Role_Family": _take(ROLE_FAMILIES, family),
+            "Tier": _take(TIERS, company_tier[company]),
+            "Sector": _take(SECTORS, company_sector[company]),
+            "Openings_Announced": pd.Series(openings).astype("Int64"),
+            "Offers_Issued": pd.Series(self.rng.binomial(openings, 0.3)).astype("Int64"),
+        })
+        return _frame("Company_Visits", self.rng, n, cols)
+
+    def tutor_sessions(self) -> pd.DataFrame:
+        s = self.scale
+        per_cell = s.units * s.sessions_per_unit
+        cohort, phase = self._cells(per_cell)
+        n = len(cohort)
+        unit = np.tile(np.repeat(np.arange(s.units), s.sessions_per_unit), len(self.cell_cohort))
+        self._session_cohort = cohort
+        cols = self._keys(cohort, phase)
+        cols.update({
+            "Unit_Code": _take(_labels("U", s.units, 3), unit),
+            # session ids are unique across cohorts and phases
+            "Session_ID": _take(_labels("S", n, len(str(n))), np.arange(n)),
+            "Assigned_Count": pd.Series(self.rng.integers(20, 120, n)).astype("Int64"),
+        })
+        return _frame("Tutor_Sessions", self.rng, n, cols)
+
+    def tutor_session_utilization(self, sessions: pd.DataFrame) -> pd.DataFrame:
+        s = self.scale
+        k = s.utilization_weeks
+        rows = np.repeat(np.arange(len(sessions)), k)
+        n = len(rows)
+        start = self.rng.integers(1, max(2, s.weeks - k + 2), len(sessions))
+        week = np.minimum(start[rows] + np.tile(np.arange(k), len(sessions)), 53)
+        year = self.years[self._session_cohort[rows]]
+        avg = self.rng.uniform(2, 9, n)
+        cols = {
+            "Cohort_ID": sessions["Cohort_ID"].take(rows).reset_index(drop=True),
+            "Phase": sessions["Phase"].take(rows).reset_index(drop=True),
+            "Session_ID": sessions["Session_ID"].take(rows).reset_index(drop=True),
+            "Week": _weeks(year, week),
+            "Avg_TRS": pd.Series(avg.round(2)).astype("Float64"),
+            "Highest_TRS": pd.Series(np.minimum(avg + self.rng.uniform(0, 3, n), 10).round(2)).astype("Float64"),
+        }
+        return _frame("Tutor_Session_Utilization", self.rng, n, cols)
+
+    def tutor_weekly_summary(self) -> pd.DataFrame:
+        s = self.scale
+        cohort, phase = self._cells(s.weeks)
+        week = np.tile(np.arange(1, s.weeks + 1), len(self.cell_cohort))
+        week = (week - 1) % 53 + 1
+        cols = self._keys(cohort, phase)
+        cols.update({
+            "Week": _weeks(self.years[cohort], week),
+            "Sessions_Created_This_Week": pd.Series(self.rng.integers(0, 3 * s.units, len(cohort))).astype("Int64"),
+        })
+        return _frame("Tutor_Weekly_Summary", self.rng, len(cohort), cols)
+
+    def tables(self):
+        """Yield (dataset, frame) for every dataset in SCHEMAS_DTYPES."""
+        sessions = self.tutor_sessions()
+        builders: Dict[str, Callable[[], pd.DataFrame]] = {
+            "Cohort_Master": self.cohort_master,
+            "Company_Visits": self.company_visits,
+            "Tutor_Sessions": lambda: sessions,
+            "Tutor_Session_Utilization": lambda: self.tutor_session_utilization(sessions),
+            "Tutor_Weekly_Summary": self.tutor_weekly_summary,
+        }
+        for dataset in SCHEMAS_DTYPES:
+            build = builders.get(dataset, lambda: self.cohort_level(dataset))
+            yield dataset, build()
+
+
+def generate(out: str, scale: Scale, fmt: Optional[str] = None, log: Callable[[str], None] = print) -> Dict[str, int]:
+    """Write a synthetic warehouse to `out`; returns rows per dataset."""
+    warehouse.WAREHOUSE_DIR = out
+    os.makedirs(out, exist_ok=True)
+    rows = {}
+    for dataset, df in Generator(scale).tables():
+        start = time.perf_counter()
+        warehouse.write_table(df, dataset, fmt=fmt)
+        rows[dataset] = len(df)
+        log(f"{dataset:<27} {len(df):>12,} rows  {time.perf_counter() - start:6.2f}s")
+    utils.invalidate_table()
+    return rows
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Generate a synthetic warehouse from SCHEMAS_DTYPES.")
+    ap.add_argument("--out", default=warehouse.WAREHOUSE_DIR, help="warehouse directory to write")
+    ap.add_argument("--format", choices=warehouse.FORMATS, help="default: Parquet if pyarrow is installed")
+    for f in fields(Scale):
+        ap.add_argument(f"--{f.name.replace('_', '-')}", type=int, default=f.default)
+    args = ap.parse_args(argv)
+    scale = Scale(**{f.name: getattr(args, f.name) for f in fields(Scale)})
+    start = time.perf_counter()
+    generate(args.out, scale, args.format)
+    print(f"done in {time.perf_counter() - start:.1f}s -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
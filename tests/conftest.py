@@ -0,0 +1,40 @@
+# tests/conftest.py
+# Shared fixtures: the repo root on sys.path and a scratch copy of the
+# bundled warehouse, so tests never write into data/warehouse.
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("WARMUP", "0")
+
+
+@pytest.fixture
+def warehouse_dir(tmp_path, monkeypatch):
+    """A copy of data/warehouse installed as warehouse.WAREHOUSE_DIR."""
+    import utils
+    import warehouse
+
+    path = str(tmp_path / "warehouse")
+    shutil.copytree(os.path.join(ROOT, "data", "warehouse"), path)
+    monkeypatch.setattr(warehouse, "WAREHOUSE_DIR", path)
+    utils.invalidate_table()
+    yield path
+    utils.invalidate_table()
+
+
+@pytest.fixture
+def empty_warehouse(tmp_path, monkeypatch):
+    """An empty warehouse.WAREHOUSE_DIR."""
+    import utils
+    import warehouse
+
+    path = str(tmp_path / "empty")
+    os.makedirs(path)
+    monkeypatch.setattr(warehouse, "WAREHOUSE_DIR", path)
+    utils.invalidate_table()
+    yield path
+    utils.invalidate_table()
@@ -0,0 +1,72 @@
+# tests/test_analytics.py
+# The vectorized correlation matrix and per-Phase fits match pandas / NumPy.
+import numpy as np
+import pandas as pd
+import pytest
+
+import analytics
+from filters import FilterState
+
+
+def _with_gaps(rows: int = 60, cols: int = 5, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(rows, cols)) @ rng.normal(size=(cols, cols))  # correlated columns
+    values[rng.random(values.shape) < 0.2] = np.nan
+    return values
+
+
+def test_corr_matrix_matches_dataframe_corr():
+    values = _with_gaps()
+    values[:, 4] = 3.0  # constant column: undefined r
+    values[:58, 3] = np.nan  # two complete pairs at most
+    expected = pd.DataFrame(values).corr().to_numpy()
+    got = analytics.corr_matrix(values)
+    assert np.array_equal(np.isnan(got), np.isnan(expected))
+    assert np.allclose(got, expected, atol=1e-12, equal_nan=True)
+
+
+def test_corr_matrix_ignores_offsets():
+    values = _with_gaps(seed=1)
+    shifted = values + np.array([1e6, -1e6, 0, 5e5, 1.0])
+    assert np.allclose(analytics.corr_matrix(shifted), analytics.corr_matrix(values), atol=1e-9, equal_nan=True)
+
+
+def test_grouped_fits_match_polyfit():
+    rng = np.random.default_rng(3)
+    n = 90
+    groups = rng.integers(-1, 3, n)  # -1: only in the overall fit
+    x = rng.normal(size=(n, 2))
+    y = np.column_stack([2 * x[:, 0] + 1 + rng.normal(0, 0.1, n), -x[:, 1] + rng.normal(0, 1, n)])
+    x[rng.random(x.shape) < 0.1] = np.nan
+    y[rng.random(y.shape) < 0.1] = np.nan
+    out = analytics.grouped_fits(x, y, groups, 3)
+    for g in range(4):
+        rows = groups == g if g < 3 else np.ones(n, dtype=bool)
+        for p in range(2):
+            ok = rows & ~np.isnan(x[:, p]) & ~np.isnan(y[:, p])
+            slope, intercept = np.polyfit(x[ok, p], y[ok, p], 1)
+            assert out["n"][g, p] == ok.sum()
+            assert out["slope"][g, p] == pytest.approx(slope)
+            assert out["intercept"][g, p] == pytest.approx(intercept)
+            assert out["r"][g, p] == pytest.approx(np.corrcoef(x[ok, p], y[ok, p])[0, 1])
+
+
+def test_grouped_fits_undefined():
+    x = np.array([[1.0], [1.0], [2.0], [np.nan]])
+    y = np.array([[2.0], [3.0], [5.0], [1.0]])
+    out = analytics.grouped_fits(x, y, np.array([0, 0, 1, 1]), 2)
+    assert out["n"][:, 0].tolist() == [2, 1, 3]
+    assert np.isnan(out["slope"][0, 0]) and np.isnan(out["r"][0, 0])  # x constant within group 0
+    assert np.isnan(out["slope"][1, 0])  # one point
+    assert out["slope"][2, 0] == pytest.approx(np.polyfit([1, 1, 2], [2, 3, 5], 1)[0])
+
+
+def test_analyze_matches_pandas(warehouse_dir):
+    result = analytics.analyze("jpt", FilterState.normalize(phases=["Pre-AI", "Yoodli", "JPT"]))
+    numeric = result.kpis.drop(columns=["Cohort_ID", "Phase"]).astype("float64")
+    expected = numeric.corr()
+    assert np.allclose(result.corr.loc[expected.index, expected.columns], expected, atol=1e-12, equal_nan=True)
+    for phase, rows in result.kpis.groupby("Phase", observed=True):
+        pair = rows[["Avg_AI_Technical", "Avg_Package"]].astype("float64").dropna()
+        slope, intercept = np.polyfit(pair["Avg_AI_Technical"], pair["Avg_Package"], 1)
+        assert result.line("Avg_AI_Technical", "Avg_Package", str(phase)) == pytest.approx((slope, intercept))
@@ -0,0 +1,74 @@
+# tests/test_cube.py
+# KPI cube roll-ups agree with the Overview KPIs computed from the row-level
+# source tables (Cohort_Master merge + isin filters, as the pages used to).
+import numpy as np
+import pandas as pd
+import pytest
+
+import cube
+import visit_metrics
+import warehouse
+from filters import FilterState, get_engine
+
+STATES = {
+    "all": FilterState.normalize(phases=["Pre-AI", "Yoodli", "JPT"]),
+    "year": FilterState.normalize(years=[2024]),
+    "program+phase": FilterState.normalize(programs=["GMBA"], phases=["JPT", "Yoodli"]),
+    "cohorts": FilterState.normalize(cohorts=["C001", "C004", "C011"], phases=["Yoodli"]),
+}
+
+
+def _rows(table: str, state: FilterState) -> pd.DataFrame:
+    """Rows of `table` passing `state`, filtered the way the pages' apply_filters did."""
+    cm = warehouse.read_table("Cohort_Master")[["Cohort_ID", "Year", "Program"]]
+    df = warehouse.read_table(table).astype({"Cohort_ID": "string", "Phase": "string"})
+    df = df.merge(cm.astype({"Cohort_ID": "string"}), on="Cohort_ID", how="left")
+    if state.years:
+        df = df[df["Year"].isin(state.years)]
+    if state.programs:
+        df = df[df["Program"].isin(state.programs)]
+    if state.cohorts:
+        df = df[df["Cohort_ID"].isin(state.cohorts)]
+    if state.phases:
+        df = df[df["Phase"].isin(state.phases)]
+    return df
+
+
+def _conversion_per_visit(visits: pd.DataFrame) -> float:
+    """Definitions page: mean of Offers_Issued / Openings_Announced per visit."""
+    openings = visits["Openings_Announced"].astype("float64")
+    return 100 * (visits["Offers_Issued"].astype("float64") / openings.where(openings > 0)).mean()
+
+
+@pytest.mark.parametrize("state", list(STATES))
+def test_rollup_matches_source_rows(state, warehouse_dir):
+    state = STATES[state]
+    kc = cube.load_cube()
+    tot = cube.rollup(get_engine().apply(kc, state))
+    pc = _rows("Placements_Cohort", state)
+    assert len(pc) > 0
+    assert cube.rows(tot, "Placements_Cohort") == len(pc)
+    assert cube.ratio(tot, "Placed", "Eligible") == pytest.approx(100 * pc["Placed"].sum() / pc["Eligible"].sum())
+    assert cube.ratio(tot, "Tier1_Offers", "Offers") == pytest.approx(
+        100 * pc["Tier1_Offers"].sum() / pc["Offers"].sum())
+    assert cube.mean(tot, "Avg_Package") == pytest.approx(pc["Avg_Package"].mean())
+    tutor = _rows("Tutor_Cohort_Summary", state)
+    assert cube.mean(tot, "PostTutor_Exam_Avg") - cube.mean(tot, "PreTutor_Exam_Avg") == pytest.approx(
+        tutor["PostTutor_Exam_Avg"].mean() - tutor["PreTutor_Exam_Avg"].mean())
+    jpt = _rows("JPT_Cohort", state)
+    assert cube.mean(tot, "Avg_AI_Technical") == pytest.approx(jpt["Avg_AI_Technical"].mean())
+    visits = _rows(visit_metrics.SOURCE, state)
+    assert cube.visit_ratio(tot, "Avg_Conversion_Per_Visit_%") == pytest.approx(_conversion_per_visit(visits))
+    assert cube.visit_ratio(tot, "Avg_Openings_Per_Visit") == pytest.approx(
+        visits["Openings_Announced"].astype("float64").mean())
+
+
+def test_rollup_by_phase_matches_source_rows(warehouse_dir):
+    state = STATES["all"]
+    by_phase = cube.rollup_by_phase(get_engine().apply(cube.load_cube(), state)).rename(index=str).sort_index()
+    visits = _rows(visit_metrics.SOURCE, state)
+    expected = visits.groupby("Phase").apply(_conversion_per_visit).sort_index()
+    assert np.allclose(cube.visit_ratio(by_phase, "Avg_Conversion_Per_Visit_%"), expected)
+    pc = _rows("Placements_Cohort", state)
+    expected = pc.groupby("Phase")["Avg_Package"].mean().sort_index()
+    assert np.allclose(cube.mean(by_phase, "Avg_Package"), expected)
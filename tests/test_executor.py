@@ -0,0 +1,36 @@
+# tests/test_executor.py
+# The shared process pool must serve page jobs when the page runs as
+# Streamlit's stand-in __main__ (workers must not re-run the page).
+import os
+
+import pytest
+
+from conftest import ROOT
+
+# runs the page the way runpages-style harnesses do: exec'd from a script that
+# Streamlit installs as __main__, with the repo root ahead of pages/ on sys.path
+_APP = """
+import sys
+sys.path.insert(0, {root!r})
+exec(compile(open({path!r}).read(), {path!r}, "exec"))
+"""
+
+
+@pytest.mark.parametrize("page", ["3_AI_Mentor", "4_JPT"])
+def test_page_jobs_run_on_pool(page, warehouse_dir, monkeypatch):
+    from streamlit.testing.v1 import AppTest
+
+    import executor
+
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(executor, "WORKERS", 2)
+    monkeypatch.setattr(executor, "stats", dict.fromkeys(executor.stats, 0))
+    executor._results.clear()
+    try:
+        path = os.path.join(ROOT, "pages", f"{page}.py")
+        at = AppTest.from_string(_APP.format(root=ROOT, path=path), default_timeout=300).run()
+        assert not at.exception
+        assert executor.stats["submitted"] > 0
+        assert executor.stats["inline"] == 0
+    finally:
+        executor.shutdown()
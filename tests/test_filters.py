@@ -0,0 +1,91 @@
+# tests/test_filters.py
+# FilterEngine selects the same rows as the merge-plus-isin apply_filters the
+# pages used before, and its memos follow table rewrites.
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+import warehouse
+from filters import CohortIndex, FilterEngine, FilterState, get_engine
+
+CM = pd.DataFrame({
+    "Cohort_ID": ["C1", "C2", "C3", "C4"],
+    "Year": pd.array([2023, 2024, 2024, 2025], dtype="Int64"),
+    "Program": ["MGB", "GMBA", "MGB", "GMBA"],
+})
+# C9 is not in Cohort_Master; one row has no Cohort_ID
+FACT = pd.DataFrame({
+    "Cohort_ID": pd.array(["C1", "C2", "C9", "C3", None, "C4", "C2", "C9"], dtype="string"),
+    "Phase": ["Pre-AI", "JPT", "JPT", "Yoodli", "JPT", "Pre-AI", "Yoodli", "Pre-AI"],
+    "Value": np.arange(8.0),
+})
+STATES = [
+    FilterState(),
+    FilterState.normalize(years=[2024]),
+    FilterState.normalize(programs=["MGB"]),
+    FilterState.normalize(cohorts=["C2", "C4"]),
+    FilterState.normalize(phases=["JPT"]),
+    FilterState.normalize(years=[2024, 2025], programs=["GMBA"], phases=["Yoodli", "Pre-AI"]),
+    FilterState.normalize(years=[2023], cohorts=["C2"]),  # matches nothing
+]
+
+
+def apply_filters(df: pd.DataFrame, cm: pd.DataFrame, state: FilterState) -> pd.DataFrame:
+    """The pages' original filter: left merge with Cohort_Master, then isin per selection."""
+    df = df.reset_index(names="_row").merge(cm[["Cohort_ID", "Year", "Program"]], on="Cohort_ID", how="left")
+    if state.years:
+        df = df[df["Year"].isin(state.years)]
+    if state.programs:
+        df = df[df["Program"].isin(state.programs)]
+    if state.cohorts:
+        df = df[df["Cohort_ID"].isin(state.cohorts)]
+    if state.phases:
+        df = df[df["Phase"].isin(state.phases)]
+    return df
+
+
+@pytest.mark.parametrize("phase_dtype", ["string", "category"])
+@pytest.mark.parametrize("state", STATES)
+def test_engine_matches_merge_filter(state, phase_dtype):
+    fact = FACT.astype({"Phase": phase_dtype})
+    engine = FilterEngine(CohortIndex(CM.astype({"Cohort_ID": "string"})))
+    expected = apply_filters(fact, CM.astype({"Cohort_ID": "string"}), state)["_row"].to_numpy()
+    assert engine.row_index(fact, state).tolist() == sorted(expected)
+    pd.testing.assert_frame_equal(engine.apply(fact, state), fact.iloc[sorted(expected)])
+
+
+@pytest.mark.parametrize("state", STATES[:6])
+def test_engine_matches_merge_filter_on_warehouse(state, warehouse_dir):
+    cm = utils.load_table("Cohort_Master")
+    state = state._replace(cohorts=tuple(c.replace("C", "C00") for c in state.cohorts))
+    for table in ("Placements_Cohort", "Company_Visits"):
+        df = utils.load_table(table)
+        expected = apply_filters(df, cm, state)["_row"].to_numpy()
+        assert get_engine().row_index(df, state, table).tolist() == sorted(expected)
+
+
+def test_memo_follows_rewrites(warehouse_dir):
+    table, state = "Placements_Cohort", FilterState.normalize(years=[2024], phases=["JPT"])
+    engine = get_engine()
+    before = utils.load_table(table)
+    assert engine.row_index(before, state, table).tolist() == sorted(
+        apply_filters(before, utils.load_table("Cohort_Master"), state)["_row"])
+
+    # a fact table rewrite bumps its data version: positions are recomputed, not served from the memo
+    warehouse.write_table(before.iloc[::-1].head(len(before) - 3).reset_index(drop=True), table)
+    utils.invalidate_table(table)
+    after = utils.load_table(table)
+    expected = sorted(apply_filters(after, utils.load_table("Cohort_Master"), state)["_row"])
+    assert engine.row_index(after, state, table).tolist() == expected
+    assert len(engine.table(table, state)) == len(expected)
+
+    # a Cohort_Master rewrite gives a new engine with the new Year of each cohort
+    cm = utils.load_table("Cohort_Master")
+    cm["Year"] = 2024
+    warehouse.write_table(cm, "Cohort_Master")
+    utils.invalidate_table("Cohort_Master")
+    assert get_engine() is not engine
+    expected = sorted(apply_filters(after, cm, state)["_row"])
+    assert get_engine().row_index(after, state, table).tolist() == expected
+    assert len(get_engine().table(table, state)) == len(expected)
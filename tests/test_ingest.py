@@ -0,0 +1,15 @@
+# tests/test_ingest.py
+# Streaming ingestion from paths and in-memory buffers.
+import io
+
+import ingest
+import warehouse
+
+
+def test_ingest_from_bytesio(empty_warehouse):
+    data = b"Cohort_ID,Year,Program\nC1,2024,MGB\nC2,2023,GMBA\n"
+    seen = []
+    result = ingest.ingest(io.BytesIO(data), "Cohort_Master", progress=lambda rows, fraction: seen.append(fraction))
+    assert result.rows == 2
+    assert warehouse.read_table("Cohort_Master")["Cohort_ID"].tolist() == ["C1", "C2"]
+    assert seen and seen[-1] == 1.0
@@ -0,0 +1,29 @@
+# tests/test_journey.py
+# Cohort_Journey takes the visit metrics from Company_Visits and is rebuilt
+# when visits are uploaded.
+import io
+
+import pandas as pd
+
+import ingest
+import journey
+import utils
+
+
+def test_visit_upload_rebuilds_journey(warehouse_dir):
+    journey.build()
+    visits = pd.DataFrame({
+        "Cohort_ID": ["C000", "C000"], "Phase": ["JPT", "JPT"], "Company_Name": ["A", "B"],
+        "Visit_Date": ["2025-01-06", "2025-01-13"], "Role_Title": ["Analyst", "Engineer"],
+        "Role_Family": ["Finance", "Tech"], "Tier": ["Tier1", "Tier2"], "Sector": ["BFSI", "IT"],
+        "Offers_Issued": [5, 20], "Openings_Announced": [10, 20],
+    })
+    ingest.ingest(io.BytesIO(visits.to_csv(index=False).encode()), "Company_Visits")
+
+    stored = utils.load_table(journey.JOURNEY_TABLE)  # as refresh_derived left it, no staleness check
+    row = stored[(stored["Cohort_ID"] == "C000") & (stored["Phase"] == "JPT")].iloc[0]
+    assert row["Avg_Conversion_Per_Visit_%"] == 75.0   # mean of 50% and 100% per visit
+    assert row["Avg_Openings_Per_Visit"] == 15.0
+    assert row[journey.flag("Visit_Metrics")]
+    others = stored[stored["Cohort_ID"] != "C000"]
+    assert others["Avg_Conversion_Per_Visit_%"].isna().all()
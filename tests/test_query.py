@@ -0,0 +1,63 @@
+# tests/test_query.py
+# The DuckDB and pandas paths of query.aggregate() return the same frame.
+import os
+
+import pandas as pd
+import pytest
+
+import query
+import utils
+import warehouse
+from filters import FilterState
+
+pytest.importorskip("duckdb")
+
+STATES = {
+    "none": FilterState(),
+    "cohort": FilterState.normalize(cohorts=["C001", "C004"]),
+    "phase": FilterState.normalize(phases=["JPT"]),
+}
+
+
+def _both(monkeypatch, table, state, by, measures):
+    out = []
+    for engine in ("duckdb", "pandas"):
+        monkeypatch.setattr(query, "ENGINE", engine)
+        out.append(query.aggregate(table, state, by, measures))
+    return out
+
+
+@pytest.mark.parametrize("state", list(STATES))
+@pytest.mark.parametrize("name", list(query.NAMED))
+def test_named_parity(name, state, warehouse_dir, monkeypatch):
+    table, by, measures = query.NAMED[name]
+    duck, pandas = _both(monkeypatch, table, STATES[state], by, measures)
+    assert len(pandas) > 0
+    pd.testing.assert_frame_equal(duck, pandas)
+
+
+def _missing_partition():
+    """A (Cohort_ID, Phase) of Cohort_Master that Company_Visits has no part file for."""
+    manifest = warehouse.read_manifest(warehouse.find_table("Company_Visits"))
+    stored = {tuple(warehouse.partition_values(f)[c] for c in ("Cohort_ID", "Phase")) for f in manifest["files"]}
+    cohorts = sorted(utils.load_table("Cohort_Master")["Cohort_ID"].astype(str))
+    return next((c, p) for c in cohorts for p in utils.PHASES if (c, p) not in stored)
+
+
+@pytest.mark.parametrize("by", [["Phase", "Tier"], []])
+def test_pruned_to_no_partition(by, warehouse_dir, monkeypatch):
+    cohort, phase = _missing_partition()
+    state = FilterState.normalize(cohorts=[cohort], phases=[phase])
+    measures = {"Offers_Issued": "sum", "Openings": ("Openings_Announced", "mean"), "Visits": ("Company_Name", "count")}
+    duck, pandas = _both(monkeypatch, "Company_Visits", state, by, measures)
+    assert len(pandas) == (0 if by else 1)
+    pd.testing.assert_frame_equal(duck, pandas)
+
+
+def test_table_not_stored(warehouse_dir, monkeypatch):
+    # no visits uploaded yet: the derived Visit_Aggregates does not exist
+    os.remove(warehouse.find_table("Visit_Aggregates"))
+    utils.invalidate_table()
+    duck, pandas = _both(monkeypatch, "Visit_Aggregates", FilterState(), ["Phase"], {"Offers_Issued": "sum"})
+    assert pandas.empty
+    pd.testing.assert_frame_equal(duck, pandas)
@@ -0,0 +1,70 @@
+# tests/test_significance.py
+# Bootstrap CIs and sign-flip p-values of paired Post - Pre deltas.
+import itertools
+
+import numpy as np
+import pytest
+
+import executor
+import significance
+
+
+def test_known_shift_is_significant():
+    rng = np.random.default_rng(1)
+    pre = rng.normal(50, 10, 40)
+    post = pre + 5 + rng.normal(0, 1, 40)
+    t = significance.delta_test(post, pre, "shift", resamples=2000)
+    assert t.n == 40
+    assert t.mean == pytest.approx(np.mean(post - pre))
+    assert t.ci_low < t.mean < t.ci_high
+    assert 4 < t.ci_low and t.ci_high < 6
+    assert t.p_value == pytest.approx(1 / 2001)  # no sign flip comes close to +5
+
+
+def test_zero_shift_is_not_significant():
+    deltas = np.array([-3.0, -1.0, -0.5, 0.5, 1.0, 3.0])
+    pre = np.full(len(deltas), 10.0)
+    t = significance.delta_test(pre + deltas, pre, resamples=2000)
+    assert t.mean == 0.0
+    assert t.ci_low < 0 < t.ci_high
+    assert t.p_value == 1.0  # every flipped mean is at least as extreme as 0
+
+
+def test_incomplete_pairs_are_dropped():
+    t = significance.delta_test([1.0, np.nan, 3.0, 4.0], [0.0, 1.0, np.nan, 2.0], resamples=100)
+    assert t.n == 2 and t.mean == 1.5
+    t = significance.delta_test([1.0, np.nan], [0.0, 1.0])
+    assert t.n == 1 and t.mean == 1.0 and np.isnan(t.p_value) and t.resamples == 0
+    assert "too few" in t.summary()
+
+
+def test_sign_flip_means_cover_every_swap():
+    deltas = np.array([1.0, 2.0, 4.0])
+    exact = {sum(s * d for s, d in zip(signs, deltas)) / 3 for signs in itertools.product([1, -1], repeat=3)}
+    perm = significance.sign_flip_means(deltas, 4000, 0)
+    assert len(perm) == 4000
+    assert set(np.round(perm, 12)) == {round(v, 12) for v in exact}
+    assert abs(perm.mean()) < 0.1
+
+
+def test_bootstrap_means():
+    deltas = np.arange(10.0)
+    boot = significance.bootstrap_means(deltas, 3000, 0)
+    assert len(boot) == 3000
+    assert boot.min() >= 0 and boot.max() <= 9
+    assert boot.mean() == pytest.approx(deltas.mean(), abs=0.1)
+    assert boot.std() == pytest.approx(deltas.std() / np.sqrt(10), rel=0.1)
+    assert np.all(significance.bootstrap_means(np.full(5, 2.5), 100, 0) == 2.5)
+
+
+def test_batches_and_shards_do_not_change_the_result(monkeypatch):
+    rng = np.random.default_rng(2)
+    pre, post = rng.normal(size=30), rng.normal(0.3, 1, 30)
+    whole = significance.delta_test(post, pre, resamples=1000)
+    monkeypatch.setattr(significance, "BATCH_CELLS", 30 * 7)  # many small batches, same stream
+    assert significance.delta_test(post, pre, resamples=1000) == whole
+    monkeypatch.setattr(executor, "WORKERS", 0)  # shards run inline
+    sharded = significance.delta_test(post, pre, resamples=1000, workers=3)
+    assert sharded.resamples == 1000 and sharded.mean == whole.mean
+    assert sharded.ci_low == pytest.approx(whole.ci_low, abs=0.15)
+    assert sharded.p_value == pytest.approx(whole.p_value, abs=0.05)
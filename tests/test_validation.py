@@ -0,0 +1,16 @@
+# tests/test_validation.py
+# Casting of "datetime" schema columns.
+import pandas as pd
+
+import validation
+
+
+def test_mixed_date_formats_parse_regardless_of_chunking():
+    raw = pd.Series(["2024-02-01", "15/02/2024", "March 3, 2024", "not a date", None], dtype=object)
+    expected = [pd.Timestamp("2024-02-01"), pd.Timestamp("2024-02-15"), pd.Timestamp("2024-03-03")]
+    out, bad = validation._cast(raw, "datetime")
+    assert out.iloc[:3].tolist() == expected
+    assert bad.tolist() == [False, False, False, True, False]
+    # the same cells split across chunks cast the same way
+    parts = [validation._cast(raw.iloc[i:i + 1], "datetime")[0] for i in range(len(raw))]
+    assert pd.concat(parts).equals(out)
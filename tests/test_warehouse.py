@@ -0,0 +1,60 @@
+# tests/test_warehouse.py
+# Upload modes of warehouse.DatasetWriter.
+import pandas as pd
+
+import warehouse
+from utils import NATURAL_KEYS
+
+
+def _visits(cohort: str, offers: int) -> pd.DataFrame:
+    # 5 distinct natural keys, each uploaded twice; the second copy carries `offers`
+    rows = [{"Cohort_ID": cohort, "Phase": "JPT", "Company_Name": f"Co{i}",
+             "Visit_Date": pd.Timestamp("2024-03-01"), "Role_Title": "Analyst", "Offers_Issued": offers - 1}
+            for i in range(5)]
+    df = pd.DataFrame(rows + [{**r, "Offers_Issued": offers} for r in rows])
+    return df.astype({"Cohort_ID": "string", "Phase": "string", "Company_Name": "string",
+                      "Role_Title": "string", "Offers_Issued": "Int64"})
+
+
+def _upsert(name: str, *chunks: pd.DataFrame) -> None:
+    with warehouse.DatasetWriter(name, "upsert", NATURAL_KEYS[name], "parquet") as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+        writer.commit()
+
+
+def test_upsert_into_new_partition_dedups(warehouse_dir):
+    df = _visits("C_NEW", 7)
+    _upsert("Company_Visits", df)
+    stored = warehouse.read_table("Company_Visits")
+    new = stored[stored["Cohort_ID"] == "C_NEW"]
+    assert len(new) == 5
+    assert (new["Offers_Issued"] == 7).all()
+    _upsert("Company_Visits", df)
+    again = warehouse.read_table("Company_Visits")
+    assert len(again) == len(stored)
+
+
+def test_upsert_dedups_across_staged_chunks(warehouse_dir, monkeypatch):
+    monkeypatch.setattr(warehouse, "STAGE_FLUSH_ROWS", 5)  # one staged file per chunk
+    df = _visits("C_CHUNKS", 3)
+    _upsert("Company_Visits", df.iloc[:5], df.iloc[5:])
+    stored = warehouse.read_table("Company_Visits")
+    new = stored[stored["Cohort_ID"] == "C_CHUNKS"]
+    assert len(new) == 5
+    assert (new["Offers_Issued"] == 3).all()
+
+
+def test_upsert_into_missing_single_file_table_dedups(empty_warehouse):
+    df = pd.DataFrame({"Cohort_ID": ["C1", "C1", "C2"], "Year": [2023, 2024, 2024], "Program": ["A", "B", "C"]})
+    _upsert("Cohort_Master", df)
+    stored = warehouse.read_table("Cohort_Master")
+    assert stored["Cohort_ID"].tolist() == ["C1", "C2"]
+    assert stored["Year"].tolist() == [2024, 2024]
+
+
+def test_combine_upsert_without_stored_rows():
+    new = pd.DataFrame({"k": [1, 1, 2], "v": [1, 2, 3]})
+    for existing in (None, new.iloc[:0]):
+        out = warehouse.combine(existing, new, "upsert", ["k"])
+        assert out["v"].tolist() == [2, 3]
@@ -0,0 +1,39 @@
+# tests/test_weeks.py
+# WeekIndex row selection.
+import pandas as pd
+
+import utils
+import weeks
+from filters import FilterState
+
+NO_FILTERS = FilterState((), (), (), ())
+
+
+def _blanked(n_weeks: int = 3, n_cohorts: int = 2) -> pd.DataFrame:
+    df = utils.load_table("Tutor_Session_Utilization").copy()
+    df.loc[df.index[:n_weeks], "Week"] = pd.NaT
+    df["Cohort_ID"] = df["Cohort_ID"].astype("string")
+    df.loc[df.index[len(df) - n_cohorts:], "Cohort_ID"] = pd.NA
+    return df
+
+
+def test_unfiltered_keeps_rows_without_week_or_cohort(warehouse_dir):
+    df = _blanked()
+    assert len(weeks.apply(df, NO_FILTERS)) == len(df)
+
+
+def test_week_range_drops_rows_without_week(warehouse_dir):
+    df = _blanked(n_cohorts=0)
+    known = weeks.as_weeks(df["Week"]).dropna()
+    out = weeks.apply(df, NO_FILTERS, known.min(), known.max())
+    assert len(out) == len(df) - 3
+    out = weeks.apply(df, NO_FILTERS, lo=known.min())
+    assert len(out) == len(df) - 3
+
+
+def test_cohort_filter_drops_rows_without_cohort(warehouse_dir):
+    df = _blanked(n_weeks=0)
+    cohort = df["Cohort_ID"].dropna().iloc[0]
+    out = weeks.apply(df, FilterState((), (), (cohort,), ()))
+    assert (out["Cohort_ID"] == cohort).all()
+    assert len(out) == (df["Cohort_ID"] == cohort).sum()
@@ -1,20 +1,167 @@
 # utils.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional, Sequence, Tuple
+
 import pandas as pd
-from functools import lru_cache
 
-# ---------- fast CSV loader ----------
-@lru_cache(maxsize=32)
+import profiling
+import validation
+import warehouse
+from validation import ValidationReport
+
+# Cached frames are handed out as shallow copies; copy-on-write makes those
+# safe to mutate (e.g. phase_order) without touching the cached original.
+# pandas 3 always behaves this way.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# ---------- version-aware table cache ----------
+# Entries are keyed on file identity (path, mtime, size), so a rewritten file
+# is never served stale; memory is bounded by bytes rather than entry count.
+CACHE_BUDGET_BYTES = int(float(os.environ.get("TABLE_CACHE_MB", "512")) * 1024 * 1024)
+
+
+def file_version(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of `path`, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class TableCache:
+    """Thread-safe LRU of DataFrames with a byte budget."""
+
+    def __init__(self, budget_bytes: int = CACHE_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, *keys: Hashable) -> Optional[pd.DataFrame]:
+        """Frame cached under the first of `keys` present (one hit or miss either way)."""
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, df: pd.DataFrame) -> None:
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if size > self.budget_bytes:
+                return  # larger than the whole budget: serve it uncached
+            self._entries[key] = (df, size)
+            self.nbytes += size
+            while self.nbytes > self.budget_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+
+    def invalidate(self, match: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key satisfies `match`; returns the number dropped."""
+        with self._lock:
+            dropped = [k for k in self._entries if match(k)]
+            for k in dropped:
+                self.nbytes -= self._entries.pop(k)[1]
+            return len(dropped)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache = TableCache()
+_invalidation_hooks: List[Callable[[Optional[str]], None]] = []
+
+
+def _cached_read(path: str, columns: Optional[Tuple[str, ...]], name: Optional[str] = None) -> pd.DataFrame:
+    version = file_version(path)
+    if version is None:
+        raise FileNotFoundError(path)
+    key = (os.path.abspath(path), version, columns)
+    # a whole-table entry (e.g. preloaded by warmup.py) also serves any projection
+    df = _cache.get(key) if columns is None else _cache.get(key, key[:2] + (None,))
+    if df is not None and columns is not None and list(df.columns) != list(columns):
+        df = df[[c for c in columns if c in df.columns]]
+    if df is None:
+        df = compact(warehouse.read_file(path, columns), name)
+        _cache.put(key, df)
+        profiling.annotate(cache="miss", rows_out=len(df))
+    else:
+        profiling.annotate(cache="hit", rows_out=len(df))
+    return df.copy(deep=False)
+
+
 def load_csv(path: str) -> pd.DataFrame:
-    return pd.read_csv(path)
+    return _cached_read(path, None)
+
+
+def load_table(name: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Load warehouse table <name> (Parquet or CSV), reading only `columns` if given."""
+    with profiling.stage("load", name):
+        path = warehouse.find_table(name)
+        if path is None:
+            raise FileNotFoundError(f"No warehouse table for {name!r} in {warehouse.WAREHOUSE_DIR}")
+        return _cached_read(path, tuple(columns) if columns is not None else None, name)
+
+
+def data_version(*names: str) -> Tuple:
+    """Identity of the stored warehouse tables `names`; changes whenever one is rewritten."""
+    out = []
+    for name in names:
+        path = warehouse.find_table(name)
+        out.append((name, path and file_version(path)))
+    return tuple(out)
+
+
+def register_invalidation_hook(fn: Callable[[Optional[str]], None]) -> None:
+    """Call `fn(name)` whenever a table is invalidated (`None` means everything)."""
+    if fn not in _invalidation_hooks:
+        _invalidation_hooks.append(fn)
+
+
+def invalidate_table(name: Optional[str] = None) -> None:
+    """Evict cached frames for warehouse table `name` (all tables if None).
+
+    Writers call this after replacing a table so memory is released right away
+    and dependent caches registered via register_invalidation_hook can react.
+    """
+    if name is None:
+        _cache.clear()
+    else:
+        base = os.path.abspath(os.path.join(warehouse.WAREHOUSE_DIR, name))
+        # single files (<name>.<fmt>) and partitioned datasets (<name>/_manifest.json)
+        prefixes = (base + ".", base + os.sep)
+        _cache.invalidate(lambda key: key[0].startswith(prefixes))
+    for fn in list(_invalidation_hooks):
+        fn(name)
 
-def load_table(name: str) -> pd.DataFrame:
-    """Shorthand to load from data/warehouse/<name>.csv"""
-    return load_csv(f"data/warehouse/{name}.csv")
+
+def cache_stats() -> dict:
+    return {"entries": len(_cache), "bytes": _cache.nbytes, "budget_bytes": _cache.budget_bytes,
+            "hits": _cache.hits, "misses": _cache.misses}
 
 # ---------- common ordering for the 'Phase' column ----------
+PHASES = ["Pre-AI", "Yoodli", "JPT"]
+
 def phase_order(df: pd.DataFrame, col: str = "Phase") -> pd.DataFrame:
-    cat = pd.CategoricalDtype(categories=["Pre-AI", "Yoodli", "JPT"], ordered=True)
-    if col in df.columns:
+    cat = pd.CategoricalDtype(categories=PHASES, ordered=True)
+    if col in df.columns and df[col].dtype != cat:  # tables are loaded with it already (compact)
         df[col] = df[col].astype(cat)
     return df
 
@@ -36,12 +183,16 @@ SCHEMAS_DTYPES = {
         "Placed": "Int64",
         "Avg_Package": "Float64",
         "Tier1_Offers": "Int64",
-        "Avg_Conversion_Per_Visit_%": "Float64",
     },
     "Company_Visits": {
         "Cohort_ID": "string",
         "Phase": "string",
+        "Company_Name": "string",
+        "Visit_Date": "datetime",
+        "Role_Title": "string",
         "Role_Family": "string",
+        "Tier": "string",
+        "Sector": "string",
         "Offers_Issued": "Int64",
         "Openings_Announced": "Int64",
     },
@@ -69,17 +220,23 @@ SCHEMAS_DTYPES = {
     },
     "Tutor_Sessions": {
         "Cohort_ID": "string",
+        "Phase": "string",
         "Unit_Code": "string",
         "Session_ID": "string",
         "Assigned_Count": "Int64",
     },
     "Tutor_Session_Utilization": {
+        "Cohort_ID": "string",
+        "Phase": "string",
         "Session_ID": "string",
+        "Week": "week",
         "Avg_TRS": "Float64",
         "Highest_TRS": "Float64",
     },
     "Tutor_Weekly_Summary": {
-        "Week": "string",
+        "Cohort_ID": "string",
+        "Phase": "string",
+        "Week": "week",
         "Sessions_Created_This_Week": "Int64",
         "Overall_Utilization_This_Week_%": "Float64",
         "Units_Adopted_%": "Float64",
@@ -95,20 +252,121 @@ SCHEMAS_DTYPES = {
     },
 }
 
+# Natural keys for "Upsert by key" uploads: a stored row is replaced by an
+# uploaded row with the same values in these columns.
+NATURAL_KEYS = {
+    "Cohort_Master": ["Cohort_ID"],
+    "Placements_Cohort": ["Cohort_ID", "Phase"],
+    "Company_Visits": ["Cohort_ID", "Phase", "Company_Name", "Visit_Date", "Role_Title"],
+    "Mentor_Cohort": ["Cohort_ID", "Phase"],
+    "JPT_Cohort": ["Cohort_ID", "Phase"],
+    "Tutor_Sessions": ["Session_ID"],
+    "Tutor_Session_Utilization": ["Session_ID", "Week"],
+    "Tutor_Weekly_Summary": ["Cohort_ID", "Week"],
+    "Tutor_Cohort_Summary": ["Cohort_ID", "Phase"],
+}
+
+def validate_schema(df: pd.DataFrame, dataset: str, row_offset: int = 0) -> Tuple[pd.DataFrame, ValidationReport]:
+    """Cast to SCHEMAS_DTYPES[dataset] and report the cells that could not be cast.
+
+    `row_offset` is the number of rows before `df` in the upload, so reports for
+    successive chunks carry file-level row numbers.
+    """
+    return validation.validate(df, dataset, SCHEMAS_DTYPES.get(dataset, {}), row_offset)
+
 def apply_schema_dtypes(df: pd.DataFrame, dataset: str) -> pd.DataFrame:
-    """Cast columns to the dtypes defined in SCHEMAS_DTYPES[dataset]."""
-    spec = SCHEMAS_DTYPES.get(dataset, {})
-    for col, dtype in spec.items():
-        if col not in df.columns:
-            # allow missing optional columns; uploader page already warns on missing
-            continue
-        if dtype in ("Int64", "Float64"):
-            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
-        elif dtype == "string":
-            df[col] = df[col].astype("string")
-        elif dtype == "datetime":
-            df[col] = pd.to_datetime(df[col], errors="coerce")
-        else:
-            # fallback: try pandas dtype directly
-            df[col] = df[col].astype(dtype, errors="ignore")
-    return df
+    """Cast columns to the dtypes defined in SCHEMAS_DTYPES[dataset].
+
+    Invalid cells become NA; use validate_schema() to find out which.
+    """
+    return validate_schema(df, dataset)[0]
+
+# ---------- compact dtypes at load ----------
+# Frames are typed once when they enter the table cache, so pages never
+# re-coerce them: Phase becomes the ordered PHASES categorical, columns the
+# full template schema (0_utils.SCHEMAS_DTYPES) marks "category" and other
+# repetitive strings (e.g. Cohort_ID in fact tables) become categoricals,
+# numeric and week columns stored as text are parsed, integers are downcast to
+# 32 bits when they fit (not narrower, so `100 * count` cannot overflow) and
+# floats to float32 only when that is lossless. memory_report() shows the
+# bytes saved per table and column.
+CATEGORY_MAX_RATIO = 0.5  # strings with at most this share of distinct values become categoricals
+CATEGORY_MIN_ROWS = 64
+
+_NUMERIC = {"Int64": "integer", "Float64": "float"}
+_compaction: dict = {}  # table -> column -> (dtype before, bytes before, dtype after, bytes after)
+_compaction_lock = threading.Lock()
+
+
+def _template_categories() -> dict:
+    import importlib
+    try:
+        schemas = importlib.import_module("0_utils").SCHEMAS_DTYPES
+    except ImportError:
+        return {}
+    return {t: {c for c, dt in cols.items() if dt == "category"} for t, cols in schemas.items()}
+
+
+_CATEGORIES = _template_categories()
+
+
+def _column_bytes(s: pd.Series) -> int:
+    return int(s.memory_usage(index=False, deep=True))
+
+
+def _compact_column(s: pd.Series, col: str, categorical: bool, declared: Optional[str]) -> pd.Series:
+    if col == "Phase":
+        return s.astype(pd.CategoricalDtype(categories=PHASES, ordered=True))
+    if declared == "week":
+        return validation.parse_weeks(s)
+    numeric = _NUMERIC.get(declared)
+    if numeric and not pd.api.types.is_numeric_dtype(s):
+        s = pd.to_numeric(s, errors="coerce")
+    if pd.api.types.is_bool_dtype(s) or isinstance(s.dtype, pd.CategoricalDtype):
+        return s
+    if pd.api.types.is_integer_dtype(s):
+        values = s.dropna()
+        if values.empty or (values.min() >= -2**31 and values.max() < 2**31):
+            return s.astype("Int32" if isinstance(s.dtype, pd.api.extensions.ExtensionDtype) else "int32")
+        return s
+    if pd.api.types.is_float_dtype(s):
+        target = "Float32" if isinstance(s.dtype, pd.api.extensions.ExtensionDtype) else "float32"
+        narrow = s.astype(target)
+        lossless = ((narrow.astype(s.dtype) == s) | s.isna()).all()
+        return narrow if lossless else s
+    if pd.api.types.is_string_dtype(s) or s.dtype == object:
+        if categorical:
+            return s.astype("category")
+        if len(s) >= CATEGORY_MIN_ROWS and s.nunique() <= CATEGORY_MAX_RATIO * len(s):
+            return s.astype("category")
+    return s
+
+
+def compact(df: pd.DataFrame, name: Optional[str] = None) -> pd.DataFrame:
+    """`df` with compact dtypes (see above); records the per-column savings for memory_report()."""
+    schema = SCHEMAS_DTYPES.get(name, {})
+    categories = _CATEGORIES.get(name, set())
+    out, stats = {}, {}
+    for col in df.columns:
+        before = df[col]
+        try:
+            after = _compact_column(before, col, col in categories, schema.get(col))
+        except (TypeError, ValueError):
+            after = before
+        out[col] = after
+        stats[col] = (str(before.dtype), _column_bytes(before), str(after.dtype), _column_bytes(after))
+    if name is not None:
+        with _compaction_lock:
+            _compaction.setdefault(name, {}).update(stats)
+    return pd.DataFrame(out, index=df.index)
+
+
+def memory_report() -> pd.DataFrame:
+    """Bytes per table and column as read and after compact(), for the tables loaded so far."""
+    with _compaction_lock:
+        rows = [(t, c, *v) for t, cols in _compaction.items() for c, v in cols.items()]
+    report = pd.DataFrame(rows, columns=["table", "column", "dtype_before", "bytes_before",
+                                         "dtype_after", "bytes_after"])
+    report["saved_%"] = (100 * (1 - report["bytes_after"] / report["bytes_before"].where(report["bytes_before"] > 0))
+                         ).round(1)
+    return report
@@ -0,0 +1,166 @@
+# validation.py
+# Schema validation driven by SCHEMAS_DTYPES.
+#
+# validate() casts every schema column with vectorized pandas operations and,
+# instead of silently turning bad cells into NA, records a per-column
+# violation mask: cells that held a value but could not be cast (or, for
+# integer columns, were not whole numbers). The typed frame is returned with
+# those cells as NA, together with a compact report -- counts per column plus
+# the first few offending rows -- that can be merged across upload chunks.
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+MAX_EXAMPLES = 5
+# strftime format of "datetime" cells; "mixed" parses each value on its own
+# (ISO, "15/02/2024", "March 3, 2024", ...), so results never depend on which
+# chunk a value lands in. A fixed format is stricter and faster.
+DATE_FORMAT = os.environ.get("DATE_FORMAT", "mixed")
+
+
+@dataclass
+class ValidationReport:
+    dataset: str
+    rows: int = 0
+    counts: Dict[str, int] = field(default_factory=dict)
+    # column -> DataFrame[Row, Value] of the first offending cells (Row is 1-based)
+    examples: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    max_examples: int = MAX_EXAMPLES
+
+    @property
+    def ok(self) -> bool:
+        return not self.counts
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def add(self, column: str, mask: np.ndarray, raw: pd.Series, row_offset: int) -> None:
+        n = int(mask.sum())
+        if not n:
+            return
+        self.counts[column] = self.counts.get(column, 0) + n
+        have = self.examples.get(column)
+        room = self.max_examples - (0 if have is None else len(have))
+        if room <= 0:
+            return
+        pos = np.flatnonzero(mask)[:room]
+        found = pd.DataFrame({"Row": pos + row_offset + 1, "Value": raw.iloc[pos].astype(str).to_numpy()})
+        self.examples[column] = found if have is None else pd.concat([have, found], ignore_index=True)
+
+    def merge(self, other: "ValidationReport") -> "ValidationReport":
+        """Fold the report of a later chunk into this one (rows already offset)."""
+        self.rows += other.rows
+        for column, n in other.counts.items():
+            self.counts[column] = self.counts.get(column, 0) + n
+            have = self.examples.get(column)
+            more = other.examples.get(column)
+            if more is not None:
+                merged = more if have is None else pd.concat([have, more], ignore_index=True)
+                self.examples[column] = merged.head(self.max_examples)
+        return self
+
+    def summary(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {"Column": list(self.counts), "Invalid_Cells": list(self.counts.values())},
+            columns=["Column", "Invalid_Cells"],
+        )
+
+
+def _present(raw: pd.Series) -> np.ndarray:
+    """Cells that hold a value (not NA and not blank text)."""
+    present = raw.notna().to_numpy()
+    if raw.dtype == object or isinstance(raw.dtype, pd.StringDtype):
+        blank = raw.astype("string").str.strip().eq("").fillna(False).to_numpy(dtype=bool)
+        present = present & ~blank
+    return present
+
+
+def parse_weeks(raw: pd.Series) -> pd.Series:
+    """Week cells as the datetime of the week's Monday (NaT where unparseable).
+
+    Accepts ISO week labels ("2024-W07", "2024W7") and any date, which is
+    moved back to its Monday. Only distinct values are parsed.
+    """
+    if pd.api.types.is_datetime64_any_dtype(raw.dtype):
+        days = raw.dt.tz_localize(None) if getattr(raw.dt, "tz", None) else raw
+    else:
+        codes, uniques = pd.factorize(raw)
+        text = pd.Series(uniques, dtype="string").str.strip()
+        parts = text.str.extract(r"^(\d{4})-?W(\d{1,2})$", flags=re.IGNORECASE)
+        iso = parts[0].notna().to_numpy()
+        parsed = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns]")
+        if iso.any():
+            labels = parts[0][iso] + "-W" + parts[1][iso].str.zfill(2) + "-1"
+            parsed[iso] = pd.to_datetime(labels, format="%G-W%V-%u", errors="coerce")
+        if (~iso).any():
+            parsed[~iso] = pd.to_datetime(text[~iso], errors="coerce", format="mixed")
+        days = pd.Series(parsed.to_numpy()[codes], index=raw.index, dtype="datetime64[ns]")
+        days[codes < 0] = pd.NaT
+    days = days.astype("datetime64[ns]").dt.normalize()
+    return days - pd.to_timedelta(days.dt.weekday, unit="D")
+
+
+def parse_dates(raw: pd.Series, fmt: Optional[str] = None) -> pd.Series:
+    """Date cells as datetimes (NaT where unparseable), parsed with `fmt` (DATE_FORMAT). Only distinct values are parsed."""
+    if pd.api.types.is_datetime64_any_dtype(raw.dtype):
+        return raw
+    codes, uniques = pd.factorize(raw)
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), errors="coerce", format=fmt or DATE_FORMAT)
+    # code -1 (missing cell) picks the trailing NaT
+    values = np.append(parsed.to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT", "ns"))
+    return pd.Series(values[codes], index=raw.index, dtype="datetime64[ns]")
+
+
+def _cast(raw: pd.Series, dtype: str) -> Tuple[pd.Series, Optional[np.ndarray]]:
+    """Return (typed column, violation mask or None)."""
+    if dtype in ("Int64", "Float64"):
+        if pd.api.types.is_integer_dtype(raw.dtype):
+            return raw.astype(dtype), None
+        if pd.api.types.is_numeric_dtype(raw.dtype) and not pd.api.types.is_bool_dtype(raw.dtype):
+            num = raw.astype("float64") if dtype == "Int64" else raw
+            bad = None
+        else:
+            num = pd.to_numeric(raw, errors="coerce")
+            bad = _present(raw) & num.isna().to_numpy()
+        if dtype == "Int64":
+            num = num.astype("float64")
+            frac = (num.notna() & (num % 1 != 0)).to_numpy()
+            if frac.any():
+                bad = frac if bad is None else bad | frac
+                num = num.mask(frac)
+        return num.astype(dtype), bad
+    if dtype == "string":
+        return raw.astype("string"), None
+    if dtype == "datetime":
+        out = parse_dates(raw)
+        return out, _present(raw) & out.isna().to_numpy()
+    if dtype == "week":
+        out = parse_weeks(raw)
+        return out, _present(raw) & out.isna().to_numpy()
+    # fallback: try pandas dtype directly
+    try:
+        return raw.astype(dtype), None
+    except (TypeError, ValueError):
+        return raw, None
+
+
+def validate(df: pd.DataFrame, dataset: str, spec: Dict[str, str], row_offset: int = 0,
+             max_examples: int = MAX_EXAMPLES) -> Tuple[pd.DataFrame, ValidationReport]:
+    """Cast `df` to `spec` (column -> dtype); columns missing from `df` are skipped."""
+    report = ValidationReport(dataset, rows=len(df), max_examples=max_examples)
+    out = {}
+    for col in df.columns:
+        dtype = spec.get(col)
+        if dtype is None:
+            out[col] = df[col]
+            continue
+        typed, bad = _cast(df[col], dtype)
+        if bad is not None:
+            report.add(col, bad, df[col], row_offset)
+        out[col] = typed
+    return pd.DataFrame(out, index=df.index), report
@@ -0,0 +1,145 @@
+# visit_metrics.py
+# Placement visit metrics derived from row-level Company_Visits.
+#
+# Visit_Aggregates holds additive partials (visit counts, sums and non-null
+# counts) per (Cohort_ID, Phase, Tier, Sector, Role_Family) *per source part
+# file*. Warehouse part files are immutable -- an upload adds new parts and
+# retires old ones -- so an update only aggregates the parts that appeared
+# since the last run and drops the partials of parts that were retired;
+# existing visits are never rescanned. Visit_Metrics is the cohort-level
+# roll-up with the columns defined on the Definitions page:
+#   Avg_Conversion_Per_Visit_% = mean of Offers_Issued / Openings_Announced per visit
+#   Avg_Openings_Per_Visit     = mean Openings_Announced per visit
+import os
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+import utils
+import warehouse
+
+SOURCE = "Company_Visits"
+AGG_TABLE = "Visit_Aggregates"
+METRICS_TABLE = "Visit_Metrics"
+DIMENSIONS = ["Tier", "Sector", "Role_Family"]
+GRAIN = ["Cohort_ID", "Phase"] + DIMENSIONS
+READ_COLUMNS = GRAIN + ["Openings_Announced", "Offers_Issued"]
+PARTIALS = ["Visits", "Openings_Announced", "Openings_n", "Offers_Issued", "Conversion_sum", "Conversion_n"]
+METRIC_COLUMNS = ["Cohort_ID", "Phase", "Visits", "Openings_Announced", "Offers_Issued",
+                  "Avg_Conversion_Per_Visit_%", "Avg_Openings_Per_Visit"]
+
+
+def _source_parts() -> Dict[str, str]:
+    """Part id -> path for every live file of Company_Visits."""
+    path = warehouse.find_table(SOURCE)
+    if path is None:
+        return {}
+    if path.endswith(".json"):
+        base = os.path.dirname(path)
+        return {f: os.path.join(base, f) for f in warehouse.read_manifest(path)["files"]}
+    # single-file table: its identity changes whenever it is rewritten
+    return {f"{os.path.basename(path)}@{utils.file_version(path)}": path}
+
+
+def aggregate(visits: pd.DataFrame) -> pd.DataFrame:
+    """Partials per GRAIN for a frame of visit rows."""
+    for c in READ_COLUMNS:
+        if c not in visits.columns:
+            visits[c] = pd.NA
+    openings = pd.to_numeric(visits["Openings_Announced"], errors="coerce").astype("float64")
+    offers = pd.to_numeric(visits["Offers_Issued"], errors="coerce").astype("float64")
+    conversion = (offers / openings.where(openings > 0)).to_numpy()
+    out = pd.DataFrame({c: visits[c].astype("string") for c in GRAIN})
+    out["Visits"] = 1
+    out["Openings_Announced"] = openings.fillna(0.0).to_numpy()
+    out["Openings_n"] = openings.notna().astype("int64").to_numpy()
+    out["Offers_Issued"] = offers.fillna(0.0).to_numpy()
+    out["Conversion_sum"] = np.nan_to_num(conversion)
+    out["Conversion_n"] = (~np.isnan(conversion)).astype("int64")
+    return out.groupby(GRAIN, dropna=False, observed=True)[PARTIALS].sum().reset_index()
+
+
+def is_stale() -> bool:
+    src = warehouse.find_table(SOURCE)
+    agg = warehouse.find_table(AGG_TABLE)
+    if src is None:
+        return agg is not None
+    return agg is None or os.stat(src).st_mtime_ns > os.stat(agg).st_mtime_ns
+
+
+def update() -> pd.DataFrame:
+    """Bring Visit_Aggregates and Visit_Metrics in line with Company_Visits."""
+    parts = _source_parts()
+    if warehouse.find_table(AGG_TABLE) is not None:
+        stored = utils.load_table(AGG_TABLE)
+        stored = stored[stored["Source_Part"].isin(list(parts))]
+    else:
+        stored = pd.DataFrame(columns=["Source_Part"] + GRAIN + PARTIALS)
+    done = set(stored["Source_Part"])
+    fresh: List[pd.DataFrame] = []
+    for part, path in parts.items():
+        if part in done:
+            continue
+        partial = aggregate(warehouse.read_file(path, READ_COLUMNS))
+        partial.insert(0, "Source_Part", part)
+        fresh.append(partial)
+    aggs = pd.concat([stored] + fresh, ignore_index=True) if fresh else stored
+    aggs = aggs.astype({c: "string" for c in ["Source_Part"] + GRAIN})
+    aggs = aggs.astype({c: "float64" for c in PARTIALS})
+
+    warehouse.write_table(aggs, AGG_TABLE)
+    warehouse.write_table(cohort_metrics(aggs), METRICS_TABLE)
+    utils.invalidate_table(AGG_TABLE)
+    utils.invalidate_table(METRICS_TABLE)
+    return aggs
+
+
+def _load(table: str, columns: List[str]) -> pd.DataFrame:
+    if is_stale():
+        update()
+    if warehouse.find_table(table) is None:  # no visits uploaded yet
+        return pd.DataFrame(columns=columns)
+    return utils.load_table(table)
+
+
+def load_aggregates() -> pd.DataFrame:
+    return _load(AGG_TABLE, ["Source_Part"] + GRAIN + PARTIALS)
+
+
+def load_metrics() -> pd.DataFrame:
+    return _load(METRICS_TABLE, METRIC_COLUMNS)
+
+
+# ---------- roll-ups ----------
+def _finish(tot: pd.DataFrame) -> pd.DataFrame:
+    tot["Avg_Conversion_Per_Visit_%"] = 100 * tot["Conversion_sum"] / tot["Conversion_n"].where(tot["Conversion_n"] > 0)
+    tot["Avg_Openings_Per_Visit"] = tot["Openings_Announced"] / tot["Openings_n"].where(tot["Openings_n"] > 0)
+    return tot
+
+
+def rollup(aggs: pd.DataFrame, by: List[str]) -> pd.DataFrame:
+    """Sum the partials over `by` (one total row when `by` is empty) and derive the per-visit means."""
+    if not by:
+        tot = aggs[PARTIALS].astype("float64").sum().to_frame().T
+    else:
+        tot = aggs.groupby(by, dropna=False, observed=True)[PARTIALS].sum().reset_index()
+    return _finish(tot)
+
+
+def select(aggs: pd.DataFrame, cells: pd.DataFrame) -> pd.DataFrame:
+    """Rows of `aggs` whose (Cohort_ID, Phase) is one of the rows of `cells`."""
+    def keys(df: pd.DataFrame) -> pd.MultiIndex:
+        return pd.MultiIndex.from_frame(df[["Cohort_ID", "Phase"]].astype("string"))
+
+    return aggs[keys(aggs).isin(keys(cells))]
+
+
+def cohort_metrics(aggs: pd.DataFrame) -> pd.DataFrame:
+    """One row per (Cohort_ID, Phase) with the Placements_Cohort visit columns."""
+    return rollup(aggs, ["Cohort_ID", "Phase"])[METRIC_COLUMNS]
+
+
+def offers_by(aggs: pd.DataFrame, dimension: str) -> pd.DataFrame:
+    """Offers issued per Phase and `dimension` (Tier, Sector or Role_Family)."""
+    return aggs.groupby(["Phase", dimension], observed=True)["Offers_Issued"].sum().unstack(fill_value=0)
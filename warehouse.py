@@ -0,0 +1,493 @@
+# warehouse.py
+# Storage layer for data/warehouse.
+#
+# Dimension and cohort-level summary tables are one file per dataset, stored
+# as Parquet (columnar, read only the columns a page needs) or CSV (legacy /
+# no pyarrow). Row-level fact tables listed in PARTITION_COLUMNS are stored
+# partitioned as <name>/Cohort_ID=<v>/Phase=<v>/part-*.<fmt>, with
+# <name>/_manifest.json listing the live part files. The manifest is the
+# snapshot readers see: writers add new part files, swap the manifest in
+# atomically and only then delete the files it no longer lists, so an upload
+# only rewrites the partitions it touches.
+import json
+import os
+import shutil
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+WAREHOUSE_DIR = os.environ.get("WAREHOUSE_DIR", "data/warehouse")
+
+# Preferred first: when both files exist for a dataset, Parquet wins.
+FORMATS = ("parquet", "csv")
+
+MANIFEST = "_manifest.json"
+
+# How an upload is combined with what is already stored.
+MODES = ("replace", "append", "upsert", "replace_partition")
+
+# Datasets stored partitioned, and their partition columns.
+PARTITION_COLUMNS: Dict[str, List[str]] = {
+    "Company_Visits": ["Cohort_ID", "Phase"],
+    "Tutor_Sessions": ["Cohort_ID", "Phase"],
+    "Tutor_Session_Utilization": ["Cohort_ID", "Phase"],
+    "Tutor_Weekly_Summary": ["Cohort_ID", "Phase"],
+}
+# Row order within each part file: a cohort's weeks are stored contiguous and
+# in time order (weeks.WeekIndex resolves week ranges over it).
+SORT_COLUMNS: Dict[str, List[str]] = {
+    "Tutor_Session_Utilization": ["Cohort_ID", "Week"],
+    "Tutor_Weekly_Summary": ["Cohort_ID", "Week"],
+}
+# Single-file tables still honour replace_partition on these columns.
+DEFAULT_PARTITION_KEYS = ["Cohort_ID", "Phase"]
+
+# Rows buffered by a partitioned upload before they are staged to disk.
+STAGE_FLUSH_ROWS = int(os.environ.get("WAREHOUSE_STAGE_ROWS", "500000"))
+
+
+def has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def default_format() -> str:
+    """Format used for new writes: $WAREHOUSE_FORMAT, else Parquet if pyarrow is installed."""
+    fmt = os.environ.get("WAREHOUSE_FORMAT", "").strip().lower()
+    if fmt in FORMATS:
+        return fmt
+    return "parquet" if has_pyarrow() else "csv"
+
+
+def table_path(name: str, fmt: str) -> str:
+    return os.path.join(WAREHOUSE_DIR, f"{name}.{fmt}")
+
+
+def dataset_dir(name: str) -> str:
+    return os.path.join(WAREHOUSE_DIR, name)
+
+
+def manifest_path(name: str) -> str:
+    return os.path.join(dataset_dir(name), MANIFEST)
+
+
+def find_table(name: str) -> Optional[str]:
+    """Path of the stored table for `name` (its manifest if partitioned), or None."""
+    if os.path.exists(manifest_path(name)):
+        return manifest_path(name)
+    for fmt in FORMATS:
+        path = table_path(name, fmt)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+# ---------- read ----------
+def _parquet_columns(path: str) -> List[str]:
+    import pyarrow.parquet as pq
+    return pq.read_schema(path).names
+
+
+def _read(path: str, fmt: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    if fmt == "parquet":
+        if columns is None:
+            return pd.read_parquet(path)
+        present = set(_parquet_columns(path))
+        return pd.read_parquet(path, columns=[c for c in columns if c in present])
+    if fmt == "excel":
+        df = pd.read_excel(path)
+        return df if columns is None else df[[c for c in columns if c in df.columns]]
+    if columns is None:
+        return pd.read_csv(path)
+    wanted = set(columns)
+    return pd.read_csv(path, usecols=lambda c: c in wanted)
+
+
+def read_manifest(path: str) -> dict:
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def _read_partitioned(path: str, columns: Optional[Sequence[str]], retry: bool = True) -> pd.DataFrame:
+    manifest = read_manifest(path)
+    base = os.path.dirname(path)
+    cols = manifest["columns"] if columns is None else [c for c in columns if c in manifest["columns"]]
+    files = [os.path.join(base, f) for f in manifest["files"]]
+    if not files:
+        return pd.DataFrame(columns=cols)
+    try:
+        if manifest["format"] == "parquet":
+            import pyarrow.dataset as ds
+            return ds.dataset(files, format="parquet").to_table(columns=cols).to_pandas()
+        return pd.concat([_read(f, "csv", cols) for f in files], ignore_index=True)
+    except FileNotFoundError:
+        # a writer published a newer snapshot while this one was being read
+        if not retry:
+            raise
+        return _read_partitioned(path, columns, retry=False)
+
+
+def read_file(path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Read a CSV/Parquet/Excel file or partition manifest, projecting to `columns` when given.
+
+    Requested columns that the file does not have are skipped rather than
+    raising, so pages can ask for optional columns.
+    """
+    lower = path.lower()
+    if lower.endswith(".json"):
+        return _read_partitioned(path, columns)
+    if lower.endswith(".parquet"):
+        return _read(path, "parquet", columns)
+    if lower.endswith((".xlsx", ".xls")):
+        return _read(path, "excel", columns)
+    return _read(path, "csv", columns)
+
+
+def read_table(name: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    path = find_table(name)
+    if path is None:
+        raise FileNotFoundError(f"No warehouse table for {name!r} in {WAREHOUSE_DIR}")
+    return read_file(path, columns)
+
+
+# ---------- write ----------
+def _write_file(df: pd.DataFrame, path: str, fmt: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def _remove_copies(name: str, keep: str) -> None:
+    """Delete every stored copy of `name` other than `keep` (a format or "partitioned")."""
+    for fmt in FORMATS:
+        if fmt != keep and os.path.exists(table_path(name, fmt)):
+            os.remove(table_path(name, fmt))
+    if keep != "partitioned" and os.path.exists(manifest_path(name)):
+        shutil.rmtree(dataset_dir(name))
+
+
+class TableWriter:
+    """Write a single-file warehouse table chunk by chunk.
+
+    Chunks go to a temporary file next to the target; commit() swaps it in
+    with os.replace, so readers only ever see the old or the complete new
+    table. Copies of the same table in other formats are removed on commit so
+    readers never see two diverging versions.
+    """
+
+    def __init__(self, name: str, fmt: Optional[str] = None):
+        fmt = fmt or default_format()
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported warehouse format: {fmt!r}")
+        os.makedirs(WAREHOUSE_DIR, exist_ok=True)
+        self.name = name
+        self.fmt = fmt
+        self.path = table_path(name, fmt)
+        self.tmp_path = f"{self.path}.{os.getpid()}.{id(self):x}.tmp"
+        self.rows = 0
+        self._started = False
+        self._parquet = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self._parquet is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self._parquet = pq.ParquetWriter(self.tmp_path, table.schema)
+            else:
+                table = pa.Table.from_pandas(df, schema=self._parquet.schema, preserve_index=False)
+            self._parquet.write_table(table)
+        else:
+            df.to_csv(self.tmp_path, index=False, mode="a" if self._started else "w", header=not self._started)
+        self._started = True
+        self.rows += len(df)
+
+    def _close(self) -> None:
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+
+    def read_staged(self) -> pd.DataFrame:
+        """Everything written so far, before commit."""
+        self._close()
+        return _read(self.tmp_path, self.fmt)
+
+    def commit(self) -> str:
+        if not self._started:
+            raise ValueError(f"Nothing was written for {self.name!r}")
+        self._close()
+        os.replace(self.tmp_path, self.path)
+        _remove_copies(self.name, keep=self.fmt)
+        return self.path
+
+    def abort(self) -> None:
+        self._close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self) -> "TableWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+
+
+def combine(existing: Optional[pd.DataFrame], new: pd.DataFrame, mode: str,
+            keys: Optional[Sequence[str]] = None, partition_cols: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Merge an upload into the stored rows according to `mode`."""
+    if mode == "upsert":
+        # the last occurrence of a key within the upload wins, stored rows or not
+        keys = list(keys)
+        new = new[~new.duplicated(keys, keep="last")]
+    if existing is None or existing.empty or mode == "replace":
+        return new
+    if mode == "append":
+        keep = existing
+    elif mode == "upsert":
+        seen = pd.MultiIndex.from_frame(new[keys].astype("string"))
+        keep = existing[~pd.MultiIndex.from_frame(existing[keys].astype("string")).isin(seen)]
+    elif mode == "replace_partition":
+        cols = [c for c in (partition_cols or DEFAULT_PARTITION_KEYS) if c in existing.columns and c in new.columns]
+        if not cols:
+            return new
+        touched = pd.MultiIndex.from_frame(new[cols].astype("string")).unique()
+        keep = existing[~pd.MultiIndex.from_frame(existing[cols].astype("string")).isin(touched)]
+    else:
+        raise ValueError(f"Unknown upload mode: {mode!r}")
+    return pd.concat([keep, new], ignore_index=True)
+
+
+def partition_dir(cols: Sequence[str], values) -> str:
+    """Relative directory of one partition, e.g. "Cohort_ID=C1/Phase=Pre-AI"."""
+    if not isinstance(values, tuple):
+        values = (values,)
+    parts = []
+    for col, value in zip(cols, values):
+        text = "__null__" if pd.isna(value) else quote(str(value), safe="")
+        parts.append(f"{col}={text}")
+    return "/".join(parts)
+
+
+def partition_values(relpath: str) -> Dict[str, Optional[str]]:
+    """Inverse of partition_dir() for a manifest file path: {"Cohort_ID": "C1", "Phase": "Pre-AI"}."""
+    values = {}
+    for segment in relpath.replace(os.sep, "/").split("/")[:-1]:
+        col, sep, text = segment.partition("=")
+        if sep:
+            values[col] = None if text == "__null__" else unquote(text)
+    return values
+
+
+class DatasetWriter:
+    """Stage an upload chunk by chunk, then publish it according to `mode`.
+
+    - replace: the upload becomes the whole table
+    - append: the rows are added, stored rows are kept
+    - upsert: stored rows whose `keys` appear in the upload are replaced
+    - replace_partition: stored rows in the upload's Cohort_ID/Phase
+      partitions are replaced, other partitions are kept
+
+    For partitioned datasets only the partitions present in the upload are
+    written; append and replace_partition move the staged files into place
+    without reading anything back. Single-file tables are small and are
+    simply rewritten.
+    """
+
+    def __init__(self, name: str, mode: str = "replace", keys: Optional[Sequence[str]] = None,
+                 fmt: Optional[str] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown upload mode: {mode!r}")
+        if mode == "upsert" and not keys:
+            raise ValueError(f"Upsert needs natural key columns for {name!r}")
+        self.name = name
+        self.mode = mode
+        self.keys = list(keys) if keys else None
+        self.fmt = fmt or default_format()
+        if self.fmt not in FORMATS:
+            raise ValueError(f"Unsupported warehouse format: {self.fmt!r}")
+        self.partition_cols = PARTITION_COLUMNS.get(name)
+        self.sort_cols = SORT_COLUMNS.get(name, [])
+        self.rows = 0
+        self.columns: Optional[List[str]] = None
+        if self.partition_cols and mode != "replace" and os.path.exists(manifest_path(name)):
+            # parts of one dataset share a format; keep the stored one
+            self.fmt = read_manifest(manifest_path(name))["format"]
+        if self.partition_cols:
+            self._staging = os.path.join(dataset_dir(name), f".staging-{uuid.uuid4().hex}")
+            self._buffers: Dict[str, List[pd.DataFrame]] = defaultdict(list)
+            self._buffered = 0
+            self._staged: Dict[str, List[str]] = defaultdict(list)
+        else:
+            self._table = TableWriter(name, self.fmt)
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.columns is None:
+            self.columns = list(df.columns)
+        self.rows += len(df)
+        if not self.partition_cols:
+            self._table.write(df)
+            return
+        for values, part in df.groupby(self.partition_cols, dropna=False, sort=False, observed=True):
+            self._buffers[partition_dir(self.partition_cols, values)].append(part)
+        self._buffered += len(df)
+        if self._buffered >= STAGE_FLUSH_ROWS:
+            self._flush()
+
+    def _sorted(self, df: pd.DataFrame) -> pd.DataFrame:
+        cols = [c for c in self.sort_cols if c in df.columns]
+        return df.sort_values(cols, kind="stable", ignore_index=True) if cols else df
+
+    def _flush(self) -> None:
+        for rel, frames in self._buffers.items():
+            path = os.path.join(self._staging, rel, f"stage-{len(self._staged[rel])}.{self.fmt}")
+            _write_file(self._sorted(pd.concat(frames, ignore_index=True)), path, self.fmt)
+            self._staged[rel].append(path)
+        self._buffers.clear()
+        self._buffered = 0
+
+    def commit(self) -> str:
+        if self.columns is None:
+            raise ValueError(f"Nothing was written for {self.name!r}")
+        if not self.partition_cols:
+            return self._commit_single()
+        self._flush()
+        return self._commit_partitioned()
+
+    def _commit_single(self) -> str:
+        stored = find_table(self.name) is not None
+        if self.mode == "replace" or (not stored and self.mode != "upsert"):
+            return self._table.commit()
+        # upserts always go through combine() so duplicate keys in the upload collapse
+        merged = combine(read_table(self.name) if stored else None, self._table.read_staged(), self.mode, self.keys)
+        self._table.abort()
+        with TableWriter(self.name, self.fmt) as writer:
+            writer.write(self._sorted(merged))
+            return writer.commit()
+
+    def _new_part(self, rel: str) -> str:
+        return f"{rel}/part-{uuid.uuid4().hex}.{self.fmt}"
+
+    def _existing_parts(self) -> Dict[str, List[str]]:
+        """Live part files per partition, relative to the dataset directory."""
+        parts: Dict[str, List[str]] = defaultdict(list)
+        if os.path.exists(manifest_path(self.name)):
+            for f in read_manifest(manifest_path(self.name))["files"]:
+                parts[os.path.dirname(f)].append(f)
+            return parts
+        legacy = find_table(self.name)
+        if legacy is not None and self.mode != "replace":
+            # first partitioned write over a single-file table: split it once
+            df = read_file(legacy)
+            for values, part in df.groupby(self.partition_cols, dropna=False, sort=False, observed=True):
+                rel = partition_dir(self.partition_cols, values)
+                f = self._new_part(rel)
+                _write_file(self._sorted(part), os.path.join(dataset_dir(self.name), f), self.fmt)
+                parts[rel].append(f)
+        return parts
+
+    def _commit_partitioned(self) -> str:
+        base = dataset_dir(self.name)
+        existing = self._existing_parts()
+        live = {} if self.mode == "replace" else dict(existing)
+        moved_keys = None
+        if self.mode == "upsert" and not set(self.partition_cols) <= set(self.keys):
+            # a key may move partition (e.g. a Session_ID re-assigned to
+            # another cohort), so it is looked up in untouched partitions too
+            staged = [f for fs in self._staged.values() for f in fs]
+            moved_keys = pd.concat([_read(f, self.fmt, self.keys) for f in staged], ignore_index=True)
+            moved_keys = pd.MultiIndex.from_frame(moved_keys.astype("string"))
+        for rel, staged in self._staged.items():
+            if self.mode == "upsert":
+                # new partitions too: keys may repeat within and across the staged chunk files
+                old = None
+                if existing.get(rel):
+                    old = pd.concat([read_file(os.path.join(base, f)) for f in existing[rel]], ignore_index=True)
+                new = pd.concat([_read(f, self.fmt) for f in staged], ignore_index=True)
+                f = self._new_part(rel)
+                _write_file(self._sorted(combine(old, new, "upsert", self.keys)), os.path.join(base, f), self.fmt)
+                live[rel] = [f]
+                continue
+            moved = []
+            for src in staged:
+                f = self._new_part(rel)
+                os.makedirs(os.path.join(base, rel), exist_ok=True)
+                os.replace(src, os.path.join(base, f))
+                moved.append(f)
+            live[rel] = (live.get(rel, []) if self.mode == "append" else []) + moved
+
+        if moved_keys is not None:
+            self._drop_keys_elsewhere(base, existing, live, moved_keys)
+
+        files = sorted(f for fs in live.values() for f in fs)
+        manifest = {"format": self.fmt, "partition_cols": self.partition_cols, "columns": self.columns,
+                    "files": files}
+        tmp = f"{manifest_path(self.name)}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(manifest, fh)
+        os.replace(tmp, manifest_path(self.name))
+
+        # the new snapshot is live: drop superseded parts and staging
+        keep = set(files)
+        for fs in existing.values():
+            for f in fs:
+                if f not in keep and os.path.exists(os.path.join(base, f)):
+                    os.remove(os.path.join(base, f))
+        self._cleanup()
+        _remove_copies(self.name, keep="partitioned")
+        return manifest_path(self.name)
+
+    def _drop_keys_elsewhere(self, base: str, existing: Dict[str, List[str]], live: Dict[str, List[str]],
+                             seen: pd.MultiIndex) -> None:
+        """Rewrite the untouched partitions that still hold an upserted key."""
+        for rel, fs in existing.items():
+            if rel in self._staged:
+                continue
+            for f in fs:
+                stored = read_file(os.path.join(base, f), self.keys).astype("string")
+                if pd.MultiIndex.from_frame(stored).isin(seen).any():
+                    old = pd.concat([read_file(os.path.join(base, f)) for f in fs], ignore_index=True)
+                    old = old[~pd.MultiIndex.from_frame(old[self.keys].astype("string")).isin(seen)]
+                    live[rel] = []
+                    if len(old):
+                        live[rel] = [self._new_part(rel)]
+                        _write_file(old, os.path.join(base, live[rel][0]), self.fmt)
+                    break
+
+    def _cleanup(self) -> None:
+        if os.path.exists(self._staging):
+            shutil.rmtree(self._staging)
+        base = dataset_dir(self.name)
+        for root, dirs, files in os.walk(base, topdown=False):
+            if root != base and not os.listdir(root):
+                os.rmdir(root)
+
+    def abort(self) -> None:
+        if self.partition_cols:
+            self._cleanup()
+        else:
+            self._table.abort()
+
+    def __enter__(self) -> "DatasetWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+
+
+def write_table(df: pd.DataFrame, name: str, fmt: Optional[str] = None, mode: str = "replace",
+                keys: Optional[Sequence[str]] = None) -> str:
+    """Write `df` as the warehouse table `name` and return its path."""
+    with DatasetWriter(name, mode, keys, fmt) as writer:
+        writer.write(df)
+        return writer.commit()
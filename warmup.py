@@ -0,0 +1,194 @@
+# warmup.py
+# Background warm-up of the shared in-process caches.
+#
+# A daemon thread brings the derived tables (Visit_Aggregates/Visit_Metrics,
+# KPI cube, Tutor_Weekly_Rolling, Cohort_Journey) up to date, preloads every
+# table the pages read into the utils.load_table cache (whole tables; page
+# projections are served from them), builds the filter index, each table's row selection for
+# the default filters (all phases) and the week index, and precomputes the
+# query.NAMED aggregates, the analytics.VIEWS analyses and the significance
+# tests of their Pre/Post deltas for them (the last two on the executor.py
+# process pool, which also warms its workers' caches).
+# It runs once per process, started by the first script run (ensure_started),
+# and again after every upload (ingest.refresh_derived calls start()). A start
+# while a run is in flight queues exactly one more run. Failures of one step
+# are recorded in the status and do not stop the others.
+#
+# WARMUP=0 disables it.
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+import analytics
+import cube
+import journey
+import query
+import significance
+import utils
+import visit_metrics
+import warehouse
+import weeks
+from filters import FilterState, get_engine
+
+ENABLED = os.environ.get("WARMUP", "1").strip().lower() not in ("0", "false", "no")
+
+# Tables pages load with utils.load_table (fact tables they aggregate through
+# query.py are covered by the NAMED aggregates instead).
+TABLES = ["Cohort_Master", "Placements_Cohort", "JPT_Cohort", "Mentor_Cohort", "Tutor_Cohort_Summary",
+          "Tutor_Sessions", "Tutor_Session_Utilization", visit_metrics.METRICS_TABLE, cube.CUBE_TABLE]
+
+# What filter_widgets() returns before the user touches it.
+DEFAULT_FILTERS = FilterState.normalize(phases=utils.PHASES)
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class Status:
+    state: str = "idle"            # idle / running / done
+    reason: str = ""
+    step: str = ""
+    done: int = 0
+    total: int = 0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    runs: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def seconds(self) -> Optional[float]:
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+
+_status = Status()
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_pending: Optional[str] = None  # reason of a run requested while one was in flight
+_started_once = False
+
+
+def status() -> Status:
+    with _lock:
+        return Status(**{**asdict(_status), "errors": list(_status.errors)})
+
+
+# ---------- steps ----------
+def _derived() -> None:
+    if visit_metrics.is_stale():
+        visit_metrics.update()
+    if cube.is_stale():
+        cube.build_cube()
+    weeks.ensure_rolling()
+    if journey.is_stale():
+        journey.build()
+
+
+def _table(name: str) -> None:
+    if warehouse.find_table(name) is None:
+        return
+    df = utils.load_table(name)
+    if name != "Cohort_Master":
+        get_engine().row_index(df, DEFAULT_FILTERS, name)
+    if name == "Tutor_Session_Utilization":
+        weeks.get_index(df, name)
+
+
+def _steps() -> List[Tuple[str, Callable[[], object]]]:
+    steps: List[Tuple[str, Callable[[], object]]] = [("derived tables", _derived), ("filter index", get_engine)]
+    steps += [(f"load {t}", lambda t=t: _table(t)) for t in TABLES]
+    steps += [(f"aggregate {n}", lambda n=n: query.named(n, DEFAULT_FILTERS)) for n in query.NAMED]
+    steps += [(f"analytics {n}", lambda n=n: analytics.analyze_pooled(n, DEFAULT_FILTERS)) for n in analytics.VIEWS]
+    steps += [(f"significance {n}", lambda n=n: significance.for_view_pooled(n, DEFAULT_FILTERS))
+              for n in significance.DELTAS]
+    return steps
+
+
+def _run(reason: str) -> None:
+    global _status
+    steps = _steps()
+    with _lock:
+        _status = Status("running", reason, total=len(steps), started=time.time(), runs=_status.runs + 1)
+    for label, step in steps:
+        with _lock:
+            _status.step = label
+        try:
+            step()
+        except Exception as e:  # keep warming the rest
+            log.warning("warm-up step %r failed: %s", label, e)
+            with _lock:
+                _status.errors.append(f"{label}: {e}")
+        with _lock:
+            _status.done += 1
+    with _lock:
+        _status.state, _status.step, _status.finished = "done", "", time.time()
+        summary = (reason, _status.seconds, len(_status.errors))
+    log.info("warm-up (%s) finished in %.1fs, %d errors", *summary)
+
+
+def _worker(reason: str) -> None:
+    global _pending, _thread
+    while True:
+        _run(reason)
+        with _lock:
+            if _pending is None:
+                _thread = None
+                return
+            reason, _pending = _pending, None
+
+
+def start(reason: str = "start") -> bool:
+    """Warm up in the background; returns False if disabled. Queues a rerun if one is in flight."""
+    global _thread, _pending
+    if not ENABLED:
+        return False
+    with _lock:
+        if _thread is not None:
+            _pending = reason
+            return True
+        _thread = threading.Thread(target=_worker, args=(reason,), name="warmup", daemon=True)
+        _thread.start()
+    return True
+
+
+def ensure_started() -> None:
+    """Start the first warm-up of this process (later calls do nothing)."""
+    global _started_once
+    with _lock:
+        if _started_once:
+            return
+        _started_once = True
+    start("server start")
+
+
+def wait(timeout: Optional[float] = None) -> bool:
+    """Block until no warm-up is running (for scripts and benchmarks); False on timeout."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        with _lock:
+            thread = _thread
+        if thread is None:
+            return True
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            return False
+        thread.join(remaining)
+
+
+# ---------- Streamlit ----------
+def show_status(container=None) -> None:
+    """Progress of the current warm-up (or a one-line summary of the last one) in the sidebar."""
+    import streamlit as st
+
+    box = container if container is not None else st.sidebar
+    s = status()
+    if s.state == "running":
+        box.progress(s.done / s.total if s.total else 0.0,
+                     text=f"Warming caches ({s.reason}): {s.step} {s.done}/{s.total}")
+    elif s.state == "done":
+        box.caption(f"Caches warm ({s.reason}, {s.seconds:.1f}s"
+                    + (f", {len(s.errors)} step(s) failed)" if s.errors else ")"))
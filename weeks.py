@@ -0,0 +1,200 @@
+# weeks.py
+# Typed week axis for the tutor weekly tables.
+#
+# Week is parsed once at ingest (dtype "week", validation.parse_weeks) into the
+# datetime of the week's Monday, and Tutor_Weekly_Summary /
+# Tutor_Session_Utilization part files are stored sorted by (Cohort_ID, Week)
+# (warehouse.SORT_COLUMNS). WeekIndex holds one int64 key per row -- cohort in
+# the high 32 bits, week number in the low ones -- in sorted order, built once
+# per data version, so a week range over the selected cohorts is two binary
+# searches per cohort instead of a scan of the table.
+#
+# Tutor_Weekly_Rolling is derived from Tutor_Weekly_Summary: trailing 4-week
+# means of utilization and adoption per (Cohort_ID, Phase, Week). It is rebuilt
+# after uploads of the summary (ingest.refresh_derived) and whenever it is
+# older than its source.
+import datetime
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import profiling
+import utils
+import warehouse
+from filters import CohortIndex, FilterState, get_engine
+from validation import parse_weeks
+
+COLUMN = "Week"
+SOURCE = "Tutor_Weekly_Summary"
+ROLLING_TABLE = "Tutor_Weekly_Rolling"
+WINDOW_WEEKS = 4
+# source column -> trailing-window mean column
+ROLLING = {
+    "Overall_Utilization_This_Week_%": "Utilization_4w_%",
+    "Units_Adopted_%": "Units_Adopted_4w_%",
+}
+ROLLING_COLUMNS = ["Cohort_ID", "Phase", "Week"] + list(ROLLING.values())
+
+_NO_WEEK = np.int64(2**32 - 1)  # low-bits value of rows without a Week; never inside a range
+
+
+def as_weeks(values: pd.Series) -> pd.Series:
+    """`values` as week Mondays; stored datetimes pass through, legacy "2024-W07" labels are parsed."""
+    return parse_weeks(values)
+
+
+def labels(weeks: pd.Series) -> pd.Series:
+    """ISO week labels ("2024-W07") for display."""
+    return weeks.dt.strftime("%G-W%V")
+
+
+def week_of(value) -> pd.Timestamp:
+    """Monday of the week containing `value` (a date or a "2024-W07" label)."""
+    if isinstance(value, (pd.Timestamp, datetime.date)):
+        day = pd.Timestamp(value).normalize()
+        return day - pd.Timedelta(days=day.weekday())
+    return as_weeks(pd.Series([value]))[0]
+
+
+def _ordinal(weeks):
+    """Week number since the epoch as the low 32 bits of a WeekIndex key (Series or one Timestamp)."""
+    if isinstance(weeks, pd.Timestamp):
+        return np.int64((weeks.to_datetime64().astype("datetime64[D]").astype("int64") + 3) // 7 + 2**31)
+    days = weeks.to_numpy(dtype="datetime64[D]")
+    out = (days.astype("int64") + 3) // 7 + 2**31  # weeks start on Monday; 1970-01-01 was a Thursday
+    out[np.isnat(days)] = _NO_WEEK
+    return out
+
+
+def between(df: pd.DataFrame, lo=None, hi=None, col: str = "Week") -> pd.DataFrame:
+    """Rows of `df` (sorted by `col`) from the week of `lo` to the week of `hi`, found by binary search."""
+    values = df[col].to_numpy()
+    start = 0 if lo is None else int(np.searchsorted(values, week_of(lo).to_datetime64(), "left"))
+    stop = len(df) if hi is None else int(np.searchsorted(values, week_of(hi).to_datetime64(), "right"))
+    return df.iloc[start:stop]
+
+
+class WeekIndex:
+    """Rows of one weekly table ordered by (Cohort_ID, Week), for week-range lookups."""
+
+    def __init__(self, df: pd.DataFrame, cohorts: CohortIndex):
+        ids = df["Cohort_ID"].astype("string")
+        self.cohort_ids = pd.Index(sorted(ids.dropna().unique()))
+        codes = self.cohort_ids.get_indexer(ids).astype("int64")
+        codes[codes < 0] = len(self.cohort_ids)  # missing Cohort_ID: after every cohort
+        # each own cohort code -> its slot in the CohortIndex mask (last slot = unknown cohort)
+        self.cohorts = cohorts
+        shared = cohorts.codes(pd.Series(self.cohort_ids, dtype="string"))
+        self.mask_slots = np.where(shared < 0, len(cohorts), shared)
+        keys = (codes << 32) | _ordinal(as_weeks(df["Week"]))
+        # tables written by the warehouse are (nearly) sorted already; only sort when they are not
+        self.order = None if (keys[1:] >= keys[:-1]).all() else np.argsort(keys, kind="stable")
+        self.keys = keys if self.order is None else keys[self.order]
+        phase = pd.Categorical(df["Phase"], categories=utils.PHASES) if "Phase" in df.columns else None
+        self.phase_codes = None if phase is None else np.asarray(phase.codes)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def rows(self, state: FilterState, lo=None, hi=None) -> np.ndarray:
+        """Positions (in table order) of the rows passing `state` from the week of `lo` to the week of `hi`.
+
+        Rows without a Cohort_ID pass only when no cohort-level filter is set,
+        rows without a Week only when neither `lo` nor `hi` is given.
+        """
+        cmask = self.cohorts.cohort_mask(state)
+        if cmask is None:
+            selected = np.arange(len(self.cohort_ids) + 1)  # the last code is "no Cohort_ID"
+        else:
+            selected = np.flatnonzero(cmask[self.mask_slots])
+        first = 0 if lo is None else _ordinal(week_of(lo))
+        if hi is not None:
+            last = _ordinal(week_of(hi))
+        else:
+            last = _NO_WEEK if lo is None else _NO_WEEK - 1
+        starts = np.searchsorted(self.keys, (selected << 32) | first, "left")
+        stops = np.searchsorted(self.keys, (selected << 32) | last, "right")
+        lengths = stops - starts
+        # concatenated ranges [start, stop) without a Python loop
+        offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        pos = offsets + np.arange(lengths.sum())
+        rows = pos if self.order is None else self.order[pos]
+        if state.phases and self.phase_codes is not None:
+            allowed = np.append(pd.Index(utils.PHASES).isin(state.phases), False)
+            rows = rows[allowed[self.phase_codes[rows]]]
+        return np.sort(rows)
+
+
+_indexes: Dict[str, Tuple[tuple, WeekIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(df: pd.DataFrame, table: str) -> WeekIndex:
+    """WeekIndex of warehouse table `table` (`df` as loaded, any projection), rebuilt when it changes."""
+    version = utils.data_version("Cohort_Master", table)
+    with _indexes_lock:
+        cached = _indexes.get(table)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with profiling.stage("filter", f"week index: {table}", rows_in=len(df)):
+        index = WeekIndex(df, get_engine().index)
+    with _indexes_lock:
+        _indexes[table] = (version, index)
+    return index
+
+
+def apply(df: pd.DataFrame, state: FilterState, lo=None, hi=None, table: Optional[str] = None) -> pd.DataFrame:
+    """Rows of weekly table `df` passing `state` from the week of `lo` to the week of `hi`."""
+    index = get_index(df, table) if table else WeekIndex(df, get_engine().index)
+    with profiling.stage("filter", f"{table or ''} weeks", rows_in=len(df)) as span:
+        rows = index.rows(state, lo, hi)
+        span.rows_out = len(rows)
+        return df if len(rows) == len(df) else df.iloc[rows]
+
+
+# ---------- rolling 4-week aggregates ----------
+def rolling(weekly: pd.DataFrame) -> pd.DataFrame:
+    """Trailing WINDOW_WEEKS-week means of the ROLLING columns per (Cohort_ID, Phase, Week)."""
+    keys = ["Cohort_ID", "Phase", "Week"]
+    df = pd.DataFrame({"Cohort_ID": weekly["Cohort_ID"].astype("string"),
+                       "Phase": weekly["Phase"].astype("string"),
+                       "Week": as_weeks(weekly["Week"]),
+                       **{c: pd.to_numeric(weekly[c], errors="coerce").astype("float64") for c in ROLLING}})
+    df = df.dropna(subset=keys)
+    # one row per week (duplicate uploads of a week are averaged), in time order per cohort/phase
+    df = df.groupby(keys, sort=True)[list(ROLLING)].mean().reset_index()
+    window = df.groupby(["Cohort_ID", "Phase"], sort=False).rolling(f"{7 * WINDOW_WEEKS}D", on="Week",
+                                                                     min_periods=1)
+    # groups come back in df's (sorted) order, one row per input row
+    means = window[list(ROLLING)].mean()
+    out = df[keys].copy()
+    for src, dst in ROLLING.items():
+        out[dst] = means[src].to_numpy()
+    return out
+
+
+def is_stale() -> bool:
+    src = warehouse.find_table(SOURCE)
+    derived = warehouse.find_table(ROLLING_TABLE)
+    if src is None:
+        return False
+    return derived is None or os.stat(src).st_mtime_ns > os.stat(derived).st_mtime_ns
+
+
+def update() -> pd.DataFrame:
+    """Rebuild Tutor_Weekly_Rolling from Tutor_Weekly_Summary."""
+    weekly = utils.load_table(SOURCE, columns=["Cohort_ID", "Phase", "Week"] + list(ROLLING))
+    out = rolling(weekly)
+    warehouse.write_table(out, ROLLING_TABLE)
+    utils.invalidate_table(ROLLING_TABLE)
+    return out
+
+
+def ensure_rolling() -> bool:
+    """Build Tutor_Weekly_Rolling if missing or stale; False when there is no weekly summary."""
+    if is_stale():
+        update()
+    return warehouse.find_table(ROLLING_TABLE) is not None